@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+#
+# Compares the startup of `osbox <command> --help` with command lookup
+# through the full manifest.json parse and through the build-time command
+# index (src/osbox/manifest_index.py). Each variant runs from its own copy
+# of the osbox package, with bytecode cached by a warm-up run.
+#
+#   python benchmarks/dispatch.py [command] [--number N]
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+root_path = Path(__file__).parent.parent.resolve()
+sys.path.insert(0, str(root_path))
+
+from build import write_manifest_index  # noqa: E402
+
+GENERATED = ("manifest_index.py", "assets", "assets.pack", "options.db", "__pycache__")
+
+
+def copy_package(dest: Path, index: bool) -> Path:
+    package = dest / "osbox"
+    shutil.copytree(root_path / "src" / "osbox", package, ignore=shutil.ignore_patterns(*GENERATED))
+    if index:
+        write_manifest_index(package / "manifest.json", package / "manifest_index.py")
+    return dest
+
+
+def runner(pythonpath: Path, command: str):
+    env = {k: v for k, v in os.environ.items() if k not in ("OSBOX_ZYGOTE_SOCKET", "OSBOX_IMPORT_PROFILE")}
+    env["PYTHONPATH"] = str(pythonpath)
+    argv = [sys.executable, "-c", "from osbox.cli import main; main()", command, "--help"]
+
+    def run() -> float:
+        start = time.perf_counter()
+        subprocess.run(argv, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        return time.perf_counter() - start
+
+    # the first run writes the .pyc files
+    run()
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark osbox command dispatch at process startup.")
+    parser.add_argument("command", nargs="?", default="check-http")
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as td:
+        variants = (
+            ("manifest.json", copy_package(Path(td) / "json", index=False)),
+            ("manifest_index", copy_package(Path(td) / "index", index=True)),
+        )
+        runs = {name: runner(pythonpath, args.command) for name, pythonpath in variants}
+        # alternate the variants so drift in machine load hits both alike
+        times: dict[str, list[float]] = {name: [] for name in runs}
+        for _ in range(args.number):
+            for name, run in runs.items():
+                times[name].append(run())
+        for name, samples in times.items():
+            print(
+                f"{name:16} median {statistics.median(samples) * 1000:7.1f} ms  "
+                f"min {min(samples) * 1000:7.1f} ms  ({args.number} runs of {args.command} --help)"
+            )
+
+
+if __name__ == "__main__":
+    main()
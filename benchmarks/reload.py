@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+#
+# Sends requests to a running WSGI service while reloading it and reports
+# how many failed. A clean reload reports zero failures.
+#
+#   python benchmarks/reload.py <master pid> <url> [--signal HUP|USR2]
+#
+# HUP starts fresh workers and then drains the old ones. USR2 re-executes
+# the master; once the new master is up the old one is sent TERM, exactly
+# as you would by hand. With --supervised the pid is an `osbox serve`
+# supervisor, which does that itself for every service.
+
+import argparse
+import http.client
+import os
+import signal
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+
+def request(url: str, timeout: float) -> bool:
+    u = urlparse(url)
+    conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=timeout)
+    try:
+        conn.request("GET", u.path or "/")
+        return conn.getresponse().status < 500
+    except OSError:
+        return False
+    finally:
+        conn.close()
+
+
+def child_pids(pid: int) -> list[int]:
+    children = []
+    for stat_file in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            stat = stat_file.read_text()
+        except OSError:
+            continue
+        if int(stat[stat.rindex(")") + 2 :].split()[1]) == pid:
+            children.append(int(stat_file.parent.name))
+    return children
+
+
+def reload_under_load(
+    pid: int,
+    url: str,
+    sig: str = "HUP",
+    concurrency: int = 8,
+    before: float = 2.0,
+    after: float = 5.0,
+    timeout: float = 5.0,
+    supervised: bool = False,
+) -> dict:
+    """
+    Reloads the master at pid while requesting url, returns the request
+    counts and the new master. With supervised, pid is an `osbox serve`
+    supervisor, which retires the old masters itself.
+    """
+    stop = threading.Event()
+    counts = {"ok": 0, "failed": 0}
+    lock = threading.Lock()
+
+    def client():
+        while not stop.is_set():
+            ok = request(url, timeout)
+            with lock:
+                counts["ok" if ok else "failed"] += 1
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+
+    new_master = None
+    time.sleep(before)
+    if sig == "HUP" or supervised:
+        os.kill(pid, getattr(signal, f"SIG{sig}"))
+        print(f"sent {sig} to {pid}")
+    else:
+        known = set(child_pids(pid))
+        os.kill(pid, signal.SIGUSR2)
+        print(f"sent USR2 to {pid}")
+        # the new master is forked from the old one, wait for it and give
+        # it time to boot its workers before retiring the old master
+        deadline = time.monotonic() + 30
+        while new_master is None and time.monotonic() < deadline:
+            time.sleep(0.2)
+            for child in set(child_pids(pid)) - known:
+                if child_pids(child):
+                    new_master = child
+        if new_master is None:
+            print("new master did not come up")
+        else:
+            time.sleep(1.0)
+            os.kill(pid, signal.SIGTERM)
+            print(f"new master {new_master} up, sent TERM to {pid}")
+
+    time.sleep(after)
+    stop.set()
+    for t in threads:
+        t.join()
+    return {**counts, "new_master": new_master}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count failed requests across a WSGI service reload.")
+    parser.add_argument("pid", type=int, help="PID of the gunicorn master")
+    parser.add_argument("url", help="URL to request, e.g. http://127.0.0.1:5000/")
+    parser.add_argument("--signal", choices=["HUP", "USR2"], default="HUP")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--before", type=float, default=2.0, help="Seconds of traffic before the reload")
+    parser.add_argument("--after", type=float, default=5.0, help="Seconds of traffic after the reload")
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--supervised", action="store_true", help="pid is an osbox serve supervisor")
+    args = parser.parse_args()
+
+    result = reload_under_load(
+        args.pid, args.url, args.signal, args.concurrency, args.before, args.after, args.timeout, args.supervised
+    )
+    print(f"ok: {result['ok']} failed: {result['failed']}")
+    failed = result["failed"] or (args.signal == "USR2" and not args.supervised and result["new_master"] is None)
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
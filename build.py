@@ -1,14 +1,36 @@
 #!/usr/bin/env python3
 
 import os
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import hashlib
 import json
+import re
 import tempfile
+import time
+import traceback
 from pathlib import Path
 import subprocess
 import shutil
-
-
-def run_cmd(cmd: str, cwd: Path):
+import sys
+import tarfile
+import threading
+import zlib
+
+# lines of output kept per stream for failure reports
+TAIL_LINES = 100
+# what the current process is building, for the step profile
+_step_scope = "osbox"
+# written into the profile, since steps are run through /bin/sh
+RSS_NOTE = (
+    "max_rss_mb is the peak RSS of the largest single process among the /bin/sh running the step "
+    "and the descendants it waited for, not their sum"
+)
+
+
+def run_cmd(cmd: str, cwd: Path, capture: bool = False):
     build_env = os.environ.copy()
     if "PYTHONPATH" in build_env:
         del build_env["PYTHONPATH"]
@@ -29,22 +51,443 @@ def run_cmd(cmd: str, cwd: Path):
 
     build_env["PATH"] = os.pathsep.join(new_paths)
 
+    print(f"$ {cmd}", flush=True)
+    started, wall_start = time.time(), time.monotonic()
     process = subprocess.Popen(cmd, cwd=cwd, shell=True, env=build_env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout, stderr = process.communicate()
+
+    # stream both pipes as they come, keeping only the last lines of each
+    # for the failure report (and all of stdout when the caller wants it)
+    tails = {"stdout": collections.deque(maxlen=TAIL_LINES), "stderr": collections.deque(maxlen=TAIL_LINES)}
+    captured: list[str] = []
+    print_lock = threading.Lock()
+
+    def pump(name: str, pipe) -> None:
+        for raw in iter(pipe.readline, b""):
+            line = raw.decode(errors="replace").rstrip("\n")
+            tails[name].append(line)
+            if capture and name == "stdout":
+                captured.append(line)
+                continue
+            with print_lock:
+                print(f"  {line}", flush=True)
+        pipe.close()
+
+    readers = [
+        threading.Thread(target=pump, args=("stdout", process.stdout), daemon=True),
+        threading.Thread(target=pump, args=("stderr", process.stderr), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+
+    # wait4 gives the CPU time of the shell and the processes it waited for,
+    # and the peak RSS of the largest of them (see RSS_NOTE), along with the
+    # exit status
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    _record_step(
+        {
+            "scope": _step_scope,
+            "cmd": cmd,
+            "cwd": str(cwd),
+            "start": round(started, 3),
+            "wall": round(time.monotonic() - wall_start, 3),
+            "cpu_user": round(usage.ru_utime, 3),
+            "cpu_system": round(usage.ru_stime, 3),
+            "max_rss_mb": round(usage.ru_maxrss / 1024, 1),
+            "returncode": process.returncode,
+        }
+    )
+
     if process.returncode != 0:
         print(f"Command failed with return code {process.returncode}")
-        print("STDOUT:")
-        print(stdout.decode())
-        print("STDERR:")
-        print(stderr.decode())
+        print(f"STDOUT (last {TAIL_LINES} lines):")
+        print("\n".join(tails["stdout"]))
+        print(f"STDERR (last {TAIL_LINES} lines):")
+        print("\n".join(tails["stderr"]))
         raise RuntimeError(f"Command failed: {cmd}")
+    return "\n".join(captured)
+
+
+@contextlib.contextmanager
+def step_scope(name: str):
+    global _step_scope
+    previous, _step_scope = _step_scope, name
+    try:
+        yield
+    finally:
+        _step_scope = previous
+
+
+def _record_step(step: dict):
+    # appended by every build process, including the service workers
+    steps_file = os.environ.get("OSBOX_BUILD_STEPS")
+    if not steps_file:
+        return
+    with open(steps_file, "a") as f:
+        f.write(json.dumps(step) + "\n")
+
+
+def write_build_profile(steps_file: Path, profile_file: Path, started: float, ok: bool):
+    steps = [json.loads(line) for line in steps_file.read_text().splitlines() if line.strip()] if steps_file.exists() else []
+    scopes: dict[str, dict] = {}
+    for step in steps:
+        scope = scopes.setdefault(step["scope"], {"steps": 0, "wall": 0.0, "cpu": 0.0, "max_rss_mb": 0.0})
+        scope["steps"] += 1
+        scope["wall"] = round(scope["wall"] + step["wall"], 3)
+        scope["cpu"] = round(scope["cpu"] + step["cpu_user"] + step["cpu_system"], 3)
+        scope["max_rss_mb"] = max(scope["max_rss_mb"], step["max_rss_mb"])
+
+    profile = {
+        "ok": ok,
+        "started": round(started, 3),
+        "wall": round(time.time() - started, 3),
+        "scopes": dict(sorted(scopes.items(), key=lambda item: -item[1]["wall"])),
+        "notes": {"max_rss_mb": RSS_NOTE},
+        "steps": steps,
+    }
+    profile_file.write_text(json.dumps(profile, indent=2) + "\n")
+
+    print(f"Build profile written to {profile_file} ({profile['wall']:.0f}s)")
+    for step in sorted(steps, key=lambda s: -s["wall"])[:5]:
+        print(f"  {step['wall']:8.1f}s  cpu {step['cpu_user'] + step['cpu_system']:8.1f}s  "
+              f"rss {step['max_rss_mb']:7.1f}MiB  [{step['scope']}] {step['cmd']}")
+
+
+def _without_ref(manifest: dict) -> dict:
+    manifest["services"]["osbox"].pop("ref", None)
+    return manifest
+
+
+def source_git_sha(root_path: Path) -> str:
+    """
+    HEAD, with -dirty appended when the sources differ from it. Files the
+    build generates are in .gitignore, and manifest.json only counts when
+    more than the ref stamped into it has changed.
+    """
+    sha = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=root_path).decode().strip()
+    status = subprocess.check_output(["git", "status", "--porcelain"], cwd=root_path).decode()
+    changed = [line[3:] for line in status.splitlines()]
+    if "src/osbox/manifest.json" in changed:
+        committed = subprocess.check_output(["git", "show", "HEAD:src/osbox/manifest.json"], cwd=root_path)
+        current = (root_path / "src" / "osbox" / "manifest.json").read_text()
+        if _without_ref(json.loads(committed)) == _without_ref(json.loads(current)):
+            changed.remove("src/osbox/manifest.json")
+    return f"{sha}-dirty" if changed else sha
+
+
+def write_manifest_index(manifest_file: Path, index_file: Path):
+    # flatten every service's commands into a name -> entry literal so the
+    # cli can dispatch with a dict lookup instead of parsing manifest.json;
+    # the checksum lets it notice a manifest.json edited after the build
+    data = manifest_file.read_bytes()
+    manifest = json.loads(data)
+    commands: dict[str, dict] = {}
+    for _, service_info in manifest["services"].items():
+        for command in service_info.get("commands", []):
+            commands[command["name"]] = command
+
+    lines = [
+        "# Generated by build.py from manifest.json, do not edit.",
+        f"MANIFEST_CRC32 = {zlib.crc32(data)}",
+        "COMMANDS = {",
+    ]
+    for name, command in commands.items():
+        lines.append(f"    {name!r}: {command!r},")
+    lines.append("}")
+    index_file.write_text("\n".join(lines) + "\n")
+
+
+def write_asset_pack(assets_dir: Path, pack_file: Path):
+    # one mmap-able archive instead of thousands of small files in the bundle
+    sys.path.insert(0, str(Path(__file__).parent.resolve() / "src"))
+    from osbox.assetpack import write_pack
+
+    if not assets_dir.is_dir():
+        print(f"No assets in {assets_dir}, skipping asset pack")
+        return
+    count = write_pack(assets_dir, pack_file)
+    print(f"Packed {count} assets into {pack_file} ({pack_file.stat().st_size} bytes)")
+
+
+def write_option_index(manifest: dict, assets_dir: Path, index_file: Path):
+    # parse the generated sample configs once here so `osbox asset get` and
+    # `asset search` are a query on a small SQLite file
+    sys.path.insert(0, str(Path(__file__).parent.resolve() / "src"))
+    from osbox.optionindex import parse_genconfig, write_index
+
+    def options():
+        for service_name, service_info in manifest["services"].items():
+            for asset in service_info.get("assets", []):
+                if not asset.get("genconfig", False):
+                    continue
+                conf = assets_dir / service_name / asset["name"]
+                if not conf.exists():
+                    print(f"Missing generated config {conf}, not indexed")
+                    continue
+                with open(conf, encoding="utf-8") as f:
+                    yield from parse_genconfig(f, service_name, asset["name"])
+
+    count = write_index(options(), index_file)
+    print(f"Indexed {count} options into {index_file}")
+
+
+def build_service(service_name: str, service_info: dict, build_path: Path, dist_path: Path) -> list[str]:
+    """
+    Clones, installs and builds one service in build_path/<service_name>,
+    copies its wheels to dist_path and generates its assets into
+    build_path/<service_name>/osbox-assets. Runs in a worker process with
+    its output going to the service's log. Returns the wheel file names.
+    """
+    print(f"Building service: {service_name} @ {service_info['ref']}")
+    service_path = build_path / service_name
+    service_path.mkdir(parents=True, exist_ok=True)
+
+    # clone the repo
+    run_cmd(
+        f"git clone {service_info['src']} {service_path}",
+        cwd=build_path,
+    )
 
+    # checkout the specified ref
+    run_cmd(
+        f"git checkout {service_info['ref']}",
+        cwd=service_path,
+    )
+
+    # create venv
+    run_cmd(
+        "uv venv",
+        cwd=service_path,
+    )
+
+    # install requirements
+    run_cmd(
+        "uv pip install -r requirements.txt -c ../requirements/upper-constraints.txt",
+        cwd=service_path,
+    )
+
+    # build the service
+    run_cmd(
+        "uv build",
+        cwd=service_path,
+    )
 
-def build_openstack():
+    # copy the built artifact back to root_path/dist
+    wheels: list[str] = []
+    built_files = sorted((service_path / "dist").glob("*.whl"))
+    for bf in built_files:
+        # install into the venv to verify
+        run_cmd(
+            f"uv pip install {bf} -c ../requirements/upper-constraints.txt",
+            cwd=service_path,
+        )
+        # copy to dist
+        shutil.copy(bf, dist_path)
+        wheels.append(bf.name)
+        print(f"Copied {bf} to {dist_path}")
+
+    # generate assets next to the checkout; the parent copies them into
+    # src/osbox/assets once every service is done
+    assets_path = service_path / "osbox-assets"
+    for asset in service_info.get("assets", []):
+        asset_src = service_path / asset["src"]
+        asset_dst = assets_path / asset["name"]
+        asset_dst.parent.mkdir(parents=True, exist_ok=True)
+
+        if asset.get("genconfig", False):
+            run_cmd(
+                f"uv run oslo-config-generator --config-file {asset_src} --output-file {asset_dst}",
+                cwd=service_path,
+            )
+        elif asset.get("genpolicy", False):
+            run_cmd(
+                f"uv run oslopolicy-sample-generator --config-file {asset_src} --output-file {asset_dst}",
+                cwd=service_path,
+            )
+        else:
+            if asset_src.is_dir():
+                shutil.copytree(asset_src, asset_dst, dirs_exist_ok=True)
+            else:
+                shutil.copy(asset_src, asset_dst)
+
+        print(f"Copied asset {asset['name']}")
+
+    return wheels
+
+
+# bump to invalidate every cache entry, e.g. when build_service changes
+BUILD_CACHE_VERSION = 1
+DEFAULT_BUILD_CACHE = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "osbox-build"
+
+
+def resolve_ref(src: str, ref: str) -> str:
+    """The commit a ref points to, so a moving branch is not served stale from the cache."""
+    if re.fullmatch(r"[0-9a-f]{40}", ref):
+        return ref
+    out = run_cmd(f"git ls-remote {src} '{ref}' '{ref}^{{}}'", cwd=Path.cwd(), capture=True)
+    commits = {}
+    for line in out.splitlines():
+        sha, _, name = line.partition("\t")
+        commits[name] = sha
+    # an annotated tag resolves to the commit it points at
+    for name, sha in commits.items():
+        if name.endswith("^{}"):
+            return sha
+    if commits:
+        return next(iter(commits.values()))
+    raise RuntimeError(f"Cannot resolve {ref} in {src}")
+
+
+def build_toolchain(build_path: Path) -> dict:
+    """Everything outside the service repo that its build output depends on."""
+    constraints = (build_path / "requirements" / "upper-constraints.txt").read_bytes()
+    return {
+        "upper_constraints": hashlib.sha256(constraints).hexdigest(),
+        "uv": run_cmd("uv --version", cwd=build_path, capture=True).strip(),
+        "python": run_cmd("uv python find", cwd=build_path, capture=True).strip()
+        + " "
+        + run_cmd('"$(uv python find)" --version', cwd=build_path, capture=True).strip(),
+        "cache_version": BUILD_CACHE_VERSION,
+    }
+
+
+def service_cache_key(service_info: dict, commit: str, toolchain: dict) -> str:
+    key = {
+        "src": service_info["src"],
+        "commit": commit,
+        "assets": service_info.get("assets", []),
+        **toolchain,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def restore_cached_service(entry: Path, service_path: Path, dist_path: Path) -> list[str]:
+    wheels: list[str] = []
+    for wheel in sorted((entry / "wheels").glob("*.whl")):
+        shutil.copy(wheel, dist_path)
+        wheels.append(wheel.name)
+        print(f"Copied cached {wheel.name} to {dist_path}")
+    if (entry / "assets").is_dir():
+        shutil.copytree(entry / "assets", service_path / "osbox-assets", dirs_exist_ok=True)
+    # mark as used for pruning
+    (entry / "meta.json").touch()
+    return wheels
+
+
+def store_cached_service(cache_dir: Path, key: str, service_name: str, commit: str, wheels: list[Path], assets: Path):
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=f".{key}.", dir=cache_dir))
+    try:
+        (tmp / "wheels").mkdir()
+        for wheel in wheels:
+            shutil.copy(wheel, tmp / "wheels")
+        if assets.is_dir():
+            shutil.copytree(assets, tmp / "assets")
+        (tmp / "meta.json").write_text(json.dumps({"service": service_name, "commit": commit, "created": time.time()}))
+        # another build may have stored the same key meanwhile, either is fine
+        os.rename(tmp, cache_dir / key)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def prune_build_cache(cache_dir: Path, max_age_days: float) -> int:
+    """Removes entries not used for max_age_days, returns how many."""
+    if not cache_dir.is_dir():
+        return 0
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for entry in cache_dir.iterdir():
+        meta = entry / "meta.json"
+        used = meta.stat().st_mtime if meta.exists() else entry.stat().st_mtime
+        if used < cutoff:
+            shutil.rmtree(entry, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def build_service_cached(
+    service_name: str,
+    service_info: dict,
+    build_path: Path,
+    dist_path: Path,
+    cache_dir: Path | None,
+    toolchain: dict,
+) -> tuple[list[str], bool]:
+    """build_service, or its cached output if nothing it depends on changed. Returns (wheels, cache hit)."""
+    if cache_dir is None:
+        return build_service(service_name, service_info, build_path, dist_path), False
+
+    commit = resolve_ref(service_info["src"], service_info["ref"])
+    key = service_cache_key(service_info, commit, toolchain)
+    entry = cache_dir / key
+    service_path = build_path / service_name
+    if (entry / "meta.json").exists():
+        print(f"Cache hit for {service_name} @ {commit} ({key[:12]})")
+        service_path.mkdir(parents=True, exist_ok=True)
+        return restore_cached_service(entry, service_path, dist_path), True
+
+    print(f"Cache miss for {service_name} @ {commit} ({key[:12]})")
+    wheels = build_service(service_name, {**service_info, "ref": commit}, build_path, dist_path)
+    store_cached_service(
+        cache_dir, key, service_name, commit, [dist_path / w for w in wheels], service_path / "osbox-assets"
+    )
+    return wheels, False
+
+
+def _build_service_logged(
+    service_name: str,
+    service_info: dict,
+    build_path: Path,
+    dist_path: Path,
+    log_file: Path,
+    cache_dir: Path | None,
+    toolchain: dict,
+):
+    # everything the pipeline prints, including streamed command output,
+    # goes to this service's log and, prefixed with its name, to the terminal
+    with open(log_file, "w", buffering=1) as log:
+        out = _ServiceOutput(log, sys.__stdout__, f"[{service_name}] ")
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out), step_scope(service_name):
+            try:
+                return build_service_cached(service_name, service_info, build_path, dist_path, cache_dir, toolchain)
+            except BaseException:
+                traceback.print_exc()
+                raise
+
+
+class _ServiceOutput:
+    def __init__(self, log, terminal, prefix: str):
+        self.log = log
+        self.terminal = terminal
+        self.prefix = prefix
+        self.pending = ""
+        self.lock = threading.Lock()
+
+    def write(self, text: str) -> int:
+        with self.lock:
+            self.log.write(text)
+            self.pending += text
+            *lines, self.pending = self.pending.split("\n")
+            if lines:
+                self.terminal.write("".join(f"{self.prefix}{line}\n" for line in lines))
+                self.terminal.flush()
+        return len(text)
+
+    def flush(self) -> None:
+        self.log.flush()
+        self.terminal.flush()
+
+
+def build_openstack(jobs: int | None = None, cache_dir: Path | None = DEFAULT_BUILD_CACHE):
 
     root_path = Path(__file__).parent.resolve()
     dist_path = root_path / "dist"
     dist_path.mkdir(parents=True, exist_ok=True)
+    log_path = dist_path / "build-logs"
+    log_path.mkdir(parents=True, exist_ok=True)
+    assets_root = root_path / "src" / "osbox" / "assets"
 
     print(f"Starting build of OpenStack wheelhouse from {root_path}")
 
@@ -57,95 +500,147 @@ def build_openstack():
 
         # clone the requirements
         print(f"Cloning requirements @ {manifest['requirements']['ref']}")
-        run_cmd(
-            f"git clone {manifest['requirements']['src']} -b {manifest['requirements']['ref']}",
-            cwd=build_path,
-        )
+        with step_scope("requirements"):
+            run_cmd(
+                f"git clone {manifest['requirements']['src']} -b {manifest['requirements']['ref']}",
+                cwd=build_path,
+            )
         # copy upper-constraints.txt to build_path/requirements
         req_src = build_path / "requirements" / "upper-constraints.txt"
         req_dst = dist_path / "upper-constraints.txt"
         shutil.copy(req_src, req_dst)
         print(f"Copied upper-constraints.txt to {req_dst}")
 
+        services: dict[str, dict] = {}
         for service_name, service_info in manifest["services"].items():
             if not "src" in service_info or not "ref" in service_info:
                 print(f"Skipping service {service_name} due to missing src or ref")
                 continue
-
-            print(f"Building service: {service_name} @ {service_info['ref']}")
-            service_path = build_path / service_name
-            service_path.mkdir(parents=True, exist_ok=True)
-
-            # clone the repo
-            run_cmd(
-                f"git clone {service_info['src']} {service_path}",
-                cwd=build_path,
-            )
-
-            # checkout the specified ref
-            run_cmd(
-                f"git checkout {service_info['ref']}",
-                cwd=service_path,
-            )
-
-            # create venv
-            run_cmd(
-                "uv venv",
-                cwd=service_path,
-            )
-
-            # install requirements
-            run_cmd(
-                "uv pip install -r requirements.txt -c ../requirements/upper-constraints.txt",
-                cwd=service_path,
-            )
-
-            # build the service
-            run_cmd(
-                "uv build",
-                cwd=service_path,
-            )
-
-            # copy the built artifact back to root_path/dist
-            built_files = list((service_path / "dist").glob("*.whl"))
-            for bf in built_files:
-                # install into the venv to verify
-                run_cmd(
-                    f"uv pip install {bf} -c ../requirements/upper-constraints.txt",
-                    cwd=service_path,
-                )
-                # copy to dist
-                shutil.copy(bf, dist_path)
-                print(f"Copied {bf} to {dist_path}")
-
-            # copy assets
-            for asset in service_info.get("assets", []):
-                asset_src = service_path / asset["src"]
-                asset_dst = root_path / "src" / "osbox" / "assets" / service_name / asset["name"]
-                asset_dst.parent.mkdir(parents=True, exist_ok=True)
-
-                if asset.get("genconfig", False):
-                    run_cmd(
-                        f"uv run oslo-config-generator --config-file {asset_src} --output-file {asset_dst}",
-                        cwd=service_path,
-                    )
-                elif asset.get("genpolicy", False):
-                    run_cmd(
-                        f"uv run oslopolicy-sample-generator --config-file {asset_src} --output-file {asset_dst}",
-                        cwd=service_path,
-                    )
-                else:
-                    if asset_src.is_dir():
-                        shutil.copytree(asset_src, asset_dst, dirs_exist_ok=True)
-                    else:
-                        shutil.copy(asset_src, asset_dst)
-                
-                print(f"Copied asset {asset['name']}")
+            services[service_name] = service_info
+
+        toolchain = build_toolchain(build_path) if cache_dir is not None else {}
+        if cache_dir is not None:
+            print(f"Using build cache {cache_dir}")
+
+        jobs = max(1, min(jobs or os.cpu_count() or 1, len(services) or 1))
+        print(f"Building {len(services)} services with {jobs} jobs, logs in {log_path}")
+
+        failed: dict[str, str] = {}
+        hits: list[str] = []
+        misses: list[str] = []
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {
+                pool.submit(
+                    _build_service_logged,
+                    service_name,
+                    service_info,
+                    build_path,
+                    dist_path,
+                    log_path / f"{service_name}.log",
+                    cache_dir,
+                    toolchain,
+                ): service_name
+                for service_name, service_info in services.items()
+            }
+            for future in concurrent.futures.as_completed(futures):
+                service_name = futures[future]
+                try:
+                    _wheels, hit = future.result()
+                    (hits if hit else misses).append(service_name)
+                    print(f"[{service_name}] done")
+                except Exception as e:
+                    failed[service_name] = str(e)
+                    print(f"[{service_name}] FAILED: {e}")
+
+        if cache_dir is not None:
+            print(f"Build cache: {len(hits)} hits ({', '.join(sorted(hits)) or '-'}), "
+                  f"{len(misses)} misses ({', '.join(sorted(misses)) or '-'})")
+
+        if failed:
+            raise RuntimeError(f"Failed to build services: {', '.join(sorted(failed))} (see {log_path})")
+
+        # copy assets in manifest order, replacing what a previous build left
+        for service_name in services:
+            service_assets = build_path / service_name / "osbox-assets"
+            if not service_assets.is_dir():
+                continue
+            shutil.rmtree(assets_root / service_name, ignore_errors=True)
+            shutil.copytree(service_assets, assets_root / service_name)
+            print(f"Copied assets of {service_name} to {assets_root / service_name}")
 
         print("Build of OpenStack wheelhouse completed.")
 
 
-def build_osbox(onefile: bool = True):
+def write_bundle_report(collect_report: Path, bundle: Path, report_file: Path):
+    """
+    Adds the size of the built bundle to the collection report, keeping the
+    last result of each collection mode so the two can be compared.
+    """
+    collected = json.loads(collect_report.read_text())
+    bundle_bytes = disk_usage(bundle)
+    report = json.loads(report_file.read_text()) if report_file.exists() else {}
+    report[collected["mode"]] = {"bundle_bytes": bundle_bytes, **collected}
+    report_file.write_text(json.dumps(report, indent=2) + "\n")
+
+    mib = 1024 * 1024
+    source = collected["source_bytes"]
+    print(f"Bundle ({collected['mode']}): {bundle_bytes / mib:.1f} MiB")
+    print(
+        f"  collected sources: all {source['all'] / mib:.1f} MiB in {collected['packages']['all']} packages, "
+        f"pruned {source['pruned'] / mib:.1f} MiB in {collected['packages']['pruned']} packages "
+        f"({collected['tests_bytes'] / mib:.1f} MiB of tests left out)"
+    )
+    if "all" in report and "pruned" in report:
+        before, after = report["all"]["bundle_bytes"], report["pruned"]["bundle_bytes"]
+        print(f"  built bundles: all {before / mib:.1f} MiB, pruned {after / mib:.1f} MiB ({after / before - 1:+.1%})")
+
+
+def disk_usage(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file() and not f.is_symlink())
+
+
+def write_onefile_launcher(onedir: Path, launcher: Path, git_sha: str, out: Path) -> str:
+    """
+    Writes a single-file osbox: onefile-launcher.sh followed by the onedir
+    bundle as a gzipped tar, which the launcher extracts once into a cache
+    directory named after the returned version.
+    """
+    # lets OSBOX_EXTRACT_VERIFY=1 check every extracted file
+    sums_file = onedir / ".osbox-files.sha256"
+    sums = []
+    for f in sorted(p for p in onedir.rglob("*") if p.is_file() and not p.is_symlink() and p != sums_file):
+        with open(f, "rb") as fh:
+            sums.append(f"{hashlib.file_digest(fh, 'sha256').hexdigest()}  {f.relative_to(onedir).as_posix()}")
+    sums_file.write_text("\n".join(sums) + "\n")
+
+    with tempfile.TemporaryDirectory() as td:
+        payload = Path(td) / "payload.tar.gz"
+        with tarfile.open(payload, "w:gz", compresslevel=6) as tar:
+            for item in sorted(onedir.iterdir()):
+                tar.add(item, arcname=item.name)
+        with open(payload, "rb") as fh:
+            payload_sha256 = hashlib.file_digest(fh, "sha256").hexdigest()
+
+        # the same commit can be built with different trees or toolchains
+        version = f"{git_sha}-{payload_sha256[:12]}"
+        stub = launcher.read_text().replace("@VERSION@", version).replace("@PAYLOAD_SHA256@", payload_sha256)
+        # orders versions for the cleanup of older ones
+        stub = stub.replace("@BUILT@", str(int(time.time())))
+        # fixed width, so the offset does not change the length it counts
+        stub = stub.replace("@PAYLOAD_OFFSET@", "@" * 12)
+        stub = stub.replace("@" * 12, f"{len(stub.encode()) + 1:012d}")
+
+        with open(out, "wb") as f:
+            f.write(stub.encode())
+            with open(payload, "rb") as fh:
+                shutil.copyfileobj(fh, f)
+    out.chmod(0o755)
+    return version
+
+
+def build_osbox(onefile: bool = True, collect: str = "all", extract: str = "cache", size_report: bool = False):
 
     root_path = Path(__file__).parent.resolve()
     dist_path = root_path / "dist"
@@ -156,13 +651,24 @@ def build_osbox(onefile: bool = True):
 
     print(f"Starting build of osbox from {root_path}")
 
-    current_git_sha = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=root_path).decode().strip()
+    current_git_sha = source_git_sha(root_path)
     print(f"Current git SHA: {current_git_sha}")
     print(f"Writing git SHA to manifest")
     manifest["services"]["osbox"]["ref"] = current_git_sha
     with open("src/osbox/manifest.json", "w") as f:
         json.dump(manifest, f, indent=2)
 
+    print("Writing manifest command index")
+    write_manifest_index(
+        root_path / "src" / "osbox" / "manifest.json", root_path / "src" / "osbox" / "manifest_index.py"
+    )
+
+    print("Packing assets")
+    write_asset_pack(root_path / "src" / "osbox" / "assets", root_path / "src" / "osbox" / "assets.pack")
+
+    print("Indexing config options")
+    write_option_index(manifest, root_path / "src" / "osbox" / "assets", root_path / "src" / "osbox" / "options.db")
+
     print("Building osbox wheel...")
     run_cmd(
         "uv build --wheel",
@@ -176,7 +682,7 @@ def build_osbox(onefile: bool = True):
         print(f"Building in temporary directory: {build_path}")
 
         # copy entrypoint and spec file
-        for f in ["main.py", "osbox.spec", "osbox-onefile.spec"]:
+        for f in ["main.py", "osbox.spec", "osbox-onefile.spec", "pyinstaller_collect.py"]:
             src = root_path / f
             dst = build_path / f
             shutil.copy(src, dst)
@@ -214,13 +720,18 @@ def build_osbox(onefile: bool = True):
             "uv pip install pyinstaller",
             cwd=build_path,
         )
-        if onefile:
+        # "cache" onefile builds wrap the onedir bundle in a launcher that
+        # extracts it once; "tmpdir" is PyInstaller's own onefile, which
+        # unpacks into a fresh temporary directory on every run
+        if onefile and extract == "tmpdir":
             spec_file = "osbox-onefile.spec"
         else:
             spec_file = "osbox.spec"
 
+        print(f"Collecting {collect} packages")
+        report_env = "OSBOX_COLLECT_REPORT=collect-report.json " if size_report else ""
         run_cmd(
-            f"uv run pyinstaller --noconfirm {spec_file}",
+            f"{report_env}OSBOX_COLLECT={collect} uv run pyinstaller --noconfirm {spec_file}",
             cwd=build_path,
         )
 
@@ -228,6 +739,15 @@ def build_osbox(onefile: bool = True):
         built_exe = build_path / "dist" / "osbox"
         final_exe = dist_path / "osbox"
 
+        if onefile and extract == "cache":
+            print("Writing self-extracting osbox executable")
+            wrapped = build_path / "dist" / "osbox-onefile"
+            version = write_onefile_launcher(
+                built_exe, root_path / "onefile-launcher.sh", manifest["services"]["osbox"]["ref"], wrapped
+            )
+            print(f"Extracts to <cache>/{version}")
+            built_exe = wrapped
+
         if built_exe.is_dir():
             shutil.copytree(built_exe, final_exe)
         else:
@@ -235,7 +755,83 @@ def build_osbox(onefile: bool = True):
 
         print(f"Copied built osbox executable to {final_exe}")
 
+        if size_report:
+            write_bundle_report(build_path / "collect-report.json", final_exe, dist_path / "bundle-size.json")
+
 
 if __name__ == "__main__":
-    build_openstack()
-    build_osbox(onefile=False)
+    parser = argparse.ArgumentParser(description="Build the OpenStack wheelhouse and the osbox executable.")
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=int(os.environ.get("OSBOX_BUILD_JOBS", "0")) or None,
+        help="Services built in parallel (default: OSBOX_BUILD_JOBS or the number of CPUs)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Rebuild every service and leave the build cache alone",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=Path(os.environ.get("OSBOX_BUILD_CACHE", DEFAULT_BUILD_CACHE)),
+        help=f"Build cache directory (default: OSBOX_BUILD_CACHE or {DEFAULT_BUILD_CACHE})",
+    )
+    parser.add_argument(
+        "--prune-cache",
+        type=float,
+        metavar="DAYS",
+        help="Remove build cache entries not used for DAYS days before building",
+    )
+    parser.add_argument(
+        "--collect",
+        choices=("all", "pruned"),
+        default=os.environ.get("OSBOX_COLLECT", "all"),
+        help="Bundle all of site-packages, or only packages reachable from the manifest entry points "
+        "(default: OSBOX_COLLECT or all)",
+    )
+    parser.add_argument(
+        "--size-report",
+        action="store_true",
+        help="Write dist/bundle-size.json, comparing the last build of each --collect mode; "
+        "analyses site-packages even for 'all'",
+    )
+    parser.add_argument(
+        "--onefile",
+        nargs="?",
+        const="cache",
+        choices=("cache", "tmpdir"),
+        help="Build a single executable instead of a directory; 'cache' (the default) extracts it once "
+        "into a versioned cache directory, 'tmpdir' into a new temporary directory on every run",
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        default=Path(__file__).parent.resolve() / "dist" / "build-profile.json",
+        help="Where to write the JSON profile of every build step (default: dist/build-profile.json)",
+    )
+    args = parser.parse_args()
+
+    if args.prune_cache is not None:
+        removed = prune_build_cache(args.cache_dir, args.prune_cache)
+        print(f"Pruned {removed} build cache entries from {args.cache_dir}")
+
+    args.profile.parent.mkdir(parents=True, exist_ok=True)
+    steps_file = args.profile.with_suffix(".steps.jsonl")
+    steps_file.unlink(missing_ok=True)
+    os.environ["OSBOX_BUILD_STEPS"] = str(steps_file)
+    started = time.time()
+    ok = False
+    try:
+        build_openstack(jobs=args.jobs, cache_dir=None if args.no_cache else args.cache_dir)
+        build_osbox(
+            onefile=args.onefile is not None,
+            collect=args.collect,
+            extract=args.onefile or "cache",
+            size_report=args.size_report,
+        )
+        ok = True
+    finally:
+        write_build_profile(steps_file, args.profile, started, ok)
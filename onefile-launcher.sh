@@ -0,0 +1,116 @@
+#!/bin/bash
+# osbox single-file launcher, written by build.py.
+#
+# The onedir bundle is appended to this script as a gzipped tar. It is
+# extracted once into $OSBOX_EXTRACT_DIR/<version> and every later run
+# execs the cached copy directly. Running launchers hold a shared lock on
+# their version, so versions built before this one are only removed when
+# nothing uses them; newer ones are always left alone.
+set -euo pipefail
+
+version="@VERSION@"
+payload_sha256="@PAYLOAD_SHA256@"
+payload_offset=@PAYLOAD_OFFSET@
+built=@BUILT@
+
+self="${BASH_SOURCE[0]}"
+case "$self" in
+    */*) ;;
+    *) self="$(command -v -- "$self")" ;;
+esac
+
+if [ -n "${OSBOX_EXTRACT_DIR:-}" ]; then
+    cache="$OSBOX_EXTRACT_DIR"
+elif [ -n "${XDG_CACHE_HOME:-}" ]; then
+    cache="$XDG_CACHE_HOME/osbox"
+elif [ -n "${HOME:-}" ] && [ -w "${HOME}" ]; then
+    cache="$HOME/.cache/osbox"
+else
+    cache="${TMPDIR:-/tmp}/osbox-$(id -u)"
+fi
+target="$cache/$version"
+marker="$target/.osbox-extracted"
+
+intact() {
+    [ -f "$marker" ] && [ "$(cat "$marker")" = "$payload_sha256" ] && [ -x "$target/osbox" ] || return 1
+    # OSBOX_EXTRACT_VERIFY=1 checks every file, not just the marker
+    if [ "${OSBOX_EXTRACT_VERIFY:-0}" = "1" ]; then
+        (cd "$target" && sha256sum --quiet --strict -c .osbox-files.sha256) >&2 || return 1
+    fi
+}
+
+extract() {
+    local tmp
+    tmp="$(mktemp -d "$cache/.extract-$version.XXXXXX")"
+    if ! tail -c +"$payload_offset" "$self" | tar -xzf - -C "$tmp"; then
+        rm -rf "$tmp"
+        echo "osbox: failed to extract $self into $cache" >&2
+        exit 1
+    fi
+    printf '%s' "$payload_sha256" >"$tmp/.osbox-extracted"
+    printf '%s' "$built" >"$tmp/.osbox-built"
+    # mktemp creates it 0700; a shared OSBOX_EXTRACT_DIR needs it readable
+    chmod 755 "$tmp"
+
+    # rename is atomic: concurrent launchers either see no directory or a
+    # complete one, and whoever renames second drops its copy
+    if [ -e "$target" ] && ! intact 2>/dev/null; then
+        local broken
+        broken="$(mktemp -d "$cache/.broken-$version.XXXXXX")"
+        mv "$target" "$broken/" 2>/dev/null || true
+        rm -rf "$broken"
+    fi
+    mv -T "$tmp" "$target" 2>/dev/null || rm -rf "$tmp"
+
+    # extractions interrupted more than a day ago
+    find "$cache" -maxdepth 1 \( -name '.extract-*' -o -name '.broken-*' \) -mmin +1440 \
+        -exec rm -rf {} + 2>/dev/null || true
+}
+
+cleanup_stale() {
+    command -v flock >/dev/null || return 0
+    local lock dir other
+    for lock in "$cache"/*.lock; do
+        [ -e "$lock" ] && [ "$lock" != "$cache/$version.lock" ] || continue
+        dir="${lock%.lock}"
+        # only versions built before this one (extractions without a build
+        # stamp predate it), so an older binary still sharing the cache, e.g.
+        # during a rolling upgrade, never removes the newer copy
+        other="$(cat "$dir/.osbox-built" 2>/dev/null || echo 0)"
+        case "$other" in
+            '' | *[!0-9]*) other=0 ;;
+        esac
+        [ "$other" -lt "$built" ] || continue
+        # and that no running launcher holds a shared lock on
+        (
+            flock -xn 9 || exit 0
+            rm -rf "$dir"
+            rm -f "$lock"
+        ) 9<"$lock" 2>/dev/null || true
+    done
+}
+
+mkdir -p "$cache"
+if command -v flock >/dev/null; then
+    # retry if a cleanup removed the lock file between opening and locking it
+    while :; do
+        touch "$cache/$version.lock"
+        exec 9<"$cache/$version.lock"
+        flock -s 9
+        [ "$cache/$version.lock" -ef /dev/fd/9 ] && break
+    done
+    # fd 9 does not reach processes started with close_fds, so osbox takes
+    # its own shared lock on this file at startup
+    export OSBOX_EXTRACT_LOCK="$cache/$version.lock"
+fi
+
+if ! intact; then
+    extract
+    intact || { echo "osbox: extracted bundle in $target is incomplete" >&2; exit 1; }
+fi
+# costs nothing unless older versions are left
+cleanup_stale
+
+# fd 9 keeps the shared lock until osbox has taken its own; argv[0] is kept
+# so commands can be run through symlinks
+exec -a "$0" "$target/osbox" "$@"
@@ -1,54 +1,22 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+import os
 import sys
-import site
 from pathlib import Path
-from PyInstaller.utils.hooks import collect_all, collect_submodules
 
-hiddenimports = []
-datas = []
-binaries = []
-
-# Get site-packages directories for the current venv
-site_packages_dirs = site.getsitepackages()
-if hasattr(site, 'getusersitepackages'):
-    site_packages_dirs.append(site.getusersitepackages())
-
-# Collect all top-level packages/modules from site-packages
-packages = set()
-for site_dir in site_packages_dirs:
-    site_path = Path(site_dir)
-    if not site_path.exists():
-        continue
-    
-    for item in site_path.iterdir():
-        # Skip dist-info, egg-info directories
-        if item.name.endswith(('.dist-info', '.egg-info', '.egg-link')):
-            continue
-        # Skip __pycache__
-        if item.name == '__pycache__':
-            continue
-        
-        # Check if it's a package (directory with __init__.py) or a module (.py file)
-        if item.is_dir() and (item / '__init__.py').exists():
-            packages.add(item.name)
-        elif item.is_file() and item.suffix == '.py' and item.stem != '__pycache__':
-            packages.add(item.stem)
-
-print(f"Found {len(packages)} packages in site-packages")
-
-for pkg in sorted(packages):
-    if pkg in ('antigravity', '_virtualenv'):
-        continue
-    print(f"Collecting {pkg}")
-    try:
-        d, b, h = collect_all(pkg)
-        datas += d
-        binaries += b
-        hiddenimports += h
-        hiddenimports += collect_submodules(pkg)
-    except Exception as e:
-        print(f"Warning: Failed to collect {pkg}: {e}")
+# the collection logic is shared by both specs, see pyinstaller_collect.py
+sys.path.insert(0, SPECPATH)
+from pyinstaller_collect import collect, load_manifest, mode_from_env
+
+# OSBOX_COLLECT=all, the default, bundles every package in site-packages,
+# "pruned" only what the manifest entry points can reach; a size report is
+# only written when OSBOX_COLLECT_REPORT names a file
+report_file = os.environ.get("OSBOX_COLLECT_REPORT")
+datas, binaries, hiddenimports = collect(
+    mode_from_env(),
+    load_manifest(),
+    report_file=Path(SPECPATH) / report_file if report_file else None,
+)
 
 a = Analysis(
     ['main.py'],
@@ -0,0 +1,325 @@
+"""
+What the PyInstaller specs put into the bundle.
+
+"all" is the original behaviour and still the default: every top-level
+package in site-packages, with all submodules and data, and no analysis
+unless a size report was asked for. "pruned" starts
+from the entry points in the manifest (commands, wsgi apps, zygote
+preloads, extra packages), every installed provider of a plugin entry point
+group and the apps and filters named in the paste ini assets, and follows
+imports package by package, so only packages that can actually be loaded
+end up in the bundle, without their test suites.
+
+Pruning is per top-level package, not per module: OpenStack loads drivers
+and options by dotted name from config (importutils, stevedore, paste), so
+any module of a reachable package has to stay importable.
+"""
+
+from __future__ import annotations
+
+import ast
+import fnmatch
+import importlib.metadata
+import importlib.util
+import json
+import os
+import re
+import site
+import sys
+from pathlib import Path
+
+# entry point groups whose plugins are loaded by name at runtime; the
+# service packages' own groups (nova.*, keystone.*, ...) are added from
+# the manifest, and a service can declare more with "plugin_groups"
+PLUGIN_GROUPS = (
+    "oslo.config.opts",
+    "oslo.config.opts.defaults",
+    "oslo.config.driver",
+    "oslo.policy.policies",
+    "oslo.policy.enforcer",
+    "oslo.policy.rule_checks",
+    "oslo.messaging.*",
+    "oslo.middleware.*",
+    "oslo_cache.*",
+    "paste.*",
+    "sqlalchemy.dialects",
+    "sqlalchemy.plugins",
+    "keystoneauth1.plugin",
+    "dogpile.cache",
+    "openstack.cli.extension",
+    "openstack.*.v*",
+)
+
+# names of functions that import their (constant) string argument
+DYNAMIC_IMPORTS = {"import_module", "import_class", "import_object", "try_import", "__import__", "import_string"}
+
+SKIP_PACKAGES = ("antigravity", "_virtualenv")
+TEST_DIRS = ("tests", "test")
+
+
+def site_packages() -> list[Path]:
+    dirs = site.getsitepackages()
+    if hasattr(site, "getusersitepackages"):
+        dirs.append(site.getusersitepackages())
+    return [Path(d) for d in dirs if Path(d).exists()]
+
+
+def installed_packages(namespaces: bool = True) -> dict[str, Path]:
+    """
+    Top-level packages and modules in site-packages, by name. "all" leaves
+    out namespace packages, as the original spec did.
+    """
+    packages: dict[str, Path] = {}
+    for site_path in site_packages():
+        for item in site_path.iterdir():
+            if item.name.endswith((".dist-info", ".egg-info", ".egg-link")) or item.name == "__pycache__":
+                continue
+            if item.is_dir() and (item / "__init__.py").exists():
+                packages.setdefault(item.name, item)
+            elif item.is_file() and item.suffix == ".py":
+                packages.setdefault(item.stem, item)
+            elif namespaces and item.is_dir() and item.name.isidentifier() and any(item.glob("**/*.py")):
+                # namespace packages such as oslo_* under a shared parent
+                packages.setdefault(item.name, item)
+    return {name: path for name, path in packages.items() if name not in SKIP_PACKAGES}
+
+
+def _is_test_path(path: Path, root: Path) -> bool:
+    return any(part in TEST_DIRS for part in path.relative_to(root).parts[:-1])
+
+
+def _python_files(path: Path, skip_tests: bool):
+    if path.is_file():
+        yield path
+        return
+    for file in path.rglob("*.py"):
+        if skip_tests and _is_test_path(file, path):
+            continue
+        yield file
+
+
+def imported_names(path: Path) -> set[str]:
+    """Top-level names imported anywhere in a package, statically or by constant string."""
+    names: set[str] = set()
+    for file in _python_files(path, skip_tests=True):
+        try:
+            tree = ast.parse(file.read_bytes(), filename=str(file))
+        except (SyntaxError, ValueError):
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names.update(alias.name.split(".")[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                if node.level == 0 and node.module:
+                    names.add(node.module.split(".")[0])
+            elif isinstance(node, ast.Call) and node.args:
+                func = node.func
+                name = func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", None)
+                arg = node.args[0]
+                if name in DYNAMIC_IMPORTS and isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                    names.add(arg.value.split(".")[0].split(":")[0])
+    return names
+
+
+def _top(module: str) -> str:
+    return module.split(":")[0].split(".")[0]
+
+
+def manifest_roots(manifest: dict) -> tuple[dict[str, str], list[str]]:
+    """Top-level packages named by the manifest, and the plugin groups to follow."""
+    by_dist = _packages_by_distribution()
+    roots = {"osbox": "manifest"}
+    groups = list(PLUGIN_GROUPS)
+    for service_info in manifest["services"].values():
+        for command in service_info.get("commands", []):
+            top = _top(command["module"])
+            roots.setdefault(top, "manifest")
+            groups.append(f"{top}.*")
+        for module in service_info.get("zygote_preload", []):
+            roots.setdefault(_top(module), "manifest")
+        for pkg in service_info.get("extra_packages", []):
+            # extra packages are loaded by name (database drivers, cache clients)
+            for top in by_dist.get(_normalize(pkg), {_normalize(pkg).replace("-", "_")}):
+                roots.setdefault(top, f"extra package {pkg}")
+        groups.extend(service_info.get("plugin_groups", []))
+    return roots, groups
+
+
+def plugin_roots(groups: list[str]) -> dict[str, str]:
+    """
+    Packages of every installed distribution that provides an entry point in
+    one of groups; a plugin is usually only named by configuration.
+    """
+    roots: dict[str, str] = {}
+    for dist in importlib.metadata.distributions():
+        for ep in dist.entry_points:
+            if any(fnmatch.fnmatch(ep.group, g) for g in groups):
+                roots.setdefault(_top(ep.value), f"plugin {ep.group}")
+    return roots
+
+
+# paste deploy pipelines name their apps and filters in the ini assets,
+# either as module:callable or through a distribution's entry points
+PASTE_FACTORY_RE = re.compile(
+    r"^\s*(?:paste\.\w+_factory|use)\s*=\s*(?:call:)?(?!(?:egg|config):)([A-Za-z_][\w.]*):\w+", re.M
+)
+PASTE_EGG_RE = re.compile(r"^\s*use\s*=\s*egg:([\w.\-]+)", re.M)
+
+
+def asset_roots() -> dict[str, str]:
+    """Packages referenced by the paste ini files among the service assets."""
+    osbox_dir = _osbox_dir()
+    texts: dict[str, str] = {}
+    if (osbox_dir / "assets.pack").exists():
+        from osbox.assetpack import AssetPack
+
+        with AssetPack(osbox_dir / "assets.pack") as pack:
+            for name in pack.index:
+                if name.endswith(".ini"):
+                    view = pack.view(name)
+                    texts[name] = bytes(view).decode(errors="replace")
+                    view.release()
+    elif (osbox_dir / "assets").is_dir():
+        for path in (osbox_dir / "assets").rglob("*.ini"):
+            texts[path.relative_to(osbox_dir / "assets").as_posix()] = path.read_text(errors="replace")
+
+    by_dist = _packages_by_distribution()
+    roots: dict[str, str] = {}
+    for name, text in sorted(texts.items()):
+        for module in PASTE_FACTORY_RE.findall(text):
+            roots.setdefault(_top(module), f"asset {name}")
+        for dist in PASTE_EGG_RE.findall(text):
+            for top in by_dist.get(_normalize(dist), ()):
+                roots.setdefault(top, f"asset {name}")
+    return roots
+
+
+def _normalize(dist_name: str) -> str:
+    for sep in "<>=!~[;":
+        dist_name = dist_name.split(sep)[0]
+    return dist_name.strip().lower().replace("_", "-").replace(".", "-")
+
+
+def _packages_by_distribution() -> dict[str, set[str]]:
+    by_dist: dict[str, set[str]] = {}
+    for top, dists in importlib.metadata.packages_distributions().items():
+        for dist in dists:
+            by_dist.setdefault(_normalize(dist), set()).add(top)
+    return by_dist
+
+
+def reachable(roots: dict[str, str], packages: dict[str, Path]) -> dict[str, str]:
+    """
+    Installed packages reachable from roots through imports, mapped to how
+    they were first reached.
+    """
+    reason = {root: why for root, why in roots.items() if root in packages}
+    queue = sorted(reason)
+    while queue:
+        top = queue.pop()
+        for name in sorted(imported_names(packages[top])):
+            if name in packages and name not in reason:
+                reason[name] = top
+                queue.append(name)
+    return reason
+
+
+def disk_size(path: Path, skip_tests: bool = False) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(
+        f.stat().st_size
+        for f in path.rglob("*")
+        if f.is_file() and "__pycache__" not in f.parts and not (skip_tests and _is_test_path(f, path))
+    )
+
+
+def _not_tests(name: str) -> bool:
+    return not any(part in TEST_DIRS for part in name.split(".")[1:])
+
+
+def collect(mode: str, manifest: dict, report_file: Path | None = None):
+    """Returns (datas, binaries, hiddenimports) for the Analysis."""
+    from PyInstaller.utils.hooks import (
+        collect_all,
+        collect_data_files,
+        collect_dynamic_libs,
+        collect_submodules,
+        copy_metadata,
+    )
+
+    if mode not in ("all", "pruned"):
+        raise ValueError(f"Unknown collection mode: {mode}")
+
+    packages = installed_packages(namespaces=mode == "pruned")
+    print(f"Found {len(packages)} packages in site-packages")
+    reached: dict[str, str] = {}
+    if mode == "pruned" or report_file is not None:
+        roots, groups = manifest_roots(manifest)
+        for extra in (plugin_roots(groups), asset_roots()):
+            for top, why in extra.items():
+                roots.setdefault(top, why)
+        reached = reachable(roots, packages)
+        print(f"{len(reached)} packages reachable from the manifest entry points")
+
+    datas, binaries, hiddenimports = [], [], []
+    selected = sorted(packages) if mode == "all" else sorted(reached)
+    dists_by_top = importlib.metadata.packages_distributions()
+    for pkg in selected:
+        print(f"Collecting {pkg}")
+        try:
+            if mode == "all":
+                d, b, h = collect_all(pkg)
+                datas += d
+                binaries += b
+                hiddenimports += h
+                hiddenimports += collect_submodules(pkg)
+            else:
+                hiddenimports += collect_submodules(pkg, filter=_not_tests)
+                datas += collect_data_files(pkg, excludes=[f"**/{d}/**" for d in TEST_DIRS])
+                binaries += collect_dynamic_libs(pkg)
+                # entry points and versions are read from the metadata
+                for dist in dists_by_top.get(pkg, []):
+                    try:
+                        datas += copy_metadata(dist)
+                    except Exception:
+                        pass
+        except Exception as e:
+            print(f"Warning: Failed to collect {pkg}: {e}")
+
+    if report_file is not None:
+        report_file.write_text(json.dumps(size_report(mode, packages, reached), indent=2) + "\n")
+    return datas, binaries, hiddenimports
+
+
+def size_report(mode: str, packages: dict[str, Path], reached: dict[str, str]) -> dict:
+    """Source sizes of what each mode collects, before PyInstaller compiles and compresses them."""
+    full = {name: disk_size(path) for name, path in packages.items()}
+    pruned = {name: disk_size(packages[name], skip_tests=True) for name in reached}
+    dropped = {name: size for name, size in full.items() if name not in reached}
+    return {
+        "mode": mode,
+        "python": sys.version.split()[0],
+        "packages": {"all": len(full), "pruned": len(pruned)},
+        "source_bytes": {"all": sum(full.values()), "pruned": sum(pruned.values())},
+        "tests_bytes": sum(full[name] - pruned[name] for name in pruned),
+        "dropped": dict(sorted(dropped.items(), key=lambda item: -item[1])),
+        "reached_from": dict(sorted(reached.items())),
+    }
+
+
+def _osbox_dir() -> Path:
+    spec = importlib.util.find_spec("osbox")
+    if spec is None or not spec.submodule_search_locations:
+        raise RuntimeError("osbox is not installed in the build environment")
+    return Path(list(spec.submodule_search_locations)[0])
+
+
+def load_manifest() -> dict:
+    return json.loads((_osbox_dir() / "manifest.json").read_text())
+
+
+def mode_from_env() -> str:
+    # "pruned" becomes the default once its bundle has been smoke tested
+    # against every service
+    return os.environ.get("OSBOX_COLLECT", "all")
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from gunicorn.glogging import Logger
+
+BATCH_SIZE = 512
+
+
+class AsyncJSONLogger(Logger):
+    """
+    Gunicorn logger writing access records as JSON lines from a background
+    thread. Request handling only formats the record and puts it on a
+    bounded queue; if the queue is full the record is dropped and counted
+    rather than blocking the worker.
+
+    The queue size and the sampling rate for 2xx responses come from the
+    class attributes, set per service by wsgi_server().
+    """
+
+    queue_size = 10000
+    sample_2xx = 1.0
+
+    def setup(self, cfg):
+        super().setup(cfg)
+        self._pid: int | None = None
+        self._queue: queue.Queue[str] = queue.Queue(self.queue_size)
+        self._dropped = 0
+        self._stream = None
+        # guards the writer start and the drop counter against the request
+        # threads of a gthread worker
+        self._lock = threading.Lock()
+
+    def _start_writer(self) -> None:
+        # the logger is created in the master, the writer thread has to be
+        # started in each worker after the fork
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(self.queue_size)
+            self._dropped = 0
+            if self.cfg.accesslog == "-":
+                self._stream = sys.stdout
+            else:
+                self._stream = open(self.cfg.accesslog, "a", encoding="utf-8")
+            threading.Thread(target=self._write_loop, name="osbox-accesslog", daemon=True).start()
+            atexit.register(self._drain)
+            self._pid = os.getpid()
+
+    def _write_batch(self, first: str | None = None) -> None:
+        lines = [first] if first is not None else []
+        while len(lines) < BATCH_SIZE:
+            try:
+                lines.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        with self._lock:
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            lines.append(json.dumps({"ts": time.time(), "service": self.cfg.proc_name, "pid": self._pid, "dropped": dropped}))
+        if not lines:
+            return
+
+        try:
+            self._stream.write("\n".join(lines) + "\n")
+            self._stream.flush()
+        except Exception:
+            pass
+
+    def _write_loop(self) -> None:
+        while True:
+            try:
+                first = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                first = None
+            self._write_batch(first)
+
+    def _drain(self) -> None:
+        while not self._queue.empty() or self._dropped:
+            self._write_batch()
+
+    def access(self, resp, req, environ, request_time):
+        if not self.cfg.accesslog:
+            return
+
+        if self._pid != os.getpid():
+            self._start_writer()
+
+        status = str(resp.status).split(" ", 1)[0]
+        if status.startswith("2") and self.sample_2xx < 1.0 and random.random() >= self.sample_2xx:
+            return
+
+        record = {
+            "ts": time.time(),
+            "service": self.cfg.proc_name,
+            "pid": self._pid,
+            "remote": environ.get("REMOTE_ADDR"),
+            "method": req.method,
+            "path": req.path,
+            "query": req.query,
+            "status": int(status) if status.isdigit() else status,
+            "bytes": getattr(resp, "sent", 0),
+            "duration_ms": round(request_time.total_seconds() * 1000, 3),
+            "user_agent": environ.get("HTTP_USER_AGENT"),
+        }
+        try:
+            self._queue.put_nowait(json.dumps(record))
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
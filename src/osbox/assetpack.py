@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import tarfile
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+# Layout of assets.pack:
+#
+#   header   MAGIC, then index offset and length as little-endian u64
+#   data     file contents back to back
+#   index    JSON {"<service>/<path>": [offset, size, mode], ...}
+#
+# Readers mmap the file once and hand out slices or sendfile() ranges, so
+# no asset is ever read into memory as a whole.
+MAGIC = b"OSBXPAK1"
+HEADER = struct.Struct("<8sQQ")
+CHUNK_SIZE = 1024 * 1024
+
+
+def write_pack(assets_dir: Path, pack_file: Path) -> int:
+    """Packs every file under assets_dir into pack_file, returns the file count."""
+    index: dict[str, list[int]] = {}
+    tmp = pack_file.with_suffix(".tmp")
+    with open(tmp, "wb") as out:
+        out.write(HEADER.pack(MAGIC, 0, 0))
+        for path in sorted(p for p in assets_dir.rglob("*") if p.is_file()):
+            name = path.relative_to(assets_dir).as_posix()
+            offset = out.tell()
+            with open(path, "rb") as f:
+                size = _copy(f, out)
+            index[name] = [offset, size, path.stat().st_mode & 0o777]
+        index_data = json.dumps(index, separators=(",", ":")).encode()
+        index_offset = out.tell()
+        out.write(index_data)
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, index_offset, len(index_data)))
+    os.replace(tmp, pack_file)
+    return len(index)
+
+
+def _copy(src: BinaryIO, dst: BinaryIO) -> int:
+    size = 0
+    while chunk := src.read(CHUNK_SIZE):
+        dst.write(chunk)
+        size += len(chunk)
+    return size
+
+
+class _SliceReader:
+    """File-like view of a range of the pack, for tarfile."""
+
+    def __init__(self, view: memoryview):
+        self.view = view
+        self.pos = 0
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self.view) if size < 0 else min(len(self.view), self.pos + size)
+        data = self.view[self.pos : end].tobytes()
+        self.pos = end
+        return data
+
+
+class AssetPack:
+    def __init__(self, pack_file: Path | str):
+        self.file = open(pack_file, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, index_offset, index_size = HEADER.unpack_from(self.map, 0)
+            if magic != MAGIC:
+                raise ValueError(f"Not an osbox asset pack: {pack_file}")
+            self.index: dict[str, list[int]] = json.loads(self.map[index_offset : index_offset + index_size])
+        except BaseException:
+            self.file.close()
+            raise
+
+    def close(self) -> None:
+        try:
+            self.map.close()
+        except BufferError:
+            # a view is still referenced (e.g. from a traceback), the
+            # mapping goes away with it
+            pass
+        self.file.close()
+
+    def __enter__(self) -> AssetPack:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def services(self) -> list[str]:
+        return sorted({name.split("/", 1)[0] for name in self.index})
+
+    def listdir(self, directory: str) -> tuple[list[str], list[str]]:
+        """Files and subdirectories directly inside directory."""
+        prefix = directory.rstrip("/") + "/"
+        files, dirs = set(), set()
+        for name in self.index:
+            if name.startswith(prefix):
+                rest = name[len(prefix) :]
+                if "/" in rest:
+                    dirs.add(rest.split("/", 1)[0])
+                else:
+                    files.add(rest)
+        return sorted(files), sorted(dirs)
+
+    def is_dir(self, directory: str) -> bool:
+        prefix = directory.rstrip("/") + "/"
+        return any(name.startswith(prefix) for name in self.index)
+
+    def size(self, name: str) -> int:
+        return self.index[name][1]
+
+    def view(self, name: str) -> memoryview:
+        offset, size, _mode = self.index[name]
+        return memoryview(self.map)[offset : offset + size]
+
+    def sendfile(self, name: str, out_fd: int) -> None:
+        """Copies an asset to out_fd in the kernel, falling back to writes from the mapping."""
+        offset, size, _mode = self.index[name]
+        end = offset + size
+        try:
+            while offset < end:
+                sent = os.sendfile(out_fd, self.file.fileno(), offset, min(end - offset, 1 << 30))
+                if sent == 0:
+                    raise OSError("sendfile wrote nothing")
+                offset += sent
+        except OSError:
+            view = memoryview(self.map)
+            while offset < end:
+                written = os.write(out_fd, view[offset : min(end, offset + CHUNK_SIZE)])
+                offset += written
+
+    def walk(self, directory: str) -> Iterator[str]:
+        prefix = directory.rstrip("/") + "/"
+        return (name for name in sorted(self.index) if name.startswith(prefix))
+
+    def write_tar(self, directory: str, out: BinaryIO) -> int:
+        """Streams every asset under directory as an uncompressed tar, returns the file count."""
+        base = directory.rstrip("/").rsplit("/", 1)[0] + "/" if "/" in directory.rstrip("/") else ""
+        count = 0
+        mtime = int(os.fstat(self.file.fileno()).st_mtime)
+        with tarfile.open(fileobj=out, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+            for name in self.walk(directory):
+                _offset, size, mode = self.index[name]
+                info = tarfile.TarInfo(name[len(base) :])
+                info.size, info.mode, info.mtime = size, mode, mtime
+                tar.addfile(info, _SliceReader(self.view(name)))
+                count += 1
+        return count
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import time
+from urllib.parse import parse_qs
+
+# A stand-in WSGI service for `osbox bench-http`, served like any other
+# osbox WSGI service (`osbox bench-app`, OSBOX_BENCH_APP_* settings):
+#
+#   /              small plain text response
+#   /sleep?ms=20   waits, like a handler blocked on the database
+#   /cpu?n=20000   burns CPU, like a handler rendering a large response
+#   /bytes?n=65536 returns a body of n bytes
+
+
+def _int_arg(query: dict[str, list[str]], name: str, default: int) -> int:
+    try:
+        return max(0, int(query[name][0]))
+    except (KeyError, ValueError):
+        return default
+
+
+def application(environ, start_response):
+    path = environ.get("PATH_INFO") or "/"
+    query = parse_qs(environ.get("QUERY_STRING", ""))
+
+    if path == "/":
+        body = b"ok\n"
+    elif path == "/sleep":
+        time.sleep(_int_arg(query, "ms", 20) / 1000)
+        body = b"ok\n"
+    elif path == "/cpu":
+        total = 0
+        for i in range(_int_arg(query, "n", 20000)):
+            total += i * i
+        body = f"{total}\n".encode()
+    elif path == "/bytes":
+        body = b"x" * _int_arg(query, "n", 65536)
+    else:
+        start_response("404 Not Found", [("Content-Type", "text/plain"), ("Content-Length", "10")])
+        return [b"not found\n"]
+
+    start_response("200 OK", [("Content-Type", "text/plain"), ("Content-Length", str(len(body)))])
+    return [body]
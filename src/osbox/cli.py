@@ -1,16 +1,23 @@
 import sys
 import os
-from osbox.manifest import Manifest
+from osbox.importprofile import install_from_env
 
 
 def main() -> None:
-    manifest = Manifest()
+    # start profiling before anything else is imported
+    install_from_env()
+    _hold_extract_lock()
+
+    # everything past this point is imported on demand, so a command only
+    # pays for the modules it actually uses
+    from osbox.manifest import Manifest, find_command
 
     invoked_as = os.path.basename(sys.argv[0])
 
     # check if invoked as a command
-    if manifest.has_command(invoked_as):
-        sys.exit(manifest.run(invoked_as))
+    command_info = find_command(invoked_as)
+    if command_info:
+        sys.exit(_run(command_info))
         return
 
     # otherwise first arg is the command
@@ -18,14 +25,54 @@ def main() -> None:
     try:
         cmd = sys.argv[0]
     except IndexError:
+        manifest = Manifest()
         print(f"Usage: {invoked_as} <command> [args...]")
         print("Available commands:")
         for command in manifest.commands:
             print(f"  {command}")
         sys.exit(0)
 
-    if not manifest.has_command(cmd):
+    command_info = find_command(cmd)
+    if not command_info:
         print(f"Unknown command: {cmd}", file=sys.stderr)
         sys.exit(1)
 
-    sys.exit(manifest.run(cmd))
\ No newline at end of file
+    sys.exit(_run(command_info))
+
+
+def _hold_extract_lock() -> None:
+    # the onefile launcher's lock on the extracted version is on an fd that
+    # subprocesses started with close_fds do not inherit, so every osbox
+    # process holds its own for as long as it runs
+    lock_file = os.environ.get("OSBOX_EXTRACT_LOCK")
+    if not lock_file:
+        return
+    import fcntl
+
+    try:
+        fd = os.open(lock_file, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+    except OSError:
+        # a cleanup is removing this version, nothing left to protect
+        os.close(fd)
+
+
+def _run(command_info):
+    from osbox.manifest import run_command
+
+    # hand short-lived commands to a running zygote when one is configured,
+    # falling back to running them here if it is not up
+    zygote_socket = os.environ.get("OSBOX_ZYGOTE_SOCKET")
+    if zygote_socket:
+        from osbox.cmd.zygote import run_in_zygote, zygote_allowed
+
+        if zygote_allowed(command_info):
+            code = run_in_zygote(zygote_socket, command_info["name"], sys.argv)
+            if code is not None:
+                return code
+
+    return run_command(command_info)
+
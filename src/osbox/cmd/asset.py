@@ -1,11 +1,50 @@
 from pathlib import Path
 import argparse
+import json
+import shutil
 import sys
+import tarfile
+
+from osbox.assetpack import AssetPack
+
+# the build packs assets/ into assets.pack; a source checkout has only the
+# loose files
+ASSETS_DIR = Path(__file__).parent.parent / "assets"
+ASSETS_PACK = Path(__file__).parent.parent / "assets.pack"
+# options of the generated configs, also built by build.py
+OPTIONS_INDEX = Path(__file__).parent.parent / "options.db"
+
+
+def _open_pack() -> AssetPack | None:
+    if ASSETS_PACK.exists():
+        return AssetPack(ASSETS_PACK)
+    return None
 
 
 def cmd_asset_list(service_name: str | None = None):
-    assets_dir = Path(__file__).parent.parent / "assets"
-    
+    pack = _open_pack()
+    if pack is None:
+        return _list_loose(service_name)
+
+    with pack:
+        if service_name and not pack.is_dir(service_name):
+            print(f"Unknown service or no assets for service: {service_name}")
+            sys.exit(1)
+
+        for service in pack.services():
+            if service_name and service != service_name:
+                continue
+            print(f"{service}")
+            files, dirs = pack.listdir(service)
+            for name in files:
+                print(f"  {name}")
+            for name in dirs:
+                print(f"  {name}/")
+
+
+def _list_loose(service_name: str | None = None):
+    assets_dir = ASSETS_DIR
+
     if service_name:
         list_dir = assets_dir / service_name
         if not list_dir.exists() or not list_dir.is_dir():
@@ -20,23 +59,129 @@ def cmd_asset_list(service_name: str | None = None):
             for asset_file in service_dir.iterdir():
                 if asset_file.is_file():
                     print(f"  {asset_file.name}")
+            for asset_file in service_dir.iterdir():
+                if asset_file.is_dir():
+                    print(f"  {asset_file.name}/")
 
 
 def cmd_asset_cat(service_name: str, asset_name: str):
-    assets_dir = Path(__file__).parent.parent / "assets"
-    asset_path = assets_dir / service_name / asset_name
+    name = f"{service_name}/{asset_name}"
+    pack = _open_pack()
+    # bytes go straight to the stdout fd, never through a Python string
+    sys.stdout.flush()
+    out_fd = sys.stdout.fileno()
+
+    if pack is not None:
+        with pack:
+            if name not in pack.index:
+                print(f"Asset not found: {name}")
+                sys.exit(1)
+            pack.sendfile(name, out_fd)
+            view = pack.view(name)
+            missing_newline = len(view) and view[-1:] != b"\n"
+            view.release()
+    else:
+        asset_path = ASSETS_DIR / service_name / asset_name
+        if not asset_path.exists() or not asset_path.is_file():
+            print(f"Asset not found: {name}")
+            sys.exit(1)
+
+        with asset_path.open("rb") as f:
+            shutil.copyfileobj(f, sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+            size = f.tell()
+            missing_newline = False
+            if size:
+                f.seek(size - 1)
+                missing_newline = f.read(1) != b"\n"
+
+    if missing_newline:
+        sys.stdout.write("\n")
+
+
+def cmd_asset_tar(service_name: str, directory: str | None = None, output: str | None = None):
+    name = f"{service_name}/{directory.strip('/')}" if directory else service_name
+    out = open(output, "wb") if output else sys.stdout.buffer
+    pack = _open_pack()
+    try:
+        if pack is not None:
+            with pack:
+                if not pack.is_dir(name):
+                    print(f"Asset directory not found: {name}", file=sys.stderr)
+                    sys.exit(1)
+                pack.write_tar(name, out)
+        else:
+            asset_dir = ASSETS_DIR / name
+            if not asset_dir.is_dir():
+                print(f"Asset directory not found: {name}", file=sys.stderr)
+                sys.exit(1)
+            with tarfile.open(fileobj=out, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+                tar.add(asset_dir, arcname=asset_dir.name)
+    finally:
+        out.flush()
+        if output:
+            out.close()
+
 
-    if not asset_path.exists() or not asset_path.is_file():
-        print(f"Asset not found: {service_name}/{asset_name}")
+def _require_index():
+    if not OPTIONS_INDEX.exists():
+        print(f"Option index not found: {OPTIONS_INDEX} (it is built by build.py)", file=sys.stderr)
+        sys.exit(1)
+
+
+def _print_option(option, verbose: bool = True):
+    kind = f"{option.type} value, " if option.type else ""
+    # multi valued options keep one default per line
+    default = "<None>" if option.default is None else ", ".join(option.default.splitlines())
+    print(f"[{option.section}] {option.name} = {default}  ({kind}{option.service}/{option.asset})")
+    if verbose and option.help:
+        for line in option.help.splitlines():
+            print(f"    {line}".rstrip())
+
+
+def cmd_asset_get(service_name: str, option: str, as_json: bool = False):
+    from osbox.optionindex import get
+
+    section, _, name = option.rpartition(".")
+    if not section or not name:
+        print(f"Expected <section>.<option>, got: {option}", file=sys.stderr)
+        sys.exit(1)
+
+    _require_index()
+    options = get(OPTIONS_INDEX, service_name, section, name)
+    if not options:
+        print(f"Option not found: {service_name} [{section}] {name}", file=sys.stderr)
+        sys.exit(1)
+
+    if as_json:
+        print(json.dumps([o.to_dict() for o in options], indent=2))
+        return
+    for i, o in enumerate(options):
+        if i:
+            print()
+        _print_option(o)
+
+
+def cmd_asset_search(
+    pattern: str,
+    service_name: str | None = None,
+    in_help: bool = False,
+    limit: int | None = None,
+    as_json: bool = False,
+):
+    from osbox.optionindex import search
+
+    _require_index()
+    options = search(OPTIONS_INDEX, pattern, service=service_name, in_help=in_help, limit=limit)
+    if as_json:
+        print(json.dumps([o.to_dict() for o in options], indent=2))
+    else:
+        for o in options:
+            _print_option(o, verbose=False)
+    if not options:
         sys.exit(1)
 
-    with asset_path.open("r", encoding="utf-8") as f:
-        content = f.read()
-        sys.stdout.write(content)
-        if content and not content.endswith("\n"):
-            sys.stdout.write("\n")
 
-    
 def main():
     parser = argparse.ArgumentParser(prog="osbox asset")
     subparsers = parser.add_subparsers(dest="command", required=True)
@@ -60,11 +205,52 @@ def main():
     cat_parser.add_argument("service_name", help="Service the asset belongs to")
     cat_parser.add_argument("asset_name", help="Asset filename to print")
 
+    tar_parser = subparsers.add_parser(
+        "tar",
+        help="Write an asset directory as a tar stream",
+        description="Write all assets of a service, or one asset directory, as an uncompressed tar",
+    )
+    tar_parser.add_argument("service_name", help="Service the assets belong to")
+    tar_parser.add_argument("directory", nargs="?", help="Asset directory, e.g. metadefs (default: all)")
+    tar_parser.add_argument("-o", "--output", help="Write to this file instead of stdout")
+
+    get_parser = subparsers.add_parser(
+        "get",
+        help="Show a config option of a service",
+        description="Show default, type and help of an option in a service's generated config",
+    )
+    get_parser.add_argument("service_name", help="Service the config belongs to")
+    get_parser.add_argument("option", help="Option as <section>.<option>, e.g. database.connection")
+    get_parser.add_argument("--json", action="store_true", help="Print JSON")
+
+    search_parser = subparsers.add_parser(
+        "search",
+        help="Search the config options of all services",
+        description="Find options whose <section>.<option> contains pattern, or matches it as a glob",
+    )
+    search_parser.add_argument("pattern", help="Substring, or glob such as 'database.*pool*'")
+    search_parser.add_argument("--service", dest="service_name", help="Only options of this service")
+    search_parser.add_argument("--help-text", action="store_true", help="Also match the help text")
+    search_parser.add_argument("--limit", type=int, help="Show at most this many options")
+    search_parser.add_argument("--json", action="store_true", help="Print JSON")
+
     args = parser.parse_args(args=None if sys.argv[1:] else ["--help"])
 
     if args.command == "list":
         cmd_asset_list(service_name=args.service_name)
     elif args.command == "cat":
         cmd_asset_cat(service_name=args.service_name, asset_name=args.asset_name)
+    elif args.command == "tar":
+        cmd_asset_tar(service_name=args.service_name, directory=args.directory, output=args.output)
+    elif args.command == "get":
+        cmd_asset_get(service_name=args.service_name, option=args.option, as_json=args.json)
+    elif args.command == "search":
+        cmd_asset_search(
+            pattern=args.pattern,
+            service_name=args.service_name,
+            in_help=args.help_text,
+            limit=args.limit,
+            as_json=args.json,
+        )
     else:
-        parser.error(f"Unknown command: {args.command}")
\ No newline at end of file
+        parser.error(f"Unknown command: {args.command}")
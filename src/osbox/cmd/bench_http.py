@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import ssl
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+from urllib.parse import urlparse
+
+from osbox.cmd.check_http import normalize_url, parse_headers, parse_status_list, percentile
+
+# upper bounds of the latency histogram buckets in milliseconds, 1-2-5 steps
+BUCKETS_MS = [m * 10**e for e in range(-1, 5) for m in (1, 2, 5)]
+
+
+@dataclass
+class _Recorder:
+    latencies: list[float] = field(default_factory=list)
+    statuses: dict[str, int] = field(default_factory=dict)
+    errors: dict[str, int] = field(default_factory=dict)
+    failed: int = 0
+    bytes: int = 0
+
+
+class _Client:
+    """One keep-alive connection, reopened after errors."""
+
+    def __init__(self, url: str, timeout: float, insecure: bool):
+        u = urlparse(url)
+        self.https = u.scheme == "https"
+        self.host = u.hostname
+        self.port = u.port
+        self.path = u.path + (f"?{u.query}" if u.query else "")
+        self.timeout = timeout
+        self.context = ssl._create_unverified_context() if insecure else None
+        self.conn: Optional[http.client.HTTPConnection] = None
+
+    def request(self, method: str, headers: dict[str, str]) -> tuple[int, int]:
+        if self.conn is None:
+            if self.https:
+                self.conn = http.client.HTTPSConnection(
+                    self.host, self.port, timeout=self.timeout, context=self.context
+                )
+            else:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self.conn.request(method, self.path, headers=headers)
+            resp = self.conn.getresponse()
+            size = len(resp.read())
+        except Exception:
+            self.close()
+            raise
+        if resp.will_close:
+            self.close()
+        return resp.status, size
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def run_bench(
+    url: str,
+    *,
+    concurrency: int = 8,
+    duration: Optional[float] = 10.0,
+    requests: Optional[int] = None,
+    rate: Optional[float] = None,
+    method: str = "GET",
+    headers: Optional[dict[str, str]] = None,
+    timeout: float = 5.0,
+    ok_statuses: str = "200-399",
+    insecure: bool = False,
+    warmup: float = 0.0,
+) -> dict:
+    """
+    Sends requests to url from concurrency threads, each with its own
+    keep-alive connection, until duration seconds have passed or requests
+    requests were sent, whichever comes first.
+
+    Without rate the loop is closed: every thread sends its next request as
+    soon as the previous one finished. With rate, requests are scheduled at
+    a constant rate and latency is measured from the scheduled time, so a
+    server that falls behind shows up as queueing delay instead of
+    silently lowering the offered load.
+    """
+    ok_set = parse_status_list(ok_statuses)
+    headers = dict(headers or {})
+    lock = threading.Lock()
+    state = {"next": 0}
+    recorders = [_Recorder() for _ in range(concurrency)]
+
+    if warmup > 0:
+        client = _Client(url, timeout, insecure)
+        until = time.monotonic() + warmup
+        while time.monotonic() < until:
+            try:
+                client.request(method, headers)
+            except Exception:
+                pass
+        client.close()
+
+    start = time.monotonic()
+    deadline = start + duration if duration else None
+
+    def take() -> Optional[float]:
+        # claim the next request, returns when it should be sent
+        with lock:
+            i = state["next"]
+            if requests is not None and i >= requests:
+                return None
+            state["next"] = i + 1
+        scheduled = start + i / rate if rate else time.monotonic()
+        if deadline is not None and scheduled >= deadline:
+            return None
+        return scheduled
+
+    def worker(rec: _Recorder) -> None:
+        client = _Client(url, timeout, insecure)
+        while True:
+            scheduled = take()
+            if scheduled is None:
+                break
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                status, size = client.request(method, headers)
+            except Exception as e:
+                name = type(e).__name__
+                rec.errors[name] = rec.errors.get(name, 0) + 1
+                rec.failed += 1
+                continue
+            rec.latencies.append(time.monotonic() - scheduled)
+            rec.statuses[str(status)] = rec.statuses.get(str(status), 0) + 1
+            rec.bytes += size
+            if status not in ok_set:
+                rec.failed += 1
+        client.close()
+
+    threads = [threading.Thread(target=worker, args=(rec,), daemon=True) for rec in recorders]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - start
+
+    latencies = sorted(x for rec in recorders for x in rec.latencies)
+    statuses: dict[str, int] = {}
+    errors: dict[str, int] = {}
+    for rec in recorders:
+        for key, count in rec.statuses.items():
+            statuses[key] = statuses.get(key, 0) + count
+        for key, count in rec.errors.items():
+            errors[key] = errors.get(key, 0) + count
+
+    histogram = []
+    i = 0
+    for bound in BUCKETS_MS:
+        count = 0
+        while i < len(latencies) and latencies[i] * 1000 <= bound:
+            count += 1
+            i += 1
+        histogram.append({"le_ms": bound, "count": count})
+    histogram.append({"le_ms": None, "count": len(latencies) - i})
+
+    total = len(latencies) + sum(errors.values())
+    failed = sum(rec.failed for rec in recorders)
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        "url": url,
+        "method": method,
+        "mode": "open" if rate else "closed",
+        "concurrency": concurrency,
+        "rate": rate,
+        "duration": round(elapsed, 3),
+        "requests": total,
+        "failed": failed,
+        "throughput": round(total / elapsed, 1) if elapsed else None,
+        "bytes": sum(rec.bytes for rec in recorders),
+        "statuses": statuses,
+        "errors": errors,
+        "latency_ms": {
+            "min": ms(latencies[0]) if latencies else None,
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+            "p50": ms(percentile(latencies, 0.5)),
+            "p90": ms(percentile(latencies, 0.9)),
+            "p99": ms(percentile(latencies, 0.99)),
+            "p999": ms(percentile(latencies, 0.999)),
+            "max": ms(latencies[-1]) if latencies else None,
+        },
+        "histogram": [b for b in histogram if b["count"]],
+    }
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(
+        prog="osbox bench-http",
+        description="Measure throughput and latency of an HTTP service. Prints a JSON report.",
+    )
+    p.add_argument("target", help="host:port[/path] or http(s)://host:port/path")
+    p.add_argument("--concurrency", "-c", type=int, default=8, help="Parallel connections (default: 8)")
+    p.add_argument("--duration", "-d", type=float, default=10.0, help="Seconds to run, 0 for no limit (default: 10)")
+    p.add_argument("--requests", "-n", type=int, help="Stop after this many requests")
+    p.add_argument(
+        "--rate",
+        type=float,
+        help="Open loop: send this many requests per second regardless of response times",
+    )
+    p.add_argument("--warmup", type=float, default=0.0, help="Seconds of unrecorded traffic first (default: 0)")
+    p.add_argument(
+        "--scheme",
+        choices=["http", "https"],
+        default="http",
+        help="Default scheme for bare host:port (default: http)",
+    )
+    p.add_argument("--path", default="/", help="Default path for bare host:port (default: /)")
+    p.add_argument("--method", choices=["GET", "HEAD"], default="GET", help="HTTP method (default: GET)")
+    p.add_argument("--timeout", type=float, default=5.0, help="Timeout seconds (default: 5)")
+    p.add_argument("--ok", default="200-399", help="OK status codes, e.g. 200-299,301,302 (default: 200-399)")
+    p.add_argument("--insecure", action="store_true", help="Skip TLS verification for https")
+    p.add_argument("--header", action="append", default=[], help='Extra header, repeatable: --header "X-Foo: bar"')
+    p.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = p.parse_args()
+
+    if args.concurrency < 1:
+        p.error("--concurrency must be at least 1")
+    if not args.duration and not args.requests:
+        p.error("--duration 0 needs --requests")
+    if args.rate is not None and args.rate <= 0:
+        p.error("--rate must be positive")
+
+    try:
+        report = run_bench(
+            normalize_url(args.target, args.scheme, args.path),
+            concurrency=args.concurrency,
+            duration=args.duration or None,
+            requests=args.requests,
+            rate=args.rate,
+            method=args.method,
+            headers=parse_headers(args.header),
+            timeout=args.timeout,
+            ok_statuses=args.ok,
+            insecure=args.insecure,
+            warmup=args.warmup,
+        )
+    except (OSError, ValueError) as e:
+        print(f"bench-http: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    text = json.dumps(report, indent=2) + "\n"
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+    sys.exit(1 if report["failed"] else 0)
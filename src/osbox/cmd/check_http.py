@@ -1,18 +1,41 @@
 from __future__ import annotations
 
 import argparse
+import json
+import math
+import os
 import sys
-from dataclasses import dataclass
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from typing import Optional
 from urllib.parse import urlparse, urlunparse
 
-import requests
+
+@dataclass(frozen=True)
+class Timing:
+    """
+    Seconds spent in each phase of the last attempt. dns, connect and tls
+    are None when the request went over a reused connection; ttfb runs
+    from sending the request to the response headers.
+    """
+
+    dns: Optional[float] = None
+    connect: Optional[float] = None
+    tls: Optional[float] = None
+    ttfb: Optional[float] = None
+    total: Optional[float] = None
 
 
 @dataclass(frozen=True)
 class CheckResult:
     ok: bool
     message: str
+    url: str = ""
+    elapsed: Optional[float] = None
+    timing: Optional[Timing] = None
+    error: Optional[str] = None
 
 
 def normalize_url(raw: str, default_scheme: str, default_path: str) -> str:
@@ -91,11 +114,16 @@ def check_http(
     ok_statuses: str = "200-399",
     insecure: bool = False,
     headers: Optional[dict[str, str]] = None,
+    session=None,
 ) -> CheckResult:
     """
     Performs the HTTP check. Returns (ok, message).
     Message is suitable for stderr on failure, or stdout on success (if you want).
+    Pass a requests.Session to reuse its connection pool across checks.
     """
+    import requests
+    from osbox import httptiming
+
     url = normalize_url(target, default_scheme, default_path)
     ok_set = parse_status_list(ok_statuses)
     
@@ -104,10 +132,14 @@ def check_http(
         **(headers or {}),
     }
 
-    session = requests.Session()
+    if session is None:
+        session = httptiming.new_session()
     last_exc: Optional[Exception] = None
+    start = time.perf_counter()
 
     for _attempt in range(retries + 1):
+        httptiming.start()
+        attempt_start = time.perf_counter()
         try:
             resp = session.request(
                 method=method,
@@ -118,17 +150,94 @@ def check_http(
                 verify=not insecure,
             )
             status = resp.status_code
+            elapsed = time.perf_counter() - start
+            phases = httptiming.finish()
+            setup = sum(phases.values())
+            timing = Timing(
+                dns=phases.get("dns"),
+                connect=phases.get("connect"),
+                tls=phases.get("tls"),
+                ttfb=max(0.0, resp.elapsed.total_seconds() - setup),
+                total=time.perf_counter() - attempt_start,
+            )
 
             if status in ok_set:
-                return CheckResult(True, f"healthy: HTTP {status} {url}")
+                return CheckResult(True, f"healthy: HTTP {status} {url}", url, elapsed, timing)
 
-            return CheckResult(False, f"unhealthy: HTTP {status} (ok: {ok_statuses}) {url}")
+            return CheckResult(
+                False, f"unhealthy: HTTP {status} (ok: {ok_statuses}) {url}", url, elapsed, timing, f"HTTP {status}"
+            )
 
         except (requests.Timeout, requests.ConnectionError) as e:
+            httptiming.finish()
             last_exc = e
             continue
 
-    return CheckResult(False, f"unhealthy: {type(last_exc).__name__ if last_exc else 'error'} {last_exc} {url}")
+    return CheckResult(
+        False,
+        f"unhealthy: {type(last_exc).__name__ if last_exc else 'error'} {last_exc} {url}",
+        url,
+        time.perf_counter() - start,
+        error=type(last_exc).__name__ if last_exc else "error",
+    )
+
+
+def check_many(
+    targets: list[str],
+    *,
+    concurrency: int = 8,
+    default_scheme: str = "http",
+    default_path: str = "/",
+    **kwargs,
+) -> list[CheckResult]:
+    """
+    Runs check_http for every target on a bounded thread pool. Targets on
+    the same host:port share one pooled session, and a hung target only
+    holds up its own slot in the pool. Results are in target order.
+    """
+    from osbox import httptiming
+
+    sessions: dict[tuple[str, str], object] = {}
+
+    def session_for(url: str):
+        u = urlparse(url)
+        key = (u.scheme, u.netloc)
+        session = sessions.get(key)
+        if session is None:
+            session = sessions[key] = httptiming.new_session(pool_maxsize=concurrency)
+        return session
+
+    jobs = []
+    for target in targets:
+        try:
+            url = normalize_url(target, default_scheme, default_path)
+        except ValueError as e:
+            jobs.append(CheckResult(False, f"unhealthy: {e} {target}", target))
+            continue
+        jobs.append((url, session_for(url)))
+
+    def run(job) -> CheckResult:
+        url, session = job
+        try:
+            return check_http(target=url, session=session, **kwargs)
+        except Exception as e:
+            return CheckResult(False, f"unhealthy: {e} {url}", url)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(targets)))) as pool:
+        futures = [job if isinstance(job, CheckResult) else pool.submit(run, job) for job in jobs]
+        results = [f if isinstance(f, CheckResult) else f.result() for f in futures]
+
+    for session in sessions.values():
+        session.close()
+    return results
+
+
+def read_targets(path: str) -> list[str]:
+    """One target per line; blank lines and # comments are skipped."""
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with stream:
+        lines = [line.split("#", 1)[0].strip() for line in stream]
+    return [line for line in lines if line]
 
 
 def _isatty() -> bool:
@@ -138,9 +247,251 @@ def _isatty() -> bool:
         return False
 
 
+def _main_many(args, targets: list[str], headers: dict[str, str]) -> None:
+    results = check_many(
+        targets,
+        concurrency=args.concurrency,
+        default_scheme=args.scheme,
+        default_path=args.path,
+        method=args.method,
+        timeout=args.timeout,
+        retries=args.retries,
+        ok_statuses=args.ok,
+        insecure=args.insecure,
+        headers=headers,
+    )
+    ok = all(r.ok for r in results)
+
+    if args.json:
+        summary = {
+            "ok": ok,
+            "total": len(results),
+            "failed": sum(1 for r in results if not r.ok),
+            "results": [{"target": t, **asdict(r)} for t, r in zip(targets, results)],
+        }
+        if not args.quiet:
+            print(json.dumps(summary, indent=2))
+    elif not args.quiet:
+        for r in results:
+            if not r.ok:
+                print(r.message, file=sys.stderr)
+            elif _isatty():
+                print(r.message)
+
+    sys.exit(0 if ok else 1)
+
+
+def percentile(sorted_values: list[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile, q in [0, 1]."""
+    if not sorted_values:
+        return None
+    rank = min(len(sorted_values), max(1, math.ceil(q * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+QUANTILES = (0.5, 0.9, 0.99)
+PHASES = ("dns", "connect", "tls", "ttfb")
+
+
+class WatchStats:
+    """
+    Rolling latency window and lifetime counters for one target in watch
+    mode. Only successful responses count towards the latencies; failed
+    probes are counted in errors.
+    """
+
+    def __init__(self, target: str, window: int):
+        self.target = target
+        self.url = target
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.phases = {phase: deque(maxlen=window) for phase in PHASES}
+        self.probes = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self.last: Optional[CheckResult] = None
+
+    def add(self, result: CheckResult) -> None:
+        self.probes += 1
+        self.last = result
+        self.url = result.url or self.url
+        if not result.ok:
+            self.errors += 1
+            if result.error and "Timeout" in result.error:
+                self.timeouts += 1
+        if result.ok and result.timing is not None:
+            self.latencies.append(result.timing.total)
+            self.latency_sum += result.timing.total
+            self.latency_count += 1
+            for phase in PHASES:
+                value = getattr(result.timing, phase)
+                if value is not None:
+                    self.phases[phase].append(value)
+
+    def summary(self) -> dict:
+        ordered = sorted(self.latencies)
+        return {
+            "target": self.target,
+            "url": self.url,
+            "up": bool(self.last and self.last.ok),
+            "probes": self.probes,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "window": len(ordered),
+            "latency": {f"p{int(q * 100)}": percentile(ordered, q) for q in QUANTILES},
+            "latency_sum": self.latency_sum,
+            "latency_count": self.latency_count,
+            "phases": {
+                phase: (sum(values) / len(values) if values else None) for phase, values in self.phases.items()
+            },
+        }
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(stats: list[WatchStats]) -> str:
+    summaries = [s.summary() for s in stats]
+    lines: list[str] = []
+
+    def metric(name: str, kind: str, help_text: str, samples) -> None:
+        lines.append(f"# HELP osbox_check_http_{name} {help_text}")
+        lines.append(f"# TYPE osbox_check_http_{name} {kind}")
+        for labels, value, *suffix in samples:
+            if value is None:
+                continue
+            label_text = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+            lines.append(f"osbox_check_http_{name}{''.join(suffix)}{{{label_text}}} {value:g}")
+
+    metric("up", "gauge", "Whether the last probe succeeded.", [({"url": s["url"]}, int(s["up"])) for s in summaries])
+    for counter, help_text in (
+        ("probes", "Probes sent."),
+        ("errors", "Probes that failed."),
+        ("timeouts", "Probes that timed out."),
+    ):
+        metric(f"{counter}_total", "counter", help_text, [({"url": s["url"]}, s[counter]) for s in summaries])
+    latency = []
+    for s in summaries:
+        latency += [({"url": s["url"], "quantile": str(q)}, s["latency"][f"p{int(q * 100)}"]) for q in QUANTILES]
+        latency.append(({"url": s["url"]}, s["latency_sum"], "_sum"))
+        latency.append(({"url": s["url"]}, s["latency_count"], "_count"))
+    metric(
+        "latency_seconds",
+        "summary",
+        "Latency of successful probes; quantiles over the rolling window, sum and count over the run.",
+        latency,
+    )
+    metric(
+        "phase_seconds",
+        "gauge",
+        "Mean time per request phase over the rolling window.",
+        [({"url": s["url"], "phase": phase}, s["phases"][phase]) for s in summaries for phase in PHASES],
+    )
+    return "\n".join(lines) + "\n"
+
+
+def _format_ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.1f}ms"
+
+
+def render_text(stats: list[WatchStats]) -> str:
+    lines = []
+    for s in (stat.summary() for stat in stats):
+        latency = " ".join(f"{k}={_format_ms(v)}" for k, v in s["latency"].items())
+        phases = " ".join(f"{k}={_format_ms(v)}" for k, v in s["phases"].items())
+        lines.append(
+            f"{'up' if s['up'] else 'DOWN'} {s['url']} probes={s['probes']} errors={s['errors']} "
+            f"timeouts={s['timeouts']} {latency} {phases}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def _write_report(text: str, output: Optional[str]) -> None:
+    if not output:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+        return
+    # replace the file atomically so a textfile collector never reads half of it
+    tmp = f"{output}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, output)
+
+
+def watch_session(targets: list[str], concurrency: int, default_scheme: str = "http", default_path: str = "/"):
+    """
+    One keep-alive session for a whole watch run, with a pool per host, so
+    only the first probe of a target (and any probe after the server closed
+    the connection) pays for setup.
+    """
+    from osbox import httptiming
+
+    hosts = set()
+    for target in targets:
+        try:
+            u = urlparse(normalize_url(target, default_scheme, default_path))
+        except ValueError:
+            continue
+        hosts.add((u.scheme, u.netloc))
+    return httptiming.new_session(pool_maxsize=max(1, min(concurrency, len(targets))), hosts=len(hosts))
+
+
+def _main_watch(args, targets: list[str], headers: dict[str, str]) -> None:
+    stats = [WatchStats(t, args.window) for t in targets]
+    session = watch_session(targets, args.concurrency, args.scheme, args.path)
+    render = {"text": render_text, "prometheus": render_prometheus}.get(args.format)
+
+    def probe(target: str) -> CheckResult:
+        try:
+            return check_http(
+                target=target,
+                default_scheme=args.scheme,
+                default_path=args.path,
+                method=args.method,
+                timeout=args.timeout,
+                retries=args.retries,
+                ok_statuses=args.ok,
+                insecure=args.insecure,
+                headers=headers,
+                session=session,
+            )
+        except Exception as e:
+            return CheckResult(False, f"unhealthy: {e} {target}", target, error=type(e).__name__)
+
+    next_report = time.monotonic() + args.report_every
+    pool = ThreadPoolExecutor(max_workers=max(1, min(args.concurrency, len(targets))))
+    try:
+        while True:
+            started = time.monotonic()
+            for stat, result in zip(stats, pool.map(probe, targets)):
+                stat.add(result)
+
+            if started >= next_report:
+                if render is None:
+                    text = json.dumps({"time": time.time(), "targets": [s.summary() for s in stats]}) + "\n"
+                else:
+                    text = render(stats)
+                _write_report(text, args.output)
+                next_report = started + args.report_every
+
+            time.sleep(max(0.0, args.interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        session.close()
+
+    sys.exit(0 if all(s.last and s.last.ok for s in stats) else 1)
+
+
 def main() -> None:
     p = argparse.ArgumentParser(prog="osbox check-http")
-    p.add_argument("target", help="host:port[/path] or http(s)://host:port/path")
+    p.add_argument("target", nargs="*", help="host:port[/path] or http(s)://host:port/path, repeatable")
+    p.add_argument("--file", help="Read more targets from a file, one per line ('-' for stdin)")
+    p.add_argument("--concurrency", type=int, default=8, help="Targets checked in parallel (default: 8)")
+    p.add_argument("--json", action="store_true", help="Print a JSON summary of all targets")
     p.add_argument(
         "--scheme",
         choices=["http", "https"],
@@ -155,13 +506,38 @@ def main() -> None:
     p.add_argument("--insecure", action="store_true", help="Skip TLS verification for https")
     p.add_argument("--header", action="append", default=[], help='Extra header, repeatable: --header "X-Foo: bar"')
     p.add_argument("--quiet", action="store_true", help="No output; just exit code")
+    p.add_argument("--watch", action="store_true", help="Keep probing and report rolling latency until interrupted")
+    p.add_argument("--interval", type=float, default=1.0, help="Seconds between probes in watch mode (default: 1)")
+    p.add_argument("--window", type=int, default=300, help="Probes kept for percentiles in watch mode (default: 300)")
+    p.add_argument(
+        "--report-every", type=float, default=10.0, help="Seconds between watch mode reports (default: 10)"
+    )
+    p.add_argument(
+        "--format",
+        choices=["text", "json", "prometheus"],
+        default="text",
+        help="Watch mode report format (default: text)",
+    )
+    p.add_argument("--output", help="Overwrite this file with each watch mode report instead of printing it")
     args = p.parse_args()
 
     try:
         headers = parse_headers(args.header)
 
+        targets = list(args.target)
+        if args.file:
+            targets += read_targets(args.file)
+        if not targets:
+            p.error("at least one target is required")
+
+        if args.watch:
+            _main_watch(args, targets, headers)
+
+        if len(targets) > 1 or args.json:
+            _main_many(args, targets, headers)
+
         res = check_http(
-            target=args.target,
+            target=targets[0],
             default_scheme=args.scheme,
             default_path=args.path,
             method=args.method,
@@ -1,45 +1,155 @@
+import glob
+import json
 import sqlite3
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from pathlib import Path
+from typing import Optional
 import argparse
 
+# file names picked up when a directory is given
+DB_PATTERNS = ("*.db", "*.sqlite", "*.sqlite3")
 
-def enable_wal(db_path: str) -> None:
+
+@dataclass(frozen=True)
+class WalResult:
+    db: str
+    ok: bool
+    journal_mode: Optional[str] = None
+    synchronous: Optional[int] = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+
+
+def set_journal(conn: sqlite3.Connection, journal_mode: str = "WAL", synchronous: str = "NORMAL") -> tuple[str, int]:
+    """Sets the journal mode and synchronous level, returns what SQLite reports back."""
+    cur = conn.cursor()
+
+    cur.execute(f"PRAGMA journal_mode={journal_mode};")
+    mode = cur.fetchone()[0]
+
+    cur.execute(f"PRAGMA synchronous={synchronous};")
+    cur.execute("PRAGMA synchronous;")
+    sync = cur.fetchone()[0]
+
+    conn.commit()
+    return mode, sync
+
+
+def convert(db_path: str, timeout: float = 60) -> WalResult:
+    """Switches one database to WAL, reporting problems instead of exiting."""
     db = Path(db_path)
+    start = time.monotonic()
 
-    if not db.exists():
-        print(f"Database not found: {db}")
-        sys.exit(1)
+    if not db.is_file():
+        return WalResult(str(db), False, error="database not found")
 
-    conn = sqlite3.connect(str(db), timeout=60)
     try:
-        cur = conn.cursor()
+        conn = sqlite3.connect(str(db), timeout=timeout)
+        try:
+            mode, sync = set_journal(conn)
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        return WalResult(str(db), False, error=str(e), elapsed=time.monotonic() - start)
 
-        cur.execute("PRAGMA journal_mode=WAL;")
-        mode = cur.fetchone()[0]
+    # journal_mode reads back the old mode when the change was refused
+    ok = mode.lower() == "wal"
+    return WalResult(
+        str(db), ok, mode, sync, None if ok else f"journal_mode is still {mode}", time.monotonic() - start
+    )
 
-        cur.execute("PRAGMA synchronous=NORMAL;")
-        cur.execute("PRAGMA synchronous;")
-        sync = cur.fetchone()[0]
 
-        conn.commit()
+def enable_wal(db_path: str) -> None:
+    """Switches one database to WAL and prints the result, exiting on failure."""
+    result = convert(db_path)
+    if not result.ok:
+        print(f"Failed to enable WAL for database: {result.db}: {result.error}", file=sys.stderr)
+        sys.exit(1)
 
-        print(f"WAL mode enabled for database: {db}")
-        print(f"  journal_mode = {mode}")
-        print(f"  synchronous  = {sync}")
+    print(f"WAL mode enabled for database: {result.db}")
+    print(f"  journal_mode = {result.journal_mode}")
+    print(f"  synchronous  = {result.synchronous}")
 
-    finally:
-        conn.close()
+
+def expand_paths(specs: list[str]) -> list[str]:
+    """
+    Files are taken as given, directories are searched for DB_PATTERNS and
+    anything else is a glob (** matches subdirectories).
+    """
+    paths: list[str] = []
+    for spec in specs:
+        if Path(spec).is_dir():
+            matches = sorted(str(p) for pattern in DB_PATTERNS for p in Path(spec).glob(pattern))
+        elif glob.has_magic(spec):
+            matches = sorted(glob.glob(spec, recursive=True))
+        else:
+            matches = [spec]
+        paths.extend(matches)
+    # the same file may be matched by several arguments
+    return list(dict.fromkeys(paths))
+
+
+def enable_wal_many(paths: list[str], jobs: int = 8, timeout: float = 60) -> list[WalResult]:
+    """Converts paths concurrently; results are in the order of paths."""
+    if not paths:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(paths)))) as pool:
+        return list(pool.map(lambda path: convert(path, timeout), paths))
 
 
 def main():
     parser = argparse.ArgumentParser(
-        description="Enable WAL mode for an SQLite database."
+        description="Enable WAL mode for SQLite databases."
+    )
+    parser.add_argument(
+        "db_paths",
+        nargs="+",
+        help="SQLite database files, directories or globs (e.g. '/var/lib/*/*.db').",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=8,
+        help="Databases converted in parallel (default: 8).",
     )
     parser.add_argument(
-        "db_path",
-        help="Path to the SQLite database file.",
+        "--timeout",
+        type=float,
+        default=60,
+        help="Seconds to wait for a busy database (default: 60).",
     )
+    parser.add_argument("--json", action="store_true", help="Print a JSON report.")
 
     args = parser.parse_args()
-    enable_wal(args.db_path)
\ No newline at end of file
+
+    paths = expand_paths(args.db_paths)
+    if not paths:
+        print(f"No databases found in: {', '.join(args.db_paths)}")
+        sys.exit(1)
+
+    results = enable_wal_many(paths, jobs=args.jobs, timeout=args.timeout)
+    failed = [r for r in results if not r.ok]
+
+    if args.json:
+        report = {
+            "ok": not failed,
+            "total": len(results),
+            "failed": len(failed),
+            "results": [asdict(r) for r in results],
+        }
+        print(json.dumps(report, indent=2))
+    else:
+        for r in results:
+            if r.ok:
+                print(f"WAL mode enabled for database: {r.db}")
+                print(f"  journal_mode = {r.journal_mode}")
+                print(f"  synchronous  = {r.synchronous}")
+            else:
+                print(f"Failed to enable WAL for database: {r.db}: {r.error}", file=sys.stderr)
+        if len(results) > 1:
+            print(f"{len(results) - len(failed)} of {len(results)} databases in WAL mode")
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from osbox.cmd.check_http import CheckResult, check_http, parse_headers
+
+# a result older than this many intervals means the check itself is stuck
+STALE_INTERVALS = 3
+
+
+@dataclass
+class Check:
+    name: str
+    target: str
+    interval: float = 5.0
+    groups: list[str] = field(default_factory=list)
+    options: dict = field(default_factory=dict)
+    result: Optional[CheckResult] = None
+    checked_at: Optional[float] = None
+
+    def status(self, now: float) -> dict:
+        stale = self.checked_at is None or now - self.checked_at > self.interval * STALE_INTERVALS
+        ok = bool(self.result and self.result.ok and not stale)
+        status = {
+            "name": self.name,
+            "groups": self.groups,
+            "stale": stale,
+            "age": None if self.checked_at is None else round(now - self.checked_at, 3),
+        }
+        status.update(asdict(self.result) if self.result else {"message": "pending"})
+        status["ok"] = ok
+        return status
+
+
+def load_checks(path: str, default_interval: float) -> list[Check]:
+    """
+    Reads checks from a JSON file:
+
+      {"interval": 5, "checks": [{"name": "keystone-public",
+        "target": "localhost:5000/v3", "groups": ["keystone"],
+        "timeout": 2, "ok": "200-399", "header": ["X-Foo: bar"]}]}
+
+    A check without groups belongs to the group named by its prefix
+    before the first "-".
+    """
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+
+    interval = float(config.get("interval", default_interval))
+    checks = []
+    for entry in config["checks"]:
+        entry = dict(entry)
+        name = entry.pop("name")
+        target = entry.pop("target")
+        check_interval = float(entry.pop("interval", interval))
+        groups = entry.pop("groups", None) or [name.split("-", 1)[0]]
+        options = {}
+        for key, option in (
+            ("scheme", "default_scheme"),
+            ("path", "default_path"),
+            ("method", "method"),
+            ("timeout", "timeout"),
+            ("retries", "retries"),
+            ("ok", "ok_statuses"),
+            ("insecure", "insecure"),
+        ):
+            if key in entry:
+                options[option] = entry.pop(key)
+        if "header" in entry:
+            options["headers"] = parse_headers(entry.pop("header"))
+        if entry:
+            raise ValueError(f"Unknown settings for check {name}: {', '.join(entry)}")
+        checks.append(Check(name, target, check_interval, groups, options))
+    return checks
+
+
+def _run_check(check: Check, stop: threading.Event) -> None:
+    from osbox.httptiming import new_session
+
+    # one keep-alive session per check for the lifetime of the daemon
+    session = new_session(pool_maxsize=1)
+    while not stop.is_set():
+        start = time.monotonic()
+        try:
+            result = check_http(target=check.target, session=session, **check.options)
+        except Exception as e:
+            result = CheckResult(False, f"unhealthy: {e}", check.target)
+        check.result, check.checked_at = result, time.time()
+        stop.wait(max(0.0, check.interval - (time.monotonic() - start)))
+
+
+def _make_handler(checks: dict[str, Check]):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def address_string(self):
+            # unix socket peers have no address
+            return str(self.client_address or "unix")
+
+        def _reply(self, ok: bool, body) -> None:
+            data = (json.dumps(body, indent=2) + "\n").encode()
+            self.send_response(200 if ok else 503)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _aggregate(self, selected: list[Check]) -> None:
+            now = time.time()
+            statuses = [c.status(now) for c in selected]
+            ok = bool(statuses) and all(s["ok"] for s in statuses)
+            self._reply(ok, {"ok": ok, "checks": statuses})
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0].rstrip("/")
+            parts = path.split("/")[1:] if path else []
+
+            if not parts or parts == ["checks"]:
+                self._aggregate(list(checks.values()))
+            elif len(parts) == 2 and parts[0] == "checks" and parts[1] in checks:
+                status = checks[parts[1]].status(time.time())
+                self._reply(status["ok"], status)
+            elif len(parts) == 2 and parts[0] == "groups":
+                selected = [c for c in checks.values() if parts[1] in c.groups]
+                if not selected:
+                    self._reply(False, {"ok": False, "message": f"unknown group: {parts[1]}"})
+                else:
+                    self._aggregate(selected)
+            else:
+                self._reply(False, {"ok": False, "message": f"not found: {self.path}"})
+
+    return Handler
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(checks: list[Check], listen: str | None = None, socket_path: str | None = None) -> None:
+    by_name = {c.name: c for c in checks}
+    if len(by_name) != len(checks):
+        raise ValueError("Check names must be unique")
+
+    stop = threading.Event()
+    for check in checks:
+        threading.Thread(target=_run_check, args=(check, stop), name=f"check-{check.name}", daemon=True).start()
+
+    handler = _make_handler(by_name)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = _UnixHTTPServer(socket_path, handler)
+        where = f"unix:{socket_path}"
+    else:
+        host, _, port = (listen or "127.0.0.1:8099").rpartition(":")
+        server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), handler)
+        where = f"{host}:{port}"
+
+    def stop_serving(signum, _frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop_serving)
+
+    print(f"health-daemon: {len(checks)} checks, serving on {where}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="osbox health-daemon",
+        description="Run HTTP checks on a schedule and serve the cached results.",
+    )
+    parser.add_argument("--config", help="JSON file describing the checks")
+    parser.add_argument(
+        "--check",
+        action="append",
+        default=[],
+        metavar="NAME=TARGET",
+        help="Add a check, repeatable, e.g. keystone-public=localhost:5000/v3",
+    )
+    parser.add_argument("--interval", type=float, default=5.0, help="Default seconds between checks (default: 5)")
+    parser.add_argument("--listen", default="127.0.0.1:8099", help="host:port to serve results on (default: 127.0.0.1:8099)")
+    parser.add_argument("--socket", help="Serve results on this unix socket instead")
+    args = parser.parse_args()
+
+    try:
+        checks = load_checks(args.config, args.interval) if args.config else []
+        for spec in args.check:
+            name, sep, target = spec.partition("=")
+            if not sep or not name or not target:
+                raise ValueError(f"Invalid check (expected NAME=TARGET): {spec!r}")
+            checks.append(Check(name, target, args.interval, [name.split("-", 1)[0]]))
+        if not checks:
+            parser.error("no checks configured, use --config or --check")
+
+        serve(checks, listen=args.listen, socket_path=args.socket)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"health-daemon: {e}", file=sys.stderr)
+        sys.exit(1)
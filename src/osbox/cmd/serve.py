@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+
+RESTART_POLICIES = ("always", "on-failure", "never")
+MAX_BACKOFF = 30.0
+# a service that stayed up this long is considered healthy again
+STABLE_AFTER = 60.0
+# how long a USR2 re-exec may take to come up with workers
+UPGRADE_TIMEOUT = 60.0
+PR_SET_CHILD_SUBREAPER = 36
+
+
+@dataclass
+class ServiceProcess:
+    name: str
+    command_info: dict
+    restart: str
+    pid: int | None = None
+    started: float = 0.0
+    backoff: float = 1.0
+    restart_at: float | None = None
+    pidfile: str | None = None
+    # pid of the old master while a USR2 upgrade is under way
+    upgrading: int | None = None
+    upgrade_deadline: float = 0.0
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _has_children(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return bool(f.read().split())
+    except OSError:
+        return False
+
+
+def _set_subreaper() -> bool:
+    import ctypes
+
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+def _spawn(service: ServiceProcess) -> None:
+    from osbox.manifest import run_command
+
+    pid = os.fork()
+    if pid:
+        service.pid = pid
+        service.started = time.monotonic()
+        service.restart_at = None
+        print(f"serve: started {service.name} (pid {pid})", flush=True)
+        return
+
+    for signum in (signal.SIGTERM, signal.SIGHUP, signal.SIGCHLD, signal.SIGUSR2):
+        signal.signal(signum, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    # gunicorn re-executes argv on USR2; make that start this service alone
+    sys.argv = [service.name]
+    # the supervisor follows a re-executed master through its pidfile
+    service_env_slug = service.name.upper().replace("-", "_")
+    os.environ.pop("OSBOX_PIDFILE", None)
+    os.environ[f"OSBOX_{service_env_slug}_PIDFILE"] = service.pidfile
+
+    code = 1
+    try:
+        result = run_command(service.command_info)
+        code = result if isinstance(result, int) else 0
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        import traceback
+
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+class Supervisor:
+    """
+    Runs one gunicorn arbiter per service as a child of this process,
+    restarting them according to their policy and shutting them all down
+    together.
+
+    A master re-executed with USR2 is a child of the old master. The
+    supervisor is a child subreaper, so the new master is reparented to it
+    when the old one exits. It then takes over the pid in the service's
+    pidfile instead of restarting the service. USR2 sent to the supervisor
+    upgrades every service this way.
+    """
+
+    def __init__(self, services: list[ServiceProcess], shutdown_timeout: float = 30.0):
+        self.services = services
+        self.shutdown_timeout = shutdown_timeout
+        self.stopping = False
+        self.upgrade_requested = False
+        self.subreaper = False
+        self.run_dir = tempfile.mkdtemp(prefix="osbox-serve-")
+        for service in services:
+            service.pidfile = os.path.join(self.run_dir, f"{service.name}.pid")
+
+    def _by_pid(self, pid: int) -> ServiceProcess | None:
+        for service in self.services:
+            if service.pid == pid:
+                return service
+        return None
+
+    def _signal_all(self, signum: int) -> None:
+        for service in self.services:
+            if service.pid:
+                try:
+                    os.kill(service.pid, signum)
+                except ProcessLookupError:
+                    pass
+
+    def _on_stop(self, signum, _frame) -> None:
+        self.stopping = True
+
+    def _on_hup(self, signum, _frame) -> None:
+        # let every arbiter reload its configuration and workers
+        self._signal_all(signal.SIGHUP)
+
+    def _on_usr2(self, signum, _frame) -> None:
+        self.upgrade_requested = True
+
+    def _successor(self, service: ServiceProcess, pid: int) -> int | None:
+        """The master that replaced pid through a USR2 re-exec, if any."""
+        # the new master writes <pidfile>.2 and renames it to <pidfile> once
+        # the old one is gone
+        for path in (f"{service.pidfile}.2", service.pidfile):
+            try:
+                with open(path) as f:
+                    new_pid = int(f.read().strip() or 0)
+            except (OSError, ValueError):
+                continue
+            if new_pid and new_pid != pid and _alive(new_pid):
+                return new_pid
+        return None
+
+    def _start_upgrades(self) -> None:
+        self.upgrade_requested = False
+        if not self.subreaper:
+            print("serve: USR2 ignored, re-executed masters cannot be supervised here", flush=True)
+            return
+        for service in self.services:
+            if service.pid and service.upgrading is None:
+                service.upgrading = service.pid
+                service.upgrade_deadline = time.monotonic() + UPGRADE_TIMEOUT
+                os.kill(service.pid, signal.SIGUSR2)
+                print(f"serve: upgrading {service.name} (pid {service.pid})", flush=True)
+
+    def _check_upgrades(self) -> None:
+        for service in self.services:
+            old = service.upgrading
+            if old is None:
+                continue
+            if service.pid != old:
+                # the old master is gone already
+                service.upgrading = None
+                continue
+            new_pid = self._successor(service, old)
+            if new_pid and _has_children(new_pid):
+                # the new master has its workers, let the old one drain
+                os.kill(old, signal.SIGTERM)
+                service.upgrading = None
+            elif time.monotonic() > service.upgrade_deadline:
+                print(f"serve: upgrade of {service.name} did not come up, keeping pid {old}", flush=True)
+                service.upgrading = None
+
+    def _reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+
+            service = self._by_pid(pid)
+            if service is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            service.pid = None
+            print(f"serve: {service.name} exited with {code}", flush=True)
+
+            new_pid = self._successor(service, pid)
+            if new_pid:
+                if self.subreaper:
+                    service.pid = new_pid
+                    service.started = time.monotonic()
+                    print(f"serve: {service.name} continues as pid {new_pid}", flush=True)
+                    if self.stopping:
+                        os.kill(new_pid, signal.SIGTERM)
+                else:
+                    # starting another master would only fail to bind
+                    print(f"serve: {service.name} continues as pid {new_pid}, no longer supervised", flush=True)
+                continue
+
+            if self.stopping:
+                continue
+            if service.restart == "never" or (service.restart == "on-failure" and code == 0):
+                continue
+
+            if time.monotonic() - service.started > STABLE_AFTER:
+                service.backoff = 1.0
+            service.restart_at = time.monotonic() + service.backoff
+            print(f"serve: restarting {service.name} in {service.backoff:g}s", flush=True)
+            service.backoff = min(service.backoff * 2, MAX_BACKOFF)
+
+    def _running(self) -> list[ServiceProcess]:
+        return [s for s in self.services if s.pid]
+
+    def run(self) -> int:
+        try:
+            return self._run()
+        finally:
+            shutil.rmtree(self.run_dir, ignore_errors=True)
+
+    def _run(self) -> int:
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_hup)
+        signal.signal(signal.SIGUSR2, self._on_usr2)
+        self.subreaper = _set_subreaper()
+
+        for service in self.services:
+            _spawn(service)
+
+        while not self.stopping:
+            self._reap()
+            if self.upgrade_requested:
+                self._start_upgrades()
+            self._check_upgrades()
+            now = time.monotonic()
+            for service in self.services:
+                if service.restart_at is not None and now >= service.restart_at:
+                    _spawn(service)
+            if not self._running() and all(s.restart_at is None for s in self.services):
+                print("serve: no services left running", flush=True)
+                return 1
+            time.sleep(0.5)
+
+        print("serve: shutting down", flush=True)
+        self._signal_all(signal.SIGTERM)
+        deadline = time.monotonic() + self.shutdown_timeout
+        while self._running() and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        if self._running():
+            print("serve: shutdown timeout, killing remaining services", flush=True)
+            self._signal_all(signal.SIGKILL)
+            while self._running():
+                self._reap()
+                time.sleep(0.1)
+        return 0
+
+
+def main():
+    from osbox.cmd.zygote import preload, service_preloads
+    from osbox.manifest import Manifest
+    from osbox.wsgi import service_setting
+
+    manifest = Manifest()
+    wsgi_commands = {name: info for name, info in manifest.command_map.items() if info.get("wsgi_server")}
+    service_of = {
+        command["name"]: service_name
+        for service_name, service_info in manifest.manifest["services"].items()
+        for command in service_info.get("commands", [])
+    }
+
+    parser = argparse.ArgumentParser(
+        prog="osbox serve",
+        description="Run several WSGI services from one osbox process tree.",
+    )
+    # osbox's own WSGI services (bench-app) only run when asked for
+    default_names = [name for name in wsgi_commands if service_of[name] != "osbox"]
+
+    parser.add_argument(
+        "services",
+        nargs="*",
+        help=f"WSGI services to run (default: all of {', '.join(default_names)})",
+    )
+    parser.add_argument(
+        "--preload",
+        action="append",
+        default=[],
+        help="Extra module to import once before forking the services, repeatable",
+    )
+    parser.add_argument(
+        "--shutdown-timeout",
+        type=float,
+        default=30.0,
+        help="Seconds to wait for services to stop before killing them (default: 30)",
+    )
+    args = parser.parse_args()
+
+    names = args.services or default_names
+    unknown = [name for name in names if name not in wsgi_commands]
+    if unknown:
+        print(f"Not a WSGI service: {', '.join(unknown)}", file=sys.stderr)
+        sys.exit(1)
+
+    services: list[ServiceProcess] = []
+    for name in names:
+        service_env_slug = name.upper().replace("-", "_")
+        restart = service_setting(service_env_slug, "RESTART", "on-failure")
+        if restart not in RESTART_POLICIES:
+            print(f"Invalid restart policy for {name}: {restart}", file=sys.stderr)
+            sys.exit(1)
+        services.append(ServiceProcess(name=name, command_info=wsgi_commands[name], restart=restart))
+
+    # import what the services have in common once, so every arbiter (and
+    # its workers) starts from shared copy-on-write pages
+    modules = ["gunicorn.app.base", "osbox.wsgi"]
+    modules += service_preloads(sorted({service_of[name] for name in names}))
+    preload(modules + args.preload, label="serve")
+
+    sys.exit(Supervisor(services, shutdown_timeout=args.shutdown_timeout).run())
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from osbox.cmd.check_http import percentile
+from osbox.cmd.enable_wal import set_journal
+
+BENCH_TABLE = "osbox_bench"
+DEFAULT_CONFIGS = "wal:normal,wal:full,delete:normal,delete:full"
+
+
+def _is_busy(e: sqlite3.OperationalError) -> bool:
+    return "locked" in str(e) or "busy" in str(e)
+
+
+def prepare(source: str | None, path: str, journal_mode: str, rows: int) -> None:
+    """Creates the benchmark database at path, from a copy of source if given."""
+    conn = sqlite3.connect(path, timeout=60)
+    try:
+        if source:
+            src = sqlite3.connect(source, timeout=60)
+            try:
+                src.backup(conn)
+            finally:
+                src.close()
+        set_journal(conn, journal_mode)
+        conn.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        conn.execute(f"CREATE TABLE {BENCH_TABLE} (id INTEGER PRIMARY KEY, k TEXT, v BLOB)")
+        payload = os.urandom(256)
+        conn.executemany(
+            f"INSERT INTO {BENCH_TABLE} (k, v) VALUES (?, ?)", ((f"{i:016x}", payload) for i in range(rows))
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _worker(path: str, synchronous: str, deadline: float, write_ratio: float, busy_timeout: float, seed: int, out):
+    # autocommit, the writes manage their own transactions; setup waits as
+    # long as enable_wal.convert() does, the workload only busy_timeout
+    conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    rows = conn.execute(f"SELECT max(id) FROM {BENCH_TABLE}").fetchone()[0] or 1
+    conn.execute(f"PRAGMA busy_timeout={int(busy_timeout * 1000)}")
+    rng = random.Random(seed)
+    payload = os.urandom(256)
+    reads: list[float] = []
+    writes: list[float] = []
+    busy = {"read": 0, "write": 0}
+    try:
+        while time.monotonic() < deadline:
+            write = rng.random() < write_ratio
+            t0 = time.perf_counter()
+            try:
+                if write:
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        conn.execute(
+                            f"INSERT INTO {BENCH_TABLE} (k, v) VALUES (?, ?)", (f"{rng.getrandbits(64):016x}", payload)
+                        )
+                        conn.execute("COMMIT")
+                    except BaseException:
+                        conn.execute("ROLLBACK")
+                        raise
+                else:
+                    conn.execute(f"SELECT v FROM {BENCH_TABLE} WHERE id = ?", (rng.randint(1, rows),)).fetchone()
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e):
+                    raise
+                busy["write" if write else "read"] += 1
+                continue
+            (writes if write else reads).append(time.perf_counter() - t0)
+    finally:
+        conn.close()
+    out.append({"reads": reads, "writes": writes, "busy": busy})
+
+
+def _run_process(path: str, synchronous: str, threads: int, deadline: float, args, seed: int) -> dict:
+    out: list[dict] = []
+    workers = [
+        threading.Thread(
+            target=_worker,
+            args=(path, synchronous, deadline, args.write_ratio, args.busy_timeout, seed * 1000 + i, out),
+        )
+        for i in range(threads)
+    ]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    if len(out) != threads:
+        raise RuntimeError(f"{threads - len(out)} of {threads} threads failed")
+    return {
+        "reads": [x for o in out for x in o["reads"]],
+        "writes": [x for o in out for x in o["writes"]],
+        "busy": {op: sum(o["busy"][op] for o in out) for op in ("read", "write")},
+    }
+
+
+def run_config(path: str, synchronous: str, args) -> dict:
+    """
+    Runs the mixed workload with args.processes forked processes of
+    args.threads threads each, every thread on its own connection.
+    """
+    deadline = time.monotonic() + args.duration
+    start = time.monotonic()
+    children = []
+    for p in range(args.processes):
+        r, w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(r)
+            code = 0
+            try:
+                result = _run_process(path, synchronous, args.threads, deadline, args, p + 1)
+                with os.fdopen(w, "w") as f:
+                    json.dump(result, f)
+            except BaseException as e:
+                print(f"sqlite-bench: worker failed: {e}", file=sys.stderr)
+                code = 1
+            finally:
+                os._exit(code)
+        os.close(w)
+        children.append((pid, r))
+
+    reads: list[float] = []
+    writes: list[float] = []
+    busy = {"read": 0, "write": 0}
+    failed = 0
+    for pid, r in children:
+        with os.fdopen(r) as f:
+            data = f.read()
+        _, status = os.waitpid(pid, 0)
+        if os.waitstatus_to_exitcode(status) != 0 or not data:
+            failed += 1
+            continue
+        result = json.loads(data)
+        reads += result["reads"]
+        writes += result["writes"]
+        for op in busy:
+            busy[op] += result["busy"][op]
+    elapsed = time.monotonic() - start
+
+    reads.sort()
+    writes.sort()
+    done = len(reads) + len(writes)
+    attempts = done + busy["read"] + busy["write"]
+
+    def latency(samples: list[float]) -> dict:
+        return {
+            f"p{int(q * 100)}_ms": None if not samples else round(percentile(samples, q) * 1000, 3)
+            for q in (0.5, 0.99)
+        }
+
+    return {
+        "throughput": round(done / elapsed, 1),
+        "reads": len(reads),
+        "writes": len(writes),
+        "read_latency": latency(reads),
+        "write_latency": latency(writes),
+        "busy": busy,
+        "busy_rate": round((busy["read"] + busy["write"]) / attempts, 4) if attempts else 0.0,
+        "failed_processes": failed,
+    }
+
+
+def parse_configs(spec: str) -> list[tuple[str, str]]:
+    configs = []
+    for part in spec.split(","):
+        mode, _, sync = part.strip().partition(":")
+        mode, sync = mode.lower(), (sync or "normal").lower()
+        if mode not in ("wal", "delete", "truncate", "persist", "memory", "off"):
+            raise ValueError(f"Unknown journal mode: {mode}")
+        if sync not in ("off", "normal", "full", "extra"):
+            raise ValueError(f"Unknown synchronous level: {sync}")
+        configs.append((mode, sync))
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="osbox sqlite-bench",
+        description="Run a mixed read/write workload against SQLite and compare journal settings.",
+    )
+    parser.add_argument(
+        "db_path",
+        nargs="?",
+        help="Database to benchmark a copy of (default: an empty database)",
+    )
+    parser.add_argument(
+        "--configs",
+        default=DEFAULT_CONFIGS,
+        help=f"Comma separated journal_mode:synchronous pairs (default: {DEFAULT_CONFIGS})",
+    )
+    parser.add_argument("--threads", type=int, default=4, help="Threads per process (default: 4)")
+    parser.add_argument("--processes", type=int, default=2, help="Processes, like gunicorn workers (default: 2)")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per configuration (default: 5)")
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="Share of writes (default: 0.2)")
+    parser.add_argument("--rows", type=int, default=10000, help="Rows in the benchmark table (default: 10000)")
+    parser.add_argument(
+        "--busy-timeout",
+        type=float,
+        default=0.1,
+        help="Seconds a connection waits on a lock before SQLITE_BUSY (default: 0.1)",
+    )
+    parser.add_argument("--dir", help="Directory for the benchmark databases (default: a temporary directory)")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.db_path and not Path(args.db_path).exists():
+        print(f"Database not found: {args.db_path}")
+        sys.exit(1)
+    if args.threads < 1 or args.processes < 1:
+        parser.error("--threads and --processes must be at least 1")
+
+    try:
+        configs = parse_configs(args.configs)
+    except ValueError as e:
+        parser.error(str(e))
+
+    report = {
+        "source": args.db_path,
+        "threads": args.threads,
+        "processes": args.processes,
+        "duration": args.duration,
+        "write_ratio": args.write_ratio,
+        "busy_timeout": args.busy_timeout,
+        "results": [],
+    }
+    # the benchmark files should live on the same filesystem as the real
+    # database, fsync cost is most of what is being compared
+    base = args.dir or (str(Path(args.db_path).parent) if args.db_path else None)
+    try:
+        with tempfile.TemporaryDirectory(prefix="osbox-sqlite-bench-", dir=base) as tmp:
+            for mode, sync in configs:
+                path = str(Path(tmp) / f"bench-{mode}-{sync}.db")
+                prepare(args.db_path, path, mode, args.rows)
+                result = run_config(path, sync, args)
+                report["results"].append({"journal_mode": mode, "synchronous": sync, **result})
+                print(
+                    f"sqlite-bench: {mode}:{sync} {result['throughput']} ops/s, "
+                    f"busy rate {result['busy_rate']:.2%}",
+                    file=sys.stderr,
+                )
+    except (OSError, sqlite3.Error) as e:
+        print(f"sqlite-bench: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    text = json.dumps(report, indent=2) + "\n"
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
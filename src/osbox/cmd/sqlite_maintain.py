@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+import argparse
+import os
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from osbox.sqlitetune import connect, read_pragma
+
+MIB = 1024 * 1024
+
+
+@dataclass
+class Database:
+    path: str
+    conn: Optional[sqlite3.Connection] = None
+    wal_bytes: int = 0
+    # PRAGMA data_version of our connection, it changes whenever another
+    # connection commits
+    data_version: Optional[int] = None
+    written_at: float = field(default_factory=time.monotonic)
+    # written to since the last checkpoint
+    dirty: bool = False
+    last_optimize: float = field(default_factory=time.monotonic)
+    last_vacuum: float = field(default_factory=time.monotonic)
+    checkpoints: dict[str, int] = field(default_factory=dict)
+    checkpoint_seconds: dict[str, float] = field(default_factory=dict)
+    last_checkpoint_seconds: float = 0.0
+    busy_retries: int = 0
+    # checkpoints still busy after all retries, and sqlite errors
+    busy: int = 0
+    errors: int = 0
+    optimizes: int = 0
+    vacuum_pages: int = 0
+
+    @property
+    def wal_path(self) -> str:
+        return f"{self.path}-wal"
+
+
+@dataclass
+class Policy:
+    passive_bytes: int = 16 * MIB
+    truncate_bytes: int = 64 * MIB
+    idle: float = 30.0
+    optimize_every: float = 3600.0
+    vacuum_every: float = 3600.0
+    vacuum_pages: int = 1000
+    busy_timeout: float = 1.0
+    busy_retries: int = 5
+
+
+def _wal_size(db: Database) -> int:
+    try:
+        return os.stat(db.wal_path).st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _connection(db: Database, policy: Policy) -> sqlite3.Connection:
+    if db.conn is None:
+        db.conn = connect(db.path, timeout=policy.busy_timeout)
+    return db.conn
+
+
+def checkpoint(db: Database, policy: Policy, mode: str, retries: Optional[int] = None) -> bool:
+    """
+    Runs a wal_checkpoint in mode (PASSIVE or TRUNCATE). A checkpoint that
+    could not finish because of readers or writers is retried up to retries
+    (default policy.busy_retries) times with a growing pause.
+    """
+    conn = _connection(db, policy)
+    retries = policy.busy_retries if retries is None else retries
+    start = time.perf_counter()
+    done = False
+    for attempt in range(retries + 1):
+        try:
+            busy, _log, _checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) and "busy" not in str(e):
+                raise
+            busy = 1
+        if not busy:
+            done = True
+            break
+        if attempt < retries:
+            db.busy_retries += 1
+            time.sleep(0.05 * 2**attempt)
+
+    elapsed = time.perf_counter() - start
+    db.checkpoints[mode] = db.checkpoints.get(mode, 0) + 1
+    db.checkpoint_seconds[mode] = db.checkpoint_seconds.get(mode, 0.0) + elapsed
+    db.last_checkpoint_seconds = elapsed
+    if not done:
+        db.busy += 1
+    return done
+
+
+def maintain(db: Database, policy: Policy, now: float) -> list[str]:
+    """One maintenance pass over db; returns what was done."""
+    actions: list[str] = []
+    conn = _connection(db, policy)
+    # the WAL file keeps its size when writers wrap around to its start
+    # after a checkpoint, so its size says nothing about activity
+    version = read_pragma(conn, "data_version")
+    if version != db.data_version:
+        if db.data_version is not None:
+            db.written_at, db.dirty = now, True
+        db.data_version = version
+    size = db.wal_bytes = _wal_size(db)
+
+    if size >= policy.truncate_bytes:
+        mode = "TRUNCATE"
+    elif size and now - db.written_at >= policy.idle:
+        # nobody has written for a while, reset the WAL while it is quiet
+        mode = "TRUNCATE"
+    elif size >= policy.passive_bytes and db.dirty:
+        mode = "PASSIVE"
+    else:
+        mode = None
+
+    if mode == "TRUNCATE" and size >= policy.truncate_bytes:
+        # TRUNCATE holds off writers while it waits for readers, so under
+        # load it gets one attempt, and a PASSIVE checkpoint, which blocks
+        # nobody, does what it can instead
+        ok = checkpoint(db, policy, mode, retries=0)
+        if not ok:
+            actions.append("checkpoint truncate (busy)")
+            mode = "PASSIVE"
+            ok = checkpoint(db, policy, mode)
+    elif mode:
+        ok = checkpoint(db, policy, mode)
+    if mode:
+        actions.append(f"checkpoint {mode.lower()}{'' if ok else ' (busy)'}")
+        db.wal_bytes = _wal_size(db)
+        db.dirty = not ok
+
+    if policy.optimize_every and now - db.last_optimize >= policy.optimize_every:
+        conn.execute("PRAGMA optimize").fetchall()
+        db.optimizes += 1
+        db.last_optimize = now
+        actions.append("optimize")
+
+    if policy.vacuum_every and now - db.last_vacuum >= policy.vacuum_every:
+        db.last_vacuum = now
+        # incremental_vacuum does nothing unless auto_vacuum is INCREMENTAL
+        if read_pragma(conn, "auto_vacuum") == 2:
+            free = read_pragma(conn, "freelist_count") or 0
+            pages = min(free, policy.vacuum_pages)
+            if pages:
+                conn.execute(f"PRAGMA incremental_vacuum({pages})").fetchall()
+                db.vacuum_pages += pages
+                actions.append(f"incremental vacuum {pages} pages")
+    return actions
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(databases: list[Database]) -> str:
+    lines: list[str] = []
+
+    def metric(name: str, kind: str, help_text: str, samples) -> None:
+        lines.append(f"# HELP osbox_sqlite_{name} {help_text}")
+        lines.append(f"# TYPE osbox_sqlite_{name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+            lines.append(f"osbox_sqlite_{name}{{{label_text}}} {value:g}")
+
+    metric("wal_bytes", "gauge", "Size of the WAL file.", [({"db": d.path}, d.wal_bytes) for d in databases])
+    metric(
+        "checkpoints_total",
+        "counter",
+        "Checkpoints run by mode.",
+        [({"db": d.path, "mode": m.lower()}, n) for d in databases for m, n in sorted(d.checkpoints.items())],
+    )
+    metric(
+        "checkpoint_seconds_total",
+        "counter",
+        "Time spent in checkpoints by mode.",
+        [({"db": d.path, "mode": m.lower()}, s) for d in databases for m, s in sorted(d.checkpoint_seconds.items())],
+    )
+    metric(
+        "checkpoint_last_seconds",
+        "gauge",
+        "Duration of the last checkpoint.",
+        [({"db": d.path}, d.last_checkpoint_seconds) for d in databases],
+    )
+    metric(
+        "checkpoint_busy_retries_total",
+        "counter",
+        "Checkpoint retries because the database was busy.",
+        [({"db": d.path}, d.busy_retries) for d in databases],
+    )
+    metric(
+        "checkpoint_busy_total",
+        "counter",
+        "Checkpoints still busy after all retries.",
+        [({"db": d.path}, d.busy) for d in databases],
+    )
+    metric("errors_total", "counter", "SQLite errors during maintenance.", [({"db": d.path}, d.errors) for d in databases])
+    metric("optimize_total", "counter", "PRAGMA optimize runs.", [({"db": d.path}, d.optimizes) for d in databases])
+    metric(
+        "incremental_vacuum_pages_total",
+        "counter",
+        "Free pages released by incremental vacuum.",
+        [({"db": d.path}, d.vacuum_pages) for d in databases],
+    )
+    return "\n".join(lines) + "\n"
+
+
+def _serve_metrics(databases: list[Database], bind: str) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            body = render_prometheus(databases).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    host, _, port = bind.rpartition(":")
+    server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="osbox sqlite-maintain",
+        description="Checkpoint WAL files and run periodic maintenance on SQLite databases.",
+    )
+    parser.add_argument("db_paths", nargs="+", help="SQLite database files to maintain")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between WAL size checks (default: 5)")
+    parser.add_argument(
+        "--passive-mb", type=float, default=16, help="PASSIVE checkpoint above this WAL size (default: 16)"
+    )
+    parser.add_argument(
+        "--truncate-mb", type=float, default=64, help="TRUNCATE checkpoint above this WAL size (default: 64)"
+    )
+    parser.add_argument(
+        "--idle", type=float, default=30.0, help="TRUNCATE checkpoint after this many seconds without writes (default: 30)"
+    )
+    parser.add_argument(
+        "--optimize-every", type=float, default=3600.0, help="Seconds between PRAGMA optimize runs, 0 to disable"
+    )
+    parser.add_argument(
+        "--vacuum-every", type=float, default=3600.0, help="Seconds between incremental vacuums, 0 to disable"
+    )
+    parser.add_argument("--vacuum-pages", type=int, default=1000, help="Pages freed per incremental vacuum")
+    parser.add_argument("--busy-retries", type=int, default=5, help="Retries of a busy checkpoint (default: 5)")
+    parser.add_argument("--metrics-bind", help="host:port to serve Prometheus metrics on")
+    parser.add_argument("--once", action="store_true", help="Run one maintenance pass and exit")
+    args = parser.parse_args()
+
+    missing = [p for p in args.db_paths if not os.path.exists(p)]
+    if missing:
+        print(f"Database not found: {', '.join(missing)}", file=sys.stderr)
+        sys.exit(1)
+
+    policy = Policy(
+        passive_bytes=int(args.passive_mb * MIB),
+        truncate_bytes=int(args.truncate_mb * MIB),
+        idle=args.idle,
+        optimize_every=args.optimize_every,
+        vacuum_every=args.vacuum_every,
+        vacuum_pages=args.vacuum_pages,
+        busy_retries=args.busy_retries,
+    )
+    databases = [Database(path) for path in args.db_paths]
+    if args.once:
+        for db in databases:
+            db.last_optimize = db.last_vacuum = float("-inf")
+
+    server = None
+    if args.metrics_bind:
+        server = _serve_metrics(databases, args.metrics_bind)
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+    if not args.once:
+        print(f"sqlite-maintain: watching {len(databases)} databases", flush=True)
+    try:
+        while not stop.is_set():
+            now = time.monotonic()
+            for db in databases:
+                try:
+                    actions = maintain(db, policy, now)
+                except sqlite3.Error as e:
+                    print(f"sqlite-maintain: {db.path}: {e}", file=sys.stderr, flush=True)
+                    db.errors += 1
+                    if db.conn is not None:
+                        db.conn.close()
+                        db.conn = None
+                    continue
+                if actions:
+                    print(f"sqlite-maintain: {db.path}: {', '.join(actions)}", flush=True)
+            if args.once:
+                break
+            stop.wait(args.interval)
+    finally:
+        for db in databases:
+            if db.conn is not None:
+                db.conn.close()
+        if server is not None:
+            server.shutdown()
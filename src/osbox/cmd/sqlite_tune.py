@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+from osbox.cmd.check_http import percentile
+from osbox.sqlitetune import PROFILES, apply_connection_pragmas, apply_profile, compare, connect
+
+BENCH_TABLE = "osbox_bench"
+
+
+def micro_bench(db_path: str, profile: Optional[str], operations: int, rows: int) -> dict:
+    """
+    Point reads by primary key and single-row committed inserts against a
+    scratch table, on a connection set up like a service would be: with
+    the connection-level settings of profile, or SQLite defaults if None.
+    """
+    conn = connect(db_path)
+    try:
+        if profile:
+            apply_connection_pragmas(conn, profile)
+
+        rng = random.Random(42)
+        reads = []
+        for _ in range(operations):
+            key = rng.randint(1, rows)
+            t0 = time.perf_counter()
+            conn.execute(f"SELECT v FROM {BENCH_TABLE} WHERE id = ?", (key,)).fetchone()
+            reads.append(time.perf_counter() - t0)
+
+        inserts = []
+        payload = os.urandom(256)
+        for _ in range(operations):
+            t0 = time.perf_counter()
+            conn.execute("BEGIN")
+            conn.execute(f"INSERT INTO {BENCH_TABLE} (k, v) VALUES (?, ?)", (os.urandom(8).hex(), payload))
+            conn.execute("COMMIT")
+            inserts.append(time.perf_counter() - t0)
+    finally:
+        conn.close()
+
+    reads.sort()
+    inserts.sort()
+    return {
+        name: {
+            "ops_per_sec": round(len(samples) / sum(samples), 1),
+            "p50_us": round(percentile(samples, 0.5) * 1e6, 1),
+            "p99_us": round(percentile(samples, 0.99) * 1e6, 1),
+        }
+        for name, samples in (("point_read", reads), ("insert", inserts))
+    }
+
+
+def bench_before_after(db_path: str, profile: str, operations: int, rows: int) -> dict:
+    """Runs micro_bench on a copy of the database before and after tuning it."""
+    with tempfile.TemporaryDirectory(prefix="osbox-sqlite-tune-") as tmp:
+        copy = str(Path(tmp) / Path(db_path).name)
+        src = connect(db_path)
+        dst = connect(copy)
+        try:
+            src.backup(dst)
+        finally:
+            src.close()
+
+        try:
+            dst.execute(f"CREATE TABLE {BENCH_TABLE} (id INTEGER PRIMARY KEY, k TEXT, v BLOB)")
+            payload = os.urandom(256)
+            dst.execute("BEGIN")
+            dst.executemany(
+                f"INSERT INTO {BENCH_TABLE} (k, v) VALUES (?, ?)",
+                ((f"{i:016x}", payload) for i in range(rows)),
+            )
+            dst.execute("COMMIT")
+        finally:
+            dst.close()
+
+        before = micro_bench(copy, None, operations, rows)
+        conn = connect(copy)
+        try:
+            apply_profile(conn, profile)
+        finally:
+            conn.close()
+        after = micro_bench(copy, profile, operations, rows)
+
+    return {"before": before, "after": after}
+
+
+def _print_settings(db_path: str, settings) -> None:
+    print(f"{db_path}:")
+    print(f"  {'setting':<20} {'current':>12} {'target':>12}")
+    for s in settings:
+        mark = "*" if s.changed else " "
+        scope = "" if s.persistent else "  (per connection)"
+        print(f"{mark} {s.name:<20} {str(s.current):>12} {str(s.target):>12}{scope}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="osbox sqlite-tune",
+        description="Apply a performance profile to an SQLite database.",
+    )
+    parser.add_argument("db_path", help="Path to the SQLite database file.")
+    parser.add_argument(
+        "--profile",
+        choices=sorted(PROFILES),
+        default="balanced",
+        help="Tuning profile (default: balanced)",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Show current and target settings, change nothing")
+    parser.add_argument("--no-analyze", action="store_true", help="Skip ANALYZE and PRAGMA optimize")
+    parser.add_argument(
+        "--bench",
+        action="store_true",
+        help="Benchmark point reads and inserts on a copy of the database before and after tuning",
+    )
+    parser.add_argument("--bench-ops", type=int, default=2000, help="Operations per benchmark (default: 2000)")
+    parser.add_argument("--bench-rows", type=int, default=20000, help="Rows in the benchmark table (default: 20000)")
+    parser.add_argument("--json", action="store_true", help="Print a JSON report")
+    args = parser.parse_args()
+
+    db = Path(args.db_path)
+    if not db.exists():
+        print(f"Database not found: {db}")
+        sys.exit(1)
+
+    report: dict = {"database": str(db), "profile": args.profile, "dry_run": args.dry_run}
+    try:
+        # copies the database, so it has to run before the profile is
+        # applied for "before" to mean the current settings
+        if args.bench:
+            report["bench"] = bench_before_after(str(db), args.profile, args.bench_ops, args.bench_rows)
+
+        conn = connect(str(db))
+        try:
+            settings = compare(conn, args.profile)
+            report["settings"] = [
+                {"name": s.name, "current": s.current, "target": s.target, "persistent": s.persistent}
+                for s in settings
+            ]
+            if not args.json:
+                _print_settings(str(db), settings)
+
+            if not args.dry_run:
+                report["applied"] = apply_profile(conn, args.profile, analyze=not args.no_analyze)
+                if not args.json:
+                    for sql in report["applied"]:
+                        print(f"  {sql}")
+        finally:
+            conn.close()
+
+        if args.bench and not args.json:
+            print("  benchmark (copy of the database):")
+            for op in ("point_read", "insert"):
+                before, after = report["bench"]["before"][op], report["bench"]["after"][op]
+                print(
+                    f"    {op:<11} {before['ops_per_sec']:>10.1f} -> {after['ops_per_sec']:>10.1f} ops/s"
+                    f"   p99 {before['p99_us']:>8.1f} -> {after['p99_us']:>8.1f} us"
+                )
+    except sqlite3.Error as e:
+        print(f"sqlite-tune: {db}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    elif not args.dry_run:
+        print(
+            "  per connection settings only last for this run; set "
+            f"OSBOX_SQLITE_PROFILE={args.profile} for the services to apply them"
+        )
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def read_smaps_rollup(pid: int) -> dict[str, int]:
+    """Returns the smaps_rollup fields of a process, in kB."""
+    out: dict[str, int] = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+        key, _, rest = line.partition(":")
+        if key in SMAPS_FIELDS:
+            out[key] = int(rest.split()[0])
+    return out
+
+
+def child_pids(pid: int) -> list[int]:
+    children: list[int] = []
+    for stat_file in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            stat = stat_file.read_text()
+        except OSError:
+            continue
+        # the command name may contain spaces, ppid follows the closing paren
+        fields = stat[stat.rindex(")") + 2 :].split()
+        if int(fields[1]) == pid:
+            children.append(int(stat_file.parent.name))
+    return sorted(children)
+
+
+def memory_report(master_pid: int) -> list[dict]:
+    rows = []
+    for role, pid in [("master", master_pid)] + [("worker", p) for p in child_pids(master_pid)]:
+        try:
+            smaps = read_smaps_rollup(pid)
+        except OSError:
+            continue
+        rows.append(
+            {
+                "pid": pid,
+                "role": role,
+                "rss_kb": smaps.get("Rss", 0),
+                "pss_kb": smaps.get("Pss", 0),
+                "shared_kb": smaps.get("Shared_Clean", 0) + smaps.get("Shared_Dirty", 0),
+                "private_kb": smaps.get("Private_Clean", 0) + smaps.get("Private_Dirty", 0),
+            }
+        )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="osbox wsgi-memory",
+        description="Report shared vs. private memory of a WSGI service's master and workers.",
+    )
+    parser.add_argument("pid", type=int, help="PID of the gunicorn master")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if not os.path.exists(f"/proc/{args.pid}"):
+        print(f"No such process: {args.pid}", file=sys.stderr)
+        sys.exit(1)
+
+    rows = memory_report(args.pid)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'pid':>8} {'role':8} {'rss_kb':>10} {'pss_kb':>10} {'shared_kb':>10} {'private_kb':>10}")
+    for row in rows:
+        print(
+            f"{row['pid']:>8} {row['role']:8} {row['rss_kb']:>10} {row['pss_kb']:>10} "
+            f"{row['shared_kb']:>10} {row['private_kb']:>10}"
+        )
+    workers = [row for row in rows if row["role"] == "worker"]
+    if workers:
+        print(f"total pss: {sum(row['pss_kb'] for row in rows)} kB")
+        print(f"avg worker private: {sum(row['private_kb'] for row in workers) // len(workers)} kB")
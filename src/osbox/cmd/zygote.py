@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import argparse
+import os
+import signal
+import socket
+import struct
+import sys
+
+DEFAULT_SOCKET = "/run/osbox/zygote.sock"
+MAX_REQUEST = 1024 * 1024
+
+
+def zygote_allowed(command_info) -> bool:
+    """
+    Whether a command may run in a zygote child. wsgi services manage their
+    own workers, and long-running commands (the zygote itself, agents,
+    daemons) are marked "zygote": false so they keep their own uid, cgroup
+    and lifetime.
+    """
+    return not command_info.get("wsgi_server") and command_info.get("zygote", True)
+
+
+def _encode_request(command_name: str, argv: list[str]) -> bytes:
+    fields = [os.fsencode(command_name), os.fsencode(os.getcwd()), str(len(argv)).encode()]
+    fields += [os.fsencode(a) for a in argv]
+    fields += [os.fsencode(k) + b"=" + os.fsencode(v) for k, v in os.environ.items()]
+    return b"\0".join(fields)
+
+
+def _decode_request(data: bytes) -> tuple[str, str, list[str], dict[str, str]]:
+    fields = data.split(b"\0")
+    command_name = os.fsdecode(fields[0])
+    cwd = os.fsdecode(fields[1])
+    argc = int(fields[2])
+    argv = [os.fsdecode(a) for a in fields[3 : 3 + argc]]
+    env: dict[str, str] = {}
+    for item in fields[3 + argc :]:
+        k, _, v = item.partition(b"=")
+        env[os.fsdecode(k)] = os.fsdecode(v)
+    return command_name, cwd, argv, env
+
+
+def _recv_exact(conn: socket.socket, size: int) -> bytes:
+    buf = b""
+    while len(buf) < size:
+        chunk = conn.recv(size - len(buf))
+        if not chunk:
+            raise EOFError("connection closed")
+        buf += chunk
+    return buf
+
+
+def run_in_zygote(socket_path: str, command_name: str, argv: list[str]) -> int | None:
+    """
+    Runs a command in a forked child of the zygote at socket_path, passing
+    our argv, environment, cwd and stdio fds along. Returns the exit code,
+    or None if no zygote is listening or it turned us away, so the caller
+    can run the command locally.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+
+    with sock:
+        payload = _encode_request(command_name, argv)
+        data = struct.pack("!I", len(payload)) + payload
+        try:
+            sent = socket.send_fds(sock, [data], [0, 1, 2])
+            sock.sendall(data[sent:])
+            (pid,) = struct.unpack("!i", _recv_exact(sock, 4))
+        except (EOFError, OSError):
+            # refused (e.g. another user's zygote) before anything ran
+            return None
+
+        # forward the usual termination signals to the child doing the work
+        def forward(signum, _frame):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+        for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+            signal.signal(signum, forward)
+
+        try:
+            (code,) = struct.unpack("!i", _recv_exact(sock, 4))
+        except (EOFError, OSError):
+            # the child died without reporting, e.g. it was killed
+            return 1
+
+    return code
+
+
+def _exit_code(code) -> int:
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _handle(conn: socket.socket) -> None:
+    """Runs in the forked child: adopt the client's process state and run."""
+    from osbox.manifest import find_command, run_command
+
+    data, fds, _flags, _addr = socket.recv_fds(conn, 65536, 3)
+    if len(fds) != 3 or len(data) < 4:
+        raise EOFError("incomplete request")
+    (size,) = struct.unpack("!I", data[:4])
+    if size > MAX_REQUEST:
+        raise ValueError(f"request too large: {size} bytes")
+    payload = data[4:]
+    if len(payload) < size:
+        payload += _recv_exact(conn, size - len(payload))
+    command_name, cwd, argv, env = _decode_request(payload)
+
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    for stream in (sys.stdout, sys.stderr):
+        stream.reconfigure(line_buffering=stream.isatty())
+
+    os.environ.clear()
+    os.environ.update(env)
+    os.chdir(cwd)
+    sys.argv = argv
+
+    conn.sendall(struct.pack("!i", os.getpid()))
+
+    command_info = find_command(command_name)
+    if not command_info or not zygote_allowed(command_info):
+        print(f"Unknown command: {command_name}", file=sys.stderr)
+        code = 1
+    else:
+        try:
+            code = _exit_code(run_command(command_info))
+        except SystemExit as e:
+            code = _exit_code(e.code)
+        except BaseException:
+            import traceback
+
+            traceback.print_exc()
+            code = 1
+
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except Exception:
+            pass
+    if "logging" in sys.modules:
+        sys.modules["logging"].shutdown()
+
+    conn.sendall(struct.pack("!i", code))
+
+
+def _child(listener: socket.socket, conn: socket.socket) -> None:
+    listener.close()
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    code = 1
+    try:
+        _handle(conn)
+        code = 0
+    except BaseException as e:
+        print(f"zygote: request failed: {e}", file=sys.stderr)
+    finally:
+        os._exit(code)
+
+
+def _peer_allowed(conn: socket.socket) -> bool:
+    # only our own user: a command run for anyone else, root included,
+    # would run with our uid instead of theirs
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _pid, uid, _gid = struct.unpack("3i", creds)
+    return uid == os.getuid()
+
+
+def preload(modules: list[str], label: str = "zygote") -> None:
+    import gc
+    import importlib
+
+    for module in modules:
+        try:
+            importlib.import_module(module)
+            print(f"{label}: preloaded {module}")
+        except Exception as e:
+            print(f"{label}: failed to preload {module}: {e}", file=sys.stderr)
+
+    # keep the preloaded heap out of the collector so forked children do
+    # not touch (and copy) those pages
+    gc.collect()
+    gc.freeze()
+
+
+def serve(socket_path: str, modules: list[str], mode: int = 0o600) -> None:
+    preload(modules)
+
+    sock_dir = os.path.dirname(socket_path)
+    if sock_dir:
+        os.makedirs(sock_dir, exist_ok=True)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    os.chmod(socket_path, mode)
+    listener.listen(128)
+    listener.settimeout(1.0)
+
+    def stop(signum, _frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+
+    print(f"zygote listening on {socket_path}")
+    try:
+        while True:
+            # reap finished children
+            try:
+                while os.waitpid(-1, os.WNOHANG)[0]:
+                    pass
+            except ChildProcessError:
+                pass
+
+            try:
+                conn, _ = listener.accept()
+            except TimeoutError:
+                continue
+
+            with conn:
+                conn.settimeout(None)
+                if not _peer_allowed(conn):
+                    continue
+                # nothing buffered in the zygote may leak into a client's stdout
+                sys.stdout.flush()
+                sys.stderr.flush()
+                if os.fork() == 0:
+                    _child(listener, conn)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def service_preloads(services: list[str] | None) -> list[str]:
+    from osbox.manifest import Manifest
+
+    manifest = Manifest()
+    modules: list[str] = []
+    for service_name, service_info in manifest.manifest["services"].items():
+        if services and service_name not in services:
+            continue
+        for module in service_info.get("zygote_preload", []):
+            if module not in modules:
+                modules.append(module)
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="osbox zygote",
+        description="Pre-import service libraries and fork a child per command request.",
+    )
+    parser.add_argument(
+        "--socket",
+        default=os.environ.get("OSBOX_ZYGOTE_SOCKET", DEFAULT_SOCKET),
+        help=f"Unix socket to listen on (default: $OSBOX_ZYGOTE_SOCKET or {DEFAULT_SOCKET})",
+    )
+    parser.add_argument(
+        "--service",
+        action="append",
+        default=[],
+        help="Only preload modules listed for this service, repeatable (default: all services)",
+    )
+    parser.add_argument(
+        "--preload",
+        action="append",
+        default=[],
+        help="Extra module to preload, repeatable",
+    )
+    parser.add_argument(
+        "--mode",
+        type=lambda s: int(s, 8),
+        default=0o600,
+        help="Socket permissions in octal (default: 600)",
+    )
+    args = parser.parse_args()
+
+    modules = service_preloads(args.service) + args.preload
+    serve(args.socket, modules, mode=args.mode)
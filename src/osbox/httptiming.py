@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Sessions from new_session() use connection classes that record DNS,
+# connect and TLS time of new connections into a thread-local dict set up
+# by start(); check_http reads it back with finish(). A request over a
+# reused keep-alive connection records no setup phases.
+_local = threading.local()
+
+
+def start() -> None:
+    _local.timing = {}
+
+
+def finish() -> dict[str, float]:
+    timing = getattr(_local, "timing", None) or {}
+    _local.timing = None
+    return timing
+
+
+class _TimedConnectionMixin:
+    def _new_conn(self):
+        timing = getattr(_local, "timing", None)
+        if timing is None:
+            return super()._new_conn()
+
+        t0 = time.perf_counter()
+        try:
+            infos = socket.getaddrinfo(self._dns_host, self.port, 0, socket.SOCK_STREAM)
+        except OSError:
+            # let urllib3 resolve again and raise its own error
+            return super()._new_conn()
+        t1 = time.perf_counter()
+        timing["dns"] = t1 - t0
+
+        # connect to the address we just resolved instead of resolving twice
+        dns_host = self._dns_host
+        self._dns_host = infos[0][4][0]
+        try:
+            sock = super()._new_conn()
+        except Exception:
+            # the first address may not be reachable, fall back to trying
+            # all of them the usual way
+            self._dns_host = dns_host
+            sock = super()._new_conn()
+        finally:
+            self._dns_host = dns_host
+        timing["connect"] = time.perf_counter() - t1
+        return sock
+
+    def connect(self):
+        t0 = time.perf_counter()
+        super().connect()
+        timing = getattr(_local, "timing", None)
+        if timing is not None and isinstance(self, HTTPSConnection):
+            setup = timing.get("dns", 0.0) + timing.get("connect", 0.0)
+            timing["tls"] = max(0.0, time.perf_counter() - t0 - setup)
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+def new_session(pool_maxsize: int = 10, hosts: int = 1) -> requests.Session:
+    """
+    A session with timed connections. hosts is the number of host:port
+    pools it keeps; a session shared by more hosts than that evicts a pool,
+    and its keep-alive connections, on every switch.
+    """
+    session = requests.Session()
+    adapter = TimedHTTPAdapter(pool_connections=max(1, hosts), pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import atexit
+import os
+import sys
+import time
+from importlib.abc import MetaPathFinder
+
+
+class _TimedLoader:
+    """Delegates to the real loader, timing exec_module."""
+
+    def __init__(self, loader, profiler: ImportProfiler, fullname: str):
+        self._loader = loader
+        self._profiler = profiler
+        self._fullname = fullname
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        profiler = self._profiler
+        depth = len(profiler.stack)
+        profiler.stack.append(0)
+        start = time.perf_counter_ns()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            cumulative = (time.perf_counter_ns() - start) // 1000
+            children = profiler.stack.pop()
+            if profiler.stack:
+                profiler.stack[-1] += cumulative
+            profiler.records.append((depth, self._fullname, cumulative - children, cumulative))
+
+
+class ImportProfiler(MetaPathFinder):
+    """
+    Records per-module import time, in the same layout as -X importtime.
+    That flag is not available inside the PyInstaller bundle, so this wraps
+    the loaders returned by the other meta path finders instead.
+    """
+
+    def __init__(self):
+        self.records: list[tuple[int, str, int, int]] = []
+        self.stack: list[int] = []
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimedLoader(spec.loader, self, fullname)
+            return spec
+        return None
+
+    def write(self, path: str) -> None:
+        # imports are recorded as they finish, so children come before their
+        # parent, exactly like -X importtime
+        lines = [f"# {' '.join(sys.argv)} (pid {os.getpid()})"]
+        lines.append("import time: self [us] | cumulative | imported package")
+        for depth, name, self_us, cumulative_us in self.records:
+            lines.append(f"import time: {self_us:>9} | {cumulative_us:>10} | {'  ' * depth}{name}")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def install_from_env() -> ImportProfiler | None:
+    """Starts profiling imports if OSBOX_IMPORT_PROFILE names an output file."""
+    path = os.environ.get("OSBOX_IMPORT_PROFILE")
+    if not path:
+        return None
+
+    profiler = ImportProfiler()
+    sys.meta_path.insert(0, profiler)
+    atexit.register(profiler.write, path)
+    return profiler
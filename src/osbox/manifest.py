@@ -1,7 +1,5 @@
-import json
 from pathlib import Path
 from typing import TypedDict, NotRequired
-from osbox.wsgi import wsgi_server
 from osbox.command import command
 
 
@@ -11,10 +9,15 @@ class ServiceCommand(TypedDict):
     wsgi_server: NotRequired[bool | None]
     factory: NotRequired[bool | None]
     port: NotRequired[int | None]
+    worker_memory: NotRequired[int | None]
+    # false for long-running commands that must not run in a zygote child
+    zygote: NotRequired[bool | None]
 
 
 class Manifest:
     def __init__(self):
+        import json
+
         # load manifest from package
         manifest_file = Path(__file__).parent / "manifest.json"
         self.manifest = json.loads(manifest_file.read_text())
@@ -28,7 +31,7 @@ class Manifest:
     @property
     def commands(self) -> list[str]:
         return list(self.command_map.keys())
-    
+
     def has_command(self, command_name: str) -> bool:
         return command_name in self.command_map
 
@@ -37,14 +40,42 @@ class Manifest:
         if not command_info:
             raise ValueError(f"Unknown command: {command_name}")
 
-        if command_info.get("wsgi_server"):
-            fn = wsgi_server(
-                app_spec=command_info["module"],
-                service=command_name,
-                port=command_info.get("port", 8000),
-                factory=command_info.get("factory", False),
-            )
-        else:
-            fn = command(command_info["module"])
-
-        return fn()
+        return run_command(command_info)
+
+
+def find_command(command_name: str) -> ServiceCommand | None:
+    """
+    Looks up a single command entry.
+    Uses the index generated by build.py when present and still matching
+    manifest.json, so dispatch does not have to parse the whole manifest.
+    """
+    try:
+        from osbox.manifest_index import COMMANDS, MANIFEST_CRC32
+    except ImportError:
+        return Manifest().command_map.get(command_name)
+
+    import zlib
+
+    # an index left from an earlier build must not win over an edited manifest
+    if zlib.crc32((Path(__file__).parent / "manifest.json").read_bytes()) != MANIFEST_CRC32:
+        return Manifest().command_map.get(command_name)
+    return COMMANDS.get(command_name)
+
+
+def run_command(command_info: ServiceCommand) -> None:
+    if command_info.get("wsgi_server"):
+        # gunicorn is only needed by wsgi services, keep it off the path of
+        # every other command
+        from osbox.wsgi import wsgi_server
+
+        fn = wsgi_server(
+            app_spec=command_info["module"],
+            service=command_info["name"],
+            port=command_info.get("port", 8000),
+            factory=command_info.get("factory", False),
+            worker_memory=command_info.get("worker_memory"),
+        )
+    else:
+        fn = command(command_info["module"])
+
+    return fn()
@@ -0,0 +1,369 @@
+from __future__ import annotations
+
+import errno
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+FLUSH_INTERVAL = 1.0
+MAX_ROUTES = 500
+# longest wait between attempts to bind a metrics port that is still taken
+BIND_RETRY_MAX = 2.0
+
+_ID_SEGMENT = re.compile(
+    r"^(\d+|[0-9a-fA-F]{32}|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})$"
+)
+
+
+def route_label(path: str) -> str:
+    # collapse ids so /servers/<uuid> is one route, not one per server
+    segments = ["{id}" if _ID_SEGMENT.match(s) else s for s in path.split("/")]
+    return "/".join(segments) or "/"
+
+
+# counters of workers that have exited, folded together by retire_worker()
+RETIRED_FILE = "retired.json"
+
+
+class MetricsStore:
+    """
+    Per-worker request metrics. Each worker periodically writes its totals
+    to <metrics_dir>/<pid>.json; render_prometheus() sums those files, so
+    the numbers cover every worker, including ones that have been recycled.
+    """
+
+    def __init__(self, metrics_dir: str):
+        self.metrics_dir = Path(metrics_dir)
+        self.lock = threading.Lock()
+        # the flusher thread and the worker_exit hook both flush; this keeps
+        # their writes and renames of the worker file in order
+        self.flush_lock = threading.Lock()
+        self.pid: int | None = None
+        self.in_flight = 0
+        # (method, route) -> [bucket counts..., +Inf count, sum seconds, response bytes]
+        self.routes: dict[tuple[str, str], list[float]] = {}
+        self.statuses: dict[tuple[str, str, str], int] = {}
+        self.dirty = False
+
+    def _start_flusher(self) -> None:
+        # workers are forked after the store is created, so the flusher is
+        # started lazily in each worker on its first request
+        self.pid = os.getpid()
+        self.in_flight = 0
+        self.routes = {}
+        self.statuses = {}
+        threading.Thread(target=self._flush_loop, name="osbox-metrics", daemon=True).start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def start_request(self) -> None:
+        with self.lock:
+            if self.pid != os.getpid():
+                self._start_flusher()
+            self.in_flight += 1
+            self.dirty = True
+
+    def end_request(self, method: str, route: str, status: str, duration: float, nbytes: int) -> None:
+        with self.lock:
+            self.in_flight -= 1
+            key = (method, route)
+            if key not in self.routes and len(self.routes) >= MAX_ROUTES:
+                key = (method, "other")
+            values = self.routes.get(key)
+            if values is None:
+                values = self.routes[key] = [0.0] * (len(BUCKETS) + 3)
+            for i, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    values[i] += 1
+            values[len(BUCKETS)] += 1
+            values[len(BUCKETS) + 1] += duration
+            values[len(BUCKETS) + 2] += nbytes
+            status_key = (key[0], key[1], status)
+            self.statuses[status_key] = self.statuses.get(status_key, 0) + 1
+            self.dirty = True
+
+    def flush(self) -> None:
+        with self.flush_lock:
+            with self.lock:
+                if not self.dirty or self.pid is None:
+                    return
+                data = {
+                    "pid": self.pid,
+                    "in_flight": self.in_flight,
+                    "routes": [[m, r, v] for (m, r), v in self.routes.items()],
+                    "statuses": [[m, r, s, c] for (m, r, s), c in self.statuses.items()],
+                }
+                self.dirty = False
+
+            tmp = self.metrics_dir / f".{data['pid']}.json.tmp"
+            tmp.write_text(json.dumps(data))
+            os.replace(tmp, self.metrics_dir / f"{data['pid']}.json")
+
+
+class _ResponseIterator:
+    def __init__(self, iterable, finish):
+        self.iterable = iterable
+        self.finish = finish
+        self.nbytes = 0
+
+    def __iter__(self):
+        for chunk in self.iterable:
+            self.nbytes += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self.iterable, "close"):
+                self.iterable.close()
+        finally:
+            self.finish(self.nbytes)
+
+
+def _wrap_file(result, finish):
+    # returning the server's file wrapper itself keeps sendfile working; the
+    # size is what is left of the file, which is what the server sends
+    try:
+        fileno = result.filelike.fileno()
+        nbytes = max(0, os.fstat(fileno).st_size - os.lseek(fileno, 0, os.SEEK_CUR))
+    except (AttributeError, OSError, ValueError):
+        nbytes = 0
+    close = getattr(result, "close", None)
+
+    def _close():
+        try:
+            if close is not None:
+                close()
+        finally:
+            finish(nbytes)
+
+    result.close = _close
+    return result
+
+
+class MetricsMiddleware:
+    """Records latency, status and size of every request to the wrapped app."""
+
+    def __init__(self, app, store: MetricsStore, service: str, path: str | None = None):
+        self.app = app
+        self.store = store
+        self.service = service
+        self.path = path
+
+    def __call__(self, environ, start_response):
+        if self.path and environ.get("PATH_INFO") == self.path:
+            body = render_prometheus(self.store.metrics_dir, self.service).encode()
+            start_response("200 OK", [("Content-Type", "text/plain; version=0.0.4"), ("Content-Length", str(len(body)))])
+            return [body]
+
+        method = environ.get("REQUEST_METHOD", "GET")
+        if not method.isalpha():
+            method = "other"
+        route = route_label(environ.get("PATH_INFO", "/"))
+        status = ["500"]
+        start = time.perf_counter()
+
+        def _start_response(status_line, headers, exc_info=None):
+            status[0] = status_line.split(" ", 1)[0]
+            return start_response(status_line, headers, exc_info)
+
+        def finish(nbytes: int) -> None:
+            self.store.end_request(method, route, status[0], time.perf_counter() - start, nbytes)
+
+        self.store.start_request()
+        try:
+            result = self.app(environ, _start_response)
+        except BaseException:
+            finish(0)
+            raise
+        file_wrapper = environ.get("wsgi.file_wrapper")
+        if isinstance(file_wrapper, type) and isinstance(result, file_wrapper):
+            return _wrap_file(result, finish)
+        return _ResponseIterator(result, finish)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read(path: Path) -> dict | None:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _add(routes: dict, statuses: dict, data: dict) -> None:
+    for method, route, values in data["routes"]:
+        total = routes.setdefault((method, route), [0.0] * len(values))
+        for i, v in enumerate(values):
+            total[i] += v
+    for method, route, status, count in data["statuses"]:
+        key = (method, route, status)
+        statuses[key] = statuses.get(key, 0) + count
+
+
+def retire_worker(metrics_dir: Path | str, pid: int) -> None:
+    """
+    Folds the counters of an exited worker into RETIRED_FILE and removes
+    its own file, so recycling workers does not grow the directory. Runs in
+    the master's child_exit hook, after the worker's last flush.
+    """
+    metrics_dir = Path(metrics_dir)
+    worker_file = metrics_dir / f"{pid}.json"
+    data = _read(worker_file)
+    if data is None:
+        worker_file.unlink(missing_ok=True)
+        return
+
+    retired = _read(metrics_dir / RETIRED_FILE) or {"routes": [], "statuses": [], "merged": []}
+    routes: dict[tuple[str, str], list[float]] = {}
+    statuses: dict[tuple[str, str, str], int] = {}
+    _add(routes, statuses, retired)
+    _add(routes, statuses, data)
+    # render_prometheus() skips the files listed in merged, so a scrape
+    # between the rename and the unlink does not count the worker twice
+    merged = [p for p in retired["merged"] if (metrics_dir / f"{p}.json").exists()]
+    retired = {
+        "pid": None,
+        "in_flight": 0,
+        "routes": [[m, r, v] for (m, r), v in routes.items()],
+        "statuses": [[m, r, s, c] for (m, r, s), c in statuses.items()],
+        "merged": merged + [pid],
+    }
+    tmp = metrics_dir / f".{RETIRED_FILE}.tmp"
+    tmp.write_text(json.dumps(retired))
+    os.replace(tmp, metrics_dir / RETIRED_FILE)
+    worker_file.unlink()
+
+
+def render_prometheus(metrics_dir: Path | str, service: str) -> str:
+    routes: dict[tuple[str, str], list[float]] = {}
+    statuses: dict[tuple[str, str, str], int] = {}
+    in_flight = 0
+    workers = 0
+
+    retired = _read(Path(metrics_dir) / RETIRED_FILE)
+    merged = set(retired["merged"]) if retired else set()
+    if retired:
+        _add(routes, statuses, retired)
+    for worker_file in Path(metrics_dir).glob("*.json"):
+        if worker_file.name == RETIRED_FILE:
+            continue
+        data = _read(worker_file)
+        if data is None or data["pid"] in merged:
+            continue
+        # counters of recycled workers still count, their in-flight gauge does not
+        if _alive(data["pid"]):
+            in_flight += data["in_flight"]
+            workers += 1
+        _add(routes, statuses, data)
+
+    svc = _escape(service)
+    lines = [
+        "# HELP osbox_http_requests_in_flight Requests currently being handled.",
+        "# TYPE osbox_http_requests_in_flight gauge",
+        f'osbox_http_requests_in_flight{{service="{svc}"}} {in_flight}',
+        "# HELP osbox_http_workers Workers that have reported metrics and are alive.",
+        "# TYPE osbox_http_workers gauge",
+        f'osbox_http_workers{{service="{svc}"}} {workers}',
+        "# HELP osbox_http_requests_total Requests by status code.",
+        "# TYPE osbox_http_requests_total counter",
+    ]
+    for (method, route, status), count in sorted(statuses.items()):
+        lines.append(
+            f'osbox_http_requests_total{{service="{svc}",method="{method}",route="{_escape(route)}",status="{status}"}} {count}'
+        )
+
+    lines += [
+        "# HELP osbox_http_request_duration_seconds Request latency.",
+        "# TYPE osbox_http_request_duration_seconds histogram",
+    ]
+    for (method, route), values in sorted(routes.items()):
+        labels = f'service="{svc}",method="{method}",route="{_escape(route)}"'
+        for bound, count in zip(BUCKETS, values):
+            lines.append(f'osbox_http_request_duration_seconds_bucket{{{labels},le="{bound:g}"}} {int(count)}')
+        lines.append(f'osbox_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {int(values[len(BUCKETS)])}')
+        lines.append(f"osbox_http_request_duration_seconds_sum{{{labels}}} {values[len(BUCKETS) + 1]:.6f}")
+        lines.append(f"osbox_http_request_duration_seconds_count{{{labels}}} {int(values[len(BUCKETS)])}")
+
+    lines += [
+        "# HELP osbox_http_response_bytes_total Response body bytes sent.",
+        "# TYPE osbox_http_response_bytes_total counter",
+    ]
+    for (method, route), values in sorted(routes.items()):
+        lines.append(
+            f'osbox_http_response_bytes_total{{service="{svc}",method="{method}",route="{_escape(route)}"}} {int(values[len(BUCKETS) + 2])}'
+        )
+
+    return "\n".join(lines) + "\n"
+
+
+def serve_metrics(metrics_dir: str, service: str, bind: str) -> int:
+    """
+    Forks a small process serving render_prometheus() on bind (host:port).
+    Runs outside the gunicorn master so the master stays single threaded;
+    it exits on its own once the master is gone. While the port is taken,
+    by the metrics server of the master a USR2 upgrade replaces, it keeps
+    retrying.
+    """
+    from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+    import signal
+
+    master = os.getpid()
+    pid = os.fork()
+    if pid:
+        return pid
+
+    # drop the handlers the arbiter installed
+    for signum in (signal.SIGHUP, signal.SIGQUIT, signal.SIGINT, signal.SIGTERM, signal.SIGTTIN,
+                   signal.SIGTTOU, signal.SIGUSR1, signal.SIGUSR2, signal.SIGWINCH, signal.SIGCHLD):
+        signal.signal(signum, signal.SIG_DFL)
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    def app(environ, start_response):
+        body = render_prometheus(metrics_dir, service).encode()
+        start_response("200 OK", [("Content-Type", "text/plain; version=0.0.4"), ("Content-Length", str(len(body)))])
+        return [body]
+
+    code = 0
+    try:
+        host, _, port = bind.rpartition(":")
+        httpd, delay = None, 0.1
+        while httpd is None and os.getppid() == master:
+            try:
+                httpd = make_server(host or "127.0.0.1", int(port), app, handler_class=QuietHandler)
+            except OSError as e:
+                if e.errno != errno.EADDRINUSE:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, BIND_RETRY_MAX)
+        if httpd is not None:
+            httpd.timeout = 1.0
+        while httpd is not None and os.getppid() == master:
+            httpd.handle_request()
+    except BaseException as e:
+        print(f"{service}: metrics server failed: {e}", flush=True)
+        code = 1
+    finally:
+        os._exit(code)
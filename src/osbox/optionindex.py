@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import re
+import sqlite3
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+# `#name = value` is an option line in oslo-config-generator output; help
+# text lines are "# " or a lone "#"
+OPTION_RE = re.compile(r"^#([A-Za-z0-9_\-]+) = ?(.*)$")
+SECTION_RE = re.compile(r"^\[([^\]]+)\]\s*$")
+TYPE_RE = re.compile(r"\(([a-z ]+?)\s+value\)|\((multi valued)\)")
+FROM_RE = re.compile(r"^From [\w.\-]+$")
+
+SCHEMA = """
+CREATE TABLE options (
+    service TEXT NOT NULL,
+    asset TEXT NOT NULL,
+    section TEXT NOT NULL,
+    name TEXT NOT NULL,
+    "default" TEXT,
+    type TEXT,
+    help TEXT NOT NULL
+);
+CREATE INDEX options_lookup ON options (service, section, name);
+CREATE INDEX options_name ON options (name);
+"""
+
+
+@dataclass(frozen=True)
+class Option:
+    service: str
+    asset: str
+    section: str
+    name: str
+    default: Optional[str]
+    type: Optional[str]
+    help: str
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def parse_genconfig(lines: Iterable[str], service: str, asset: str) -> Iterator[Option]:
+    """Options of a sample config written by oslo-config-generator."""
+    section = "DEFAULT"
+    block: list[str] = []
+    # a multi valued option is written as one `#name = value` line per
+    # default, right after each other; they become one option
+    pending: Optional[Option] = None
+    for raw in lines:
+        line = raw.rstrip("\n")
+        match = SECTION_RE.match(line)
+        if match:
+            if pending:
+                yield pending
+            section, block, pending = match.group(1), [], None
+            continue
+        match = OPTION_RE.match(line)
+        if match:
+            default = None if match.group(2) == "<None>" else match.group(2)
+            if pending and not block and pending.name == match.group(1):
+                if default is not None:
+                    merged = default if pending.default is None else f"{pending.default}\n{default}"
+                    pending = replace(pending, default=merged)
+                continue
+            if pending:
+                yield pending
+            help_text = "\n".join(block).strip()
+            # the "(string value)" marker may be wrapped onto two lines
+            type_match = TYPE_RE.search(" ".join(block))
+            pending = Option(
+                service,
+                asset,
+                section,
+                match.group(1),
+                default,
+                (type_match.group(1) or type_match.group(2)) if type_match else None,
+                help_text,
+            )
+            block = []
+        elif line == "#" or line.startswith("# "):
+            text = line[2:]
+            if not FROM_RE.match(text):
+                block.append(text)
+        else:
+            # blank lines separate options
+            block = []
+    if pending:
+        yield pending
+
+
+def write_index(options: Iterable[Option], index_file: Path) -> int:
+    tmp = index_file.with_suffix(".tmp")
+    tmp.unlink(missing_ok=True)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.executescript(SCHEMA)
+        count = 0
+        for option in options:
+            conn.execute(
+                "INSERT INTO options VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (option.service, option.asset, option.section, option.name, option.default, option.type, option.help),
+            )
+            count += 1
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    tmp.replace(index_file)
+    return count
+
+
+def _connect(index_file: Path) -> sqlite3.Connection:
+    # the index ships read-only inside the bundle
+    return sqlite3.connect(f"file:{index_file}?mode=ro&immutable=1", uri=True)
+
+
+def get(index_file: Path, service: str, section: str, name: str) -> list[Option]:
+    conn = _connect(index_file)
+    try:
+        rows = conn.execute(
+            "SELECT * FROM options WHERE service = ? AND section = ? AND name = ?", (service, section, name)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [Option(*row) for row in rows]
+
+
+def search(
+    index_file: Path,
+    pattern: str,
+    *,
+    service: Optional[str] = None,
+    in_help: bool = False,
+    limit: Optional[int] = None,
+) -> list[Option]:
+    """
+    Options whose section.name contains pattern, case-insensitively, or
+    matches it as a glob when it has * ? or [.
+    """
+    if any(c in pattern for c in "*?["):
+        match, arg = "lower(section || '.' || name) GLOB ?", pattern.lower()
+        help_match = "lower(help) GLOB ?"
+    else:
+        escaped = pattern.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        match, arg = "lower(section || '.' || name) LIKE ? ESCAPE '\\'", f"%{escaped}%"
+        help_match = "lower(help) LIKE ? ESCAPE '\\'"
+
+    where, args = [f"({match}{f' OR {help_match}' if in_help else ''})"], [arg] + ([arg] if in_help else [])
+    if service:
+        where.append("service = ?")
+        args.append(service)
+    sql = f"SELECT * FROM options WHERE {' AND '.join(where)} ORDER BY service, asset, section, name"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+
+    conn = _connect(index_file)
+    try:
+        rows = conn.execute(sql, args).fetchall()
+    finally:
+        conn.close()
+    return [Option(*row) for row in rows]
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import fcntl
+import os
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * PAGE_SIZE
+
+
+class RSSWatchdog:
+    """
+    Gunicorn post_request hook that retires a worker once its RSS goes
+    above max_rss bytes. The worker finishes what it is handling and exits
+    normally, and the arbiter starts a fresh one.
+
+    Only one worker of a service recycles at a time: it must hold an
+    exclusive lock on lock_file, which is released when it exits. Workers
+    that go over the limit meanwhile try again on a later check, so the
+    service never loses all of its workers at once.
+    """
+
+    def __init__(self, max_rss: int, lock_file: str, check_every: int = 10):
+        self.max_rss = max_rss
+        self.lock_file = lock_file
+        self.check_every = check_every
+        self.requests = 0
+        self.lock_fd: int | None = None
+
+    def __call__(self, worker, req, environ, resp) -> None:
+        self.requests += 1
+        if self.lock_fd is not None or self.requests % self.check_every:
+            return
+
+        rss = current_rss()
+        if rss <= self.max_rss:
+            return
+
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return
+
+        # keep the lock until this process exits
+        self.lock_fd = fd
+        worker.log.info(
+            "Worker %s RSS %d MiB is above %d MiB, recycling",
+            os.getpid(),
+            rss // (1024 * 1024),
+            self.max_rss // (1024 * 1024),
+        )
+        worker.alive = False
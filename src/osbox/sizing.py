@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import math
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+# leave headroom for the master, page cache and memory growth
+MEMORY_BUDGET = 0.8
+DEFAULT_WORKER_MEMORY_MB = 256
+AUTO_THREADS = 4
+
+
+@dataclass(frozen=True)
+class Sizing:
+    workers: int
+    threads: int
+    worker_class: str
+    cpus: float
+    memory_limit: int | None
+
+
+def _cgroup_dirs() -> list[Path]:
+    """The cgroup v2 directories of this process, innermost first."""
+    try:
+        lines = Path("/proc/self/cgroup").read_text().splitlines()
+    except OSError:
+        return []
+
+    for line in lines:
+        if line.startswith("0::"):
+            cgroup = CGROUP_ROOT / line[3:].lstrip("/")
+            dirs = [cgroup]
+            while cgroup != CGROUP_ROOT and CGROUP_ROOT in cgroup.parents:
+                cgroup = cgroup.parent
+                dirs.append(cgroup)
+            return dirs
+    return []
+
+
+def cgroup_cpu_limit() -> float | None:
+    # limits are inherited, the tightest one along the path applies
+    limit: float | None = None
+    for cgroup in _cgroup_dirs():
+        try:
+            quota, period = (cgroup / "cpu.max").read_text().split()
+        except (OSError, ValueError):
+            continue
+        if quota == "max":
+            continue
+        cpus = int(quota) / int(period)
+        limit = cpus if limit is None else min(limit, cpus)
+    return limit
+
+
+def cgroup_memory_limit() -> int | None:
+    limit: int | None = None
+    for cgroup in _cgroup_dirs():
+        try:
+            value = (cgroup / "memory.max").read_text().strip()
+        except OSError:
+            continue
+        if value == "max":
+            continue
+        limit = int(value) if limit is None else min(limit, int(value))
+    return limit
+
+
+def available_cpus() -> float:
+    try:
+        cpus = float(len(os.sched_getaffinity(0)))
+    except AttributeError:
+        cpus = float(os.cpu_count() or 1)
+
+    quota = cgroup_cpu_limit()
+    if quota is not None:
+        cpus = min(cpus, quota)
+    return cpus
+
+
+def auto_sizing(worker_memory_mb: int | None = None) -> Sizing:
+    """
+    Picks gthread workers and threads from the CPU quota and memory limit
+    of our cgroup: one worker per CPU, capped by how many workers of
+    worker_memory_mb fit into the memory limit.
+    """
+    cpus = available_cpus()
+    memory_limit = cgroup_memory_limit()
+
+    workers = max(1, math.ceil(cpus))
+    if memory_limit is not None:
+        worker_bytes = (worker_memory_mb or DEFAULT_WORKER_MEMORY_MB) * 1024 * 1024
+        workers = max(1, min(workers, int(memory_limit * MEMORY_BUDGET) // worker_bytes))
+
+    return Sizing(
+        workers=workers,
+        threads=AUTO_THREADS,
+        worker_class="gthread",
+        cpus=cpus,
+        memory_limit=memory_limit,
+    )
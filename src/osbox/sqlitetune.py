@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import sqlite3
+from dataclasses import dataclass
+
+MIB = 1024 * 1024
+
+# Named SQLite tuning profiles. Values are what PRAGMA <name> reads back,
+# negative cache_size is in KiB.
+PROFILES: dict[str, dict[str, object]] = {
+    "balanced": {
+        "journal_mode": "wal",
+        "page_size": 4096,
+        "auto_vacuum": 2,
+        "synchronous": 1,
+        "cache_size": -64 * 1024,
+        "mmap_size": 256 * MIB,
+        "temp_store": 2,
+        "wal_autocheckpoint": 1000,
+    },
+    # token validation and catalog lookups: keep as much of the database
+    # mapped and cached as possible
+    "read-heavy": {
+        "journal_mode": "wal",
+        "page_size": 4096,
+        "auto_vacuum": 2,
+        "synchronous": 1,
+        "cache_size": -128 * 1024,
+        "mmap_size": 1024 * MIB,
+        "temp_store": 2,
+        "wal_autocheckpoint": 1000,
+    },
+    # token issue and allocation churn: bigger pages, fewer checkpoints
+    "write-heavy": {
+        "journal_mode": "wal",
+        "page_size": 8192,
+        "auto_vacuum": 2,
+        "synchronous": 1,
+        "cache_size": -32 * 1024,
+        "mmap_size": 256 * MIB,
+        "temp_store": 2,
+        "wal_autocheckpoint": 4000,
+    },
+}
+
+# stored in the database file; everything else only lasts for the
+# connection that set it and has to be applied by the service on connect
+PERSISTENT = ("journal_mode", "page_size", "auto_vacuum")
+# only take effect after the database is rebuilt with VACUUM
+NEEDS_VACUUM = ("page_size", "auto_vacuum")
+
+
+@dataclass(frozen=True)
+class Setting:
+    name: str
+    current: object
+    target: object
+    persistent: bool
+
+    @property
+    def changed(self) -> bool:
+        return _normalize(self.current) != _normalize(self.target)
+
+
+def _normalize(value: object) -> object:
+    return value.lower() if isinstance(value, str) else value
+
+
+def connect(db_path: str, timeout: float = 60) -> sqlite3.Connection:
+    # autocommit, so PRAGMAs and VACUUM are not wrapped in a transaction
+    return sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+
+
+def read_pragma(conn: sqlite3.Connection, name: str) -> object:
+    row = conn.execute(f"PRAGMA {name}").fetchone()
+    return row[0] if row else None
+
+
+def compare(conn: sqlite3.Connection, profile: str) -> list[Setting]:
+    """Current vs. target value of every setting in the profile."""
+    return [
+        Setting(name, read_pragma(conn, name), target, name in PERSISTENT)
+        for name, target in PROFILES[profile].items()
+    ]
+
+
+def connection_pragmas(profile: str) -> list[str]:
+    return [f"PRAGMA {name}={value}" for name, value in PROFILES[profile].items() if name not in PERSISTENT]
+
+
+def apply_connection_pragmas(conn: sqlite3.Connection, profile: str) -> None:
+    for pragma in connection_pragmas(profile):
+        conn.execute(pragma)
+
+
+def apply_profile(conn: sqlite3.Connection, profile: str, *, analyze: bool = True) -> list[str]:
+    """
+    Brings the database file to the profile and returns the statements
+    that were run. page_size cannot change while in WAL mode, so a rebuild
+    goes through rollback journal mode and back.
+    """
+    target = PROFILES[profile]
+    done: list[str] = []
+
+    def run(sql: str) -> None:
+        conn.execute(sql).fetchall()
+        done.append(sql)
+
+    settings = {s.name: s for s in compare(conn, profile)}
+    if any(settings[name].changed for name in NEEDS_VACUUM):
+        if settings["page_size"].changed and _normalize(settings["journal_mode"].current) == "wal":
+            run("PRAGMA journal_mode=DELETE")
+        for name in NEEDS_VACUUM:
+            run(f"PRAGMA {name}={target[name]}")
+        run("VACUUM")
+
+    if _normalize(read_pragma(conn, "journal_mode")) != target["journal_mode"]:
+        run(f"PRAGMA journal_mode={target['journal_mode'].upper()}")
+
+    for pragma in connection_pragmas(profile):
+        run(pragma)
+
+    if analyze:
+        has_stats = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+        if not has_stats:
+            run("ANALYZE")
+        run("PRAGMA optimize")
+    return done
+
+
+def install_connect_hook(profile: str) -> None:
+    """
+    Applies the connection-level settings of a profile to every SQLite
+    connection SQLAlchemy opens in this process (and its forked workers).
+    """
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    pragmas = connection_pragmas(profile)
+
+    @event.listens_for(Engine, "connect")
+    def _tune_sqlite(dbapi_connection, _connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
@@ -1,47 +1,226 @@
 from __future__ import annotations
+import gc
+import inspect
 import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
 from gunicorn.app.base import BaseApplication
 from gunicorn.util import import_app
+from osbox.accesslog import AsyncJSONLogger
+from osbox.metrics import MetricsMiddleware, MetricsStore, retire_worker, serve_metrics
+from osbox.recycle import RSSWatchdog
+from osbox.sizing import auto_sizing
 
 
-def wsgi_server(app_spec: str, service: str, port: int, *, factory: bool = False):
+def service_setting(service_env_slug: str, name: str, default: str) -> str:
+    # OSBOX_<NAME> applies to every service, OSBOX_<SERVICE>_<NAME> to one
+    return os.environ.get(
+        f"OSBOX_{name}",
+        os.environ.get(f"OSBOX_{service_env_slug}_{name}", default),
+    )
+
+
+def service_flag(service_env_slug: str, name: str, default: bool = False) -> bool:
+    value = service_setting(service_env_slug, name, "1" if default else "0")
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def wsgi_server(
+    app_spec: str,
+    service: str,
+    port: int,
+    *,
+    factory: bool = False,
+    worker_memory: int | None = None,
+):
     service_env_slug = service.upper().replace("-", "_")
     def run() -> None:
-        bind = os.environ.get(f"OSBOX_{service_env_slug}_BIND", f"127.0.0.1:{port}")
-        WSGIServer(
-            app_spec,
-            {
-                "bind": bind,
-                "workers": int(
-                    os.environ.get(
-                        "OSBOX_WORKERS",
-                        int(os.environ.get(f"OSBOX_{service_env_slug}_WORKERS", "1")),
-                    )
-                ),
-                "timeout": 300,
-                "threads": int(
-                    os.environ.get(
-                        "OSBOX_THREADS",
-                        int(os.environ.get(f"OSBOX_{service_env_slug}_THREADS", "1")),
-                    )
-                ),
-                "accesslog": "-",
-                "errorlog": "-",
-                "loglevel": "info",
-                "worker_class": "sync",
-                "preload_app": False,
-            },
-            factory=factory,
-        ).run()
+        # comma separated list of host:port and unix:/path/to.sock addresses
+        bind = [
+            b.strip()
+            for b in os.environ.get(f"OSBOX_{service_env_slug}_BIND", f"127.0.0.1:{port}").split(",")
+            if b.strip()
+        ]
+        for b in bind:
+            if b.startswith("unix:"):
+                os.makedirs(os.path.dirname(b[5:]) or ".", exist_ok=True)
+
+        reuse_port = service_flag(service_env_slug, "REUSE_PORT")
+        if reuse_port and any(b.startswith("unix:") for b in bind):
+            # gunicorn would set SO_REUSEPORT on the unix sockets too
+            print(f"{service}: REUSE_PORT ignored, it cannot be combined with unix sockets", file=sys.stderr)
+            reuse_port = False
+
+        # WORKERS=auto or THREADS=auto size like AUTOSIZE, a number set for
+        # the other one still wins
+        workers_setting = service_setting(service_env_slug, "WORKERS", "").strip().lower()
+        threads_setting = service_setting(service_env_slug, "THREADS", "").strip().lower()
+        workers, threads, worker_class = 1, 1, "sync"
+        if service_flag(service_env_slug, "AUTOSIZE") or "auto" in (workers_setting, threads_setting):
+            sizing = auto_sizing(worker_memory)
+            workers, threads, worker_class = sizing.workers, sizing.threads, sizing.worker_class
+            memory = f"{sizing.memory_limit // (1024 * 1024)}MiB" if sizing.memory_limit else "unlimited"
+            print(f"{service}: auto sizing for {sizing.cpus:g} cpus, memory {memory}", file=sys.stderr)
+
+        options = {
+            "bind": bind,
+            # lets several instances share a port, e.g. one per NUMA node
+            "reuse_port": reuse_port,
+            "workers": _count(service, "WORKERS", workers_setting, workers),
+            "timeout": 300,
+            "threads": _count(service, "THREADS", threads_setting, threads),
+            "accesslog": "-",
+            "errorlog": "-",
+            "loglevel": "info",
+            "worker_class": service_setting(service_env_slug, "WORKER_CLASS", worker_class),
+            # import the app once in the master and share its pages
+            # copy-on-write with the workers
+            "preload_app": service_flag(service_env_slug, "PRELOAD"),
+            "proc_name": service,
+            "pre_exec": lambda server: _pre_exec(server, service),
+        }
+        if options["preload_app"]:
+            # the master keeps the collector off after the preload (see
+            # WSGIServer.load), each worker turns it back on
+            add_hook(options, "post_fork", lambda server, worker: gc.enable())
+
+        # a master started by USR2 writes <pidfile>.2 and takes over
+        # <pidfile> once the old master has exited
+        pidfile = os.environ.get(f"OSBOX_{service_env_slug}_PIDFILE")
+        if pidfile:
+            options["pidfile"] = pidfile
+
+        # recycle workers after a number of requests, jittered so they do
+        # not all restart together
+        max_requests = int(service_setting(service_env_slug, "MAX_REQUESTS", "0"))
+        options["max_requests"] = max_requests
+        options["max_requests_jitter"] = int(
+            service_setting(service_env_slug, "MAX_REQUESTS_JITTER", str(max_requests // 10))
+        )
+
+        # and once they grow past MAX_RSS (MiB)
+        max_rss = int(service_setting(service_env_slug, "MAX_RSS", "0"))
+        if max_rss > 0:
+            lock_file = os.path.join(tempfile.gettempdir(), f"osbox-{service}.recycle.lock")
+            add_hook(options, "post_request", RSSWatchdog(max_rss * 1024 * 1024, lock_file))
+
+        if service_setting(service_env_slug, "ACCESSLOG_FORMAT", "plain") == "json":
+            options["logger_class"] = type(
+                "ServiceAccessLogger",
+                (AsyncJSONLogger,),
+                {
+                    "queue_size": int(service_setting(service_env_slug, "ACCESSLOG_QUEUE", "10000")),
+                    "sample_2xx": float(service_setting(service_env_slug, "ACCESSLOG_SAMPLE", "1.0")),
+                },
+            )
+        # connection-level settings of an `osbox sqlite-tune` profile
+        sqlite_profile = service_setting(service_env_slug, "SQLITE_PROFILE", "")
+        if sqlite_profile:
+            from osbox.sqlitetune import PROFILES, install_connect_hook
+
+            if sqlite_profile not in PROFILES:
+                print(f"{service}: unknown SQLITE_PROFILE {sqlite_profile}", file=sys.stderr)
+                sys.exit(1)
+            install_connect_hook(sqlite_profile)
+
+        print(
+            f"{service}: workers={options['workers']} threads={options['threads']} "
+            f"worker_class={options['worker_class']}",
+            file=sys.stderr,
+        )
+
+        metrics = None
+        if service_flag(service_env_slug, "METRICS"):
+            metrics = _setup_metrics(service, service_env_slug, options)
+
+        WSGIServer(app_spec, options, factory=factory, service=service, metrics=metrics).run()
 
     return run
 
 
+def _count(service: str, name: str, value: str, default: int) -> int:
+    if value in ("", "auto"):
+        return default
+    try:
+        count = int(value)
+    except ValueError:
+        count = 0
+    if count < 1:
+        print(f"{service}: {name} must be a positive number or auto, got {value!r}", file=sys.stderr)
+        sys.exit(1)
+    return count
+
+
+def _pre_exec(server, service: str) -> None:
+    # On USR2 gunicorn re-executes sys.executable with [sys.executable,
+    # *sys.argv]. argv[0] is the command name or, when started through a
+    # symlink, a path to it, which the cli would not find as a command, so
+    # always pass the command by name. In the bundle sys.executable is osbox
+    # itself; from source it is the interpreter, so point it at the cli.
+    args = server.START_CTX["args"][2:]
+    server.START_CTX[0] = sys.executable
+    if getattr(sys, "frozen", False):
+        server.START_CTX["args"] = [sys.executable, service, *args]
+    else:
+        server.START_CTX["args"] = [sys.executable, "-c", "from osbox.cli import main; main()", service, *args]
+
+
+def add_hook(options: dict, name: str, fn) -> None:
+    """Sets a gunicorn server hook, chaining it after one already set."""
+    previous = options.get(name)
+    if previous is None:
+        options[name] = fn
+        return
+
+    def chained(*args):
+        previous(*args)
+        fn(*args)
+
+    # gunicorn checks the arity of hooks
+    chained.__signature__ = inspect.signature(fn)
+    options[name] = chained
+
+
+def _setup_metrics(service: str, service_env_slug: str, options: dict) -> MetricsStore:
+    metrics_dir = service_setting(service_env_slug, "METRICS_DIR", "")
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+        # counters restart with the service
+        for stale in Path(metrics_dir).glob("*.json"):
+            stale.unlink()
+    else:
+        metrics_dir = tempfile.mkdtemp(prefix=f"osbox-{service}-metrics-")
+        add_hook(options, "on_exit", lambda server: shutil.rmtree(metrics_dir, ignore_errors=True))
+
+    store = MetricsStore(metrics_dir)
+    add_hook(options, "worker_exit", lambda server, worker: store.flush())
+    add_hook(options, "child_exit", lambda server, worker: retire_worker(metrics_dir, worker.pid))
+
+    metrics_bind = service_setting(service_env_slug, "METRICS_BIND", "")
+    if metrics_bind:
+        add_hook(options, "when_ready", lambda server: serve_metrics(metrics_dir, service, metrics_bind))
+    elif not service_setting(service_env_slug, "METRICS_PATH", ""):
+        print(f"{service}: METRICS is on but neither METRICS_BIND nor METRICS_PATH is set", file=sys.stderr)
+
+    return store
+
+
 class WSGIServer(BaseApplication):
-    def __init__(self, application, options=None, factory: bool = False):
+    def __init__(
+        self,
+        application,
+        options=None,
+        factory: bool = False,
+        service: str = "osbox",
+        metrics: MetricsStore | None = None,
+    ):
         self.application = application  # can be callable OR "module:obj"
         self.options = options or {}
         self.factory = factory
+        self.service = service
+        self.metrics = metrics
         super().__init__()
 
     def load_config(self):
@@ -50,6 +229,29 @@ class WSGIServer(BaseApplication):
                 self.cfg.set(key, value)
 
     def load(self):
+        # With preload_app this runs in the master before any worker is
+        # forked. The collector stays off from here on in the master, so it
+        # frees nothing and leaves no holes in the pages the workers share,
+        # and everything imported is moved into the permanent generation so
+        # the workers' collectors never write to (and copy) those pages.
+        if self.cfg.preload_app:
+            gc.disable()
+
+        app = self._load_app()
+
+        if self.metrics is not None:
+            service_env_slug = self.service.upper().replace("-", "_")
+            # metrics are served on METRICS_BIND; a METRICS_PATH also serves
+            # them on the app's own port, shadowing any app url at that path
+            path = service_setting(service_env_slug, "METRICS_PATH", "") or None
+            app = MetricsMiddleware(app, self.metrics, self.service, path)
+
+        if self.cfg.preload_app:
+            gc.freeze()
+
+        return app
+
+    def _load_app(self):
         # If passed "module:obj", import it inside the worker process.
         if isinstance(self.application, str):
             obj = import_app(self.application)
@@ -0,0 +1,79 @@
+"""
+Building an asset pack and reading it back.
+
+    python -m unittest discover tests
+"""
+
+import io
+import os
+import sys
+import tarfile
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from osbox.assetpack import AssetPack, write_pack  # noqa: E402
+
+FILES = {
+    "nova/nova.conf.sample": b"[DEFAULT]\n#debug = false\n",
+    "nova/api-paste.ini": b"[composite:osapi_compute]\nuse = call:nova.api.openstack.urlmap:urlmap_factory\n",
+    "nova/rootwrap.d/compute.filters": b"[Filters]\n",
+    "keystone/keystone.conf.sample": os.urandom(3 * 1024 * 1024 + 7),
+    "keystone/empty": b"",
+}
+
+
+class AssetPackTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        assets = self.tmp / "assets"
+        for name, data in FILES.items():
+            path = assets / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+        (assets / "nova/rootwrap.d/compute.filters").chmod(0o640)
+
+        self.pack_file = self.tmp / "assets.pack"
+        self.assertEqual(write_pack(assets, self.pack_file), len(FILES))
+        self.pack = AssetPack(self.pack_file)
+        self.addCleanup(self.pack.close)
+
+    def test_lookup(self):
+        self.assertEqual(self.pack.services(), ["keystone", "nova"])
+        self.assertEqual(self.pack.listdir("nova"), (["api-paste.ini", "nova.conf.sample"], ["rootwrap.d"]))
+        self.assertTrue(self.pack.is_dir("nova/rootwrap.d"))
+        self.assertFalse(self.pack.is_dir("nova/api-paste.ini"))
+        for name, data in FILES.items():
+            self.assertEqual(self.pack.size(name), len(data))
+            view = self.pack.view(name)
+            self.assertEqual(bytes(view), data)
+            view.release()
+
+    def test_sendfile(self):
+        name = "keystone/keystone.conf.sample"
+        with open(self.tmp / "out", "wb") as out:
+            self.pack.sendfile(name, out.fileno())
+        self.assertEqual((self.tmp / "out").read_bytes(), FILES[name])
+
+    def test_write_tar(self):
+        out = io.BytesIO()
+        self.assertEqual(self.pack.write_tar("nova", out), 3)
+        out.seek(0)
+        with tarfile.open(fileobj=out) as tar:
+            members = {m.name: m for m in tar.getmembers()}
+            self.assertEqual(sorted(members), sorted(n for n in FILES if n.startswith("nova/")))
+            self.assertEqual(members["nova/rootwrap.d/compute.filters"].mode, 0o640)
+            self.assertEqual(tar.extractfile("nova/api-paste.ini").read(), FILES["nova/api-paste.ini"])
+
+    def test_not_a_pack(self):
+        (self.tmp / "other").write_bytes(b"x" * 64)
+        with self.assertRaises(ValueError):
+            AssetPack(self.tmp / "other")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+The service build cache: what its key depends on, resolving refs to
+commits, hits and misses, and pruning.
+
+    python -m unittest discover tests
+"""
+
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import build  # noqa: E402
+from build import build_service_cached, prune_build_cache, resolve_ref, service_cache_key  # noqa: E402
+
+SERVICE = {
+    "src": "https://opendev.org/openstack/nova",
+    "ref": "stable/2025.2",
+    "assets": [{"name": "nova/nova.conf.sample", "src": "etc/nova/nova-config-generator.conf", "genconfig": True}],
+}
+COMMIT = "1ff6a8e796c2f7c5a418446202f1d4762de4c191"
+TOOLCHAIN = {"upper_constraints": "0" * 64, "uv": "uv 0.9.0", "python": "python 3.13.0", "cache_version": 1}
+
+
+def _git(cwd: Path, *args: str) -> str:
+    return subprocess.check_output(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args], cwd=cwd, text=True
+    ).strip()
+
+
+class CacheKeyTest(unittest.TestCase):
+    def test_key(self):
+        key = service_cache_key(SERVICE, COMMIT, TOOLCHAIN)
+        self.assertEqual(len(key), 64)
+        # the ref only matters through the commit it resolves to
+        self.assertEqual(service_cache_key({**SERVICE, "ref": "master"}, COMMIT, TOOLCHAIN), key)
+        self.assertEqual(service_cache_key(SERVICE, COMMIT, dict(reversed(TOOLCHAIN.items()))), key)
+
+        changed = [
+            service_cache_key(SERVICE, "0" * 40, TOOLCHAIN),
+            service_cache_key({**SERVICE, "src": "https://example.com/nova"}, COMMIT, TOOLCHAIN),
+            service_cache_key({**SERVICE, "assets": []}, COMMIT, TOOLCHAIN),
+            service_cache_key(SERVICE, COMMIT, {**TOOLCHAIN, "uv": "uv 0.9.1"}),
+            service_cache_key(SERVICE, COMMIT, {**TOOLCHAIN, "cache_version": 2}),
+        ]
+        self.assertNotIn(key, changed)
+        self.assertEqual(len(set(changed)), len(changed))
+
+    def test_resolve_ref(self):
+        with tempfile.TemporaryDirectory() as td, contextlib.redirect_stdout(io.StringIO()):
+            repo = Path(td)
+            _git(repo, "init", "-q", "-b", "main")
+            _git(repo, "commit", "-q", "--allow-empty", "-m", "first")
+            first = _git(repo, "rev-parse", "HEAD")
+            _git(repo, "tag", "-a", "-m", "v1", "v1")
+            _git(repo, "commit", "-q", "--allow-empty", "-m", "second")
+            second = _git(repo, "rev-parse", "HEAD")
+
+            self.assertEqual(resolve_ref(str(repo), "main"), second)
+            # the commit an annotated tag points at, not the tag object
+            self.assertEqual(resolve_ref(str(repo), "v1"), first)
+            self.assertEqual(resolve_ref("/nonexistent", COMMIT), COMMIT)
+            with self.assertRaises(RuntimeError):
+                resolve_ref(str(repo), "no-such-branch")
+
+
+class BuildServiceCachedTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        self.cache_dir = self.tmp / "cache"
+        self.builds: list[dict] = []
+        self.enterContext(contextlib.redirect_stdout(io.StringIO()))
+
+    def fake_build(self, service_name, service_info, build_path, dist_path):
+        self.builds.append(service_info)
+        wheel = build_path / service_name / "dist" / "nova-31.0.0-py3-none-any.whl"
+        wheel.parent.mkdir(parents=True)
+        wheel.write_bytes(b"wheel")
+        dist_path.mkdir(parents=True, exist_ok=True)
+        (dist_path / wheel.name).write_bytes(b"wheel")
+        asset = build_path / service_name / "osbox-assets" / "nova" / "nova.conf.sample"
+        asset.parent.mkdir(parents=True)
+        asset.write_text("[DEFAULT]\n")
+        return [wheel.name]
+
+    def build(self, name: str) -> tuple[list[str], bool]:
+        build_path = self.tmp / name / "build"
+        dist_path = self.tmp / name / "dist"
+        dist_path.mkdir(parents=True)
+        with mock.patch.object(build, "build_service", self.fake_build):
+            result = build_service_cached("nova", {**SERVICE, "ref": COMMIT}, build_path, dist_path, self.cache_dir, TOOLCHAIN)
+        self.assertEqual(sorted(p.name for p in dist_path.iterdir()), result[0])
+        self.assertEqual((build_path / "nova/osbox-assets/nova/nova.conf.sample").read_text(), "[DEFAULT]\n")
+        return result
+
+    def test_miss_then_hit(self):
+        self.assertEqual(self.build("first"), (["nova-31.0.0-py3-none-any.whl"], False))
+        # built from the resolved commit
+        self.assertEqual([info["ref"] for info in self.builds], [COMMIT])
+        self.assertEqual(len(list(self.cache_dir.iterdir())), 1)
+
+        self.assertEqual(self.build("second"), (["nova-31.0.0-py3-none-any.whl"], True))
+        self.assertEqual(len(self.builds), 1)
+
+    def test_no_cache(self):
+        with mock.patch.object(build, "build_service", self.fake_build):
+            for n in range(2):
+                wheels, hit = build_service_cached("nova", SERVICE, self.tmp / str(n), self.tmp / "dist", None, {})
+                self.assertFalse(hit)
+        self.assertEqual([info["ref"] for info in self.builds], [SERVICE["ref"]] * 2)
+        self.assertFalse(self.cache_dir.exists())
+
+    def test_prune(self):
+        self.build("first")
+        (entry,) = self.cache_dir.iterdir()
+        self.assertEqual(prune_build_cache(self.cache_dir, 1), 0)
+
+        old = time.time() - 2 * 86400
+        os.utime(entry / "meta.json", (old, old))
+        # a hit counts as a use
+        self.build("second")
+        self.assertEqual(prune_build_cache(self.cache_dir, 1), 0)
+
+        os.utime(entry / "meta.json", (old, old))
+        self.assertEqual(prune_build_cache(self.cache_dir, 1), 1)
+        self.assertEqual(list(self.cache_dir.iterdir()), [])
+        self.assertEqual(prune_build_cache(self.tmp / "missing", 1), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
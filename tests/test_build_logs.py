@@ -0,0 +1,59 @@
+"""
+Per-service build output of the parallel build: the service's log file and
+the name-prefixed lines on the terminal.
+
+    python -m unittest discover tests
+"""
+
+import io
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import build  # noqa: E402
+from build import _build_service_logged, _ServiceOutput  # noqa: E402
+
+
+class ServiceOutputTest(unittest.TestCase):
+    def test_prefixes_whole_lines(self):
+        log, terminal = io.StringIO(), io.StringIO()
+        out = _ServiceOutput(log, terminal, "[nova] ")
+        out.write("Building service: nova\n$ git clo")
+        self.assertEqual(terminal.getvalue(), "[nova] Building service: nova\n")
+        out.write("ne\n\ndone\n")
+        self.assertEqual(terminal.getvalue(), "[nova] Building service: nova\n[nova] $ git clone\n[nova] \n[nova] done\n")
+        self.assertEqual(log.getvalue(), "Building service: nova\n$ git clone\n\ndone\n")
+
+
+class BuildServiceLoggedTest(unittest.TestCase):
+    def test_failure_goes_to_the_log(self):
+        def failing_build(service_name, *_args):
+            print(f"Building service: {service_name}")
+            raise RuntimeError("Command failed: uv build")
+
+        terminal = io.StringIO()
+        with tempfile.TemporaryDirectory() as td:
+            log_file = Path(td) / "nova.log"
+            with mock.patch.object(build, "build_service_cached", failing_build), mock.patch.object(
+                sys, "__stdout__", terminal
+            ):
+                with self.assertRaises(RuntimeError):
+                    _build_service_logged("nova", {}, Path(td), Path(td), log_file, None, {})
+            log = log_file.read_text()
+
+        self.assertTrue(log.startswith("Building service: nova\nTraceback"))
+        self.assertIn("RuntimeError: Command failed: uv build", log)
+        lines = terminal.getvalue().splitlines()
+        self.assertEqual(lines[0], "[nova] Building service: nova")
+        self.assertTrue(all(line.startswith("[nova] ") for line in lines))
+        # the scope of the steps recorded by the worker is restored
+        self.assertEqual(build._step_scope, "osbox")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+Checking many targets, watch mode probes and the Prometheus report of
+check-http.
+
+    python -m unittest discover tests
+"""
+
+import importlib.util
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from osbox.cmd.check_http import CheckResult, WatchStats, check_http, check_many, render_prometheus, watch_session  # noqa: E402
+
+SLOW = 0.5
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/slow":
+            time.sleep(SLOW)
+        self.send_response(404 if self.path == "/missing" else 200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _server() -> tuple[ThreadingHTTPServer, str]:
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, f"127.0.0.1:{httpd.server_address[1]}"
+
+
+@unittest.skipUnless(importlib.util.find_spec("requests"), "requests is not installed")
+class WatchSessionTest(unittest.TestCase):
+    def test_connections_reused_across_hosts(self):
+        targets = []
+        for _ in range(2):
+            httpd, target = _server()
+            self.addCleanup(httpd.server_close)
+            self.addCleanup(httpd.shutdown)
+            targets.append(target)
+
+        session = watch_session(targets, concurrency=1)
+        self.addCleanup(session.close)
+        for round in range(2):
+            for target in targets:
+                result = check_http(target=target, session=session)
+                self.assertTrue(result.ok, result.message)
+                if round:
+                    self.assertIsNone(result.timing.connect, target)
+                else:
+                    self.assertIsNotNone(result.timing.connect, target)
+
+
+@unittest.skipUnless(importlib.util.find_spec("requests"), "requests is not installed")
+class CheckManyTest(unittest.TestCase):
+    def test_order_and_concurrency(self):
+        httpd, target = _server()
+        self.addCleanup(httpd.server_close)
+        self.addCleanup(httpd.shutdown)
+        targets = [f"{target}/slow", "http://:80", f"{target}/missing", f"{target}/slow", target, f"{target}/slow"]
+
+        start = time.monotonic()
+        results = check_many(targets, concurrency=4)
+        # the slow targets ran side by side
+        self.assertLess(time.monotonic() - start, SLOW * 2.5)
+
+        self.assertEqual([r.ok for r in results], [True, False, False, True, True, True])
+        self.assertEqual(results[1].url, "http://:80")
+        self.assertIn("Missing hostname", results[1].message)
+        self.assertEqual(results[2].url, f"http://{target}/missing")
+        self.assertEqual(results[4].url, f"http://{target}/")
+
+
+class RenderPrometheusTest(unittest.TestCase):
+    def test_summary_and_escaping(self):
+        stats = WatchStats('http://x/"a"', window=10)
+        stats.add(CheckResult(False, "unhealthy", 'http://x/"a"', error="ConnectTimeout"))
+        text = render_prometheus([stats])
+
+        self.assertIn('osbox_check_http_up{url="http://x/\\"a\\""} 0', text)
+        self.assertIn('osbox_check_http_timeouts_total{url="http://x/\\"a\\""} 1', text)
+        self.assertIn('osbox_check_http_latency_seconds_count{url="http://x/\\"a\\""} 0', text)
+        self.assertNotIn("quantile=", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
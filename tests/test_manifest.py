@@ -0,0 +1,58 @@
+"""
+Command lookup through the build-time index and through manifest.json.
+
+    python -m unittest discover tests
+"""
+
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from build import write_manifest_index  # noqa: E402
+
+FIND = "import sys; from osbox.manifest import find_command; print(find_command(sys.argv[1]))"
+
+
+class FindCommandTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.src = Path(tmp.name)
+        self.package = self.src / "osbox"
+        shutil.copytree(
+            ROOT / "src" / "osbox",
+            self.package,
+            ignore=shutil.ignore_patterns("manifest_index.py", "assets", "assets.pack", "options.db", "__pycache__"),
+        )
+        write_manifest_index(self.package / "manifest.json", self.package / "manifest_index.py")
+
+    def find(self, name: str) -> str:
+        return subprocess.check_output(
+            [sys.executable, "-c", FIND, name], env={"PYTHONPATH": str(self.src)}, text=True
+        ).strip()
+
+    def test_index(self):
+        self.assertIn("'module': 'osbox.cmd.check_http:main'", self.find("check-http"))
+        self.assertEqual(self.find("no-such-command"), "None")
+
+    def test_edited_manifest_wins(self):
+        manifest_file = self.package / "manifest.json"
+        manifest = json.loads(manifest_file.read_text())
+        for command in manifest["services"]["osbox"]["commands"]:
+            if command["name"] == "check-http":
+                command["name"] = "probe-http"
+        manifest_file.write_text(json.dumps(manifest, indent=2))
+
+        self.assertEqual(self.find("check-http"), "None")
+        self.assertIn("osbox.cmd.check_http:main", self.find("probe-http"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+"""
+Request metrics: the worker files, their Prometheus rendering, retiring
+the files of exited workers and the side-port server.
+
+    python -m unittest discover tests
+"""
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from osbox import metrics  # noqa: E402
+from osbox.metrics import MetricsStore, render_prometheus, retire_worker, route_label, serve_metrics  # noqa: E402
+
+
+HOLD_PORT = """
+import socket, sys
+s = socket.socket()
+s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+s.bind(("127.0.0.1", int(sys.argv[1])))
+s.listen()
+print("ready", flush=True)
+sys.stdin.read()
+"""
+
+
+def _exited_pid() -> int:
+    pid = os.fork()
+    if not pid:
+        os._exit(0)
+    os.waitpid(pid, 0)
+    return pid
+
+
+def _record(metrics_dir: str, pid: int, route: str, duration: float, nbytes: int) -> None:
+    store = MetricsStore(metrics_dir)
+    store.start_request()
+    store.end_request("GET", route, "200", duration, nbytes)
+    # as written by that worker
+    store.pid = pid
+    store.flush()
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def test_route_label(self):
+        self.assertEqual(route_label("/v2.1/servers/42/action"), "/v2.1/servers/{id}/action")
+        self.assertEqual(route_label("/images/3f2504e0-4f89-11d3-9a0c-0305e82c3301"), "/images/{id}")
+        self.assertEqual(route_label(""), "/")
+
+    def test_render(self):
+        _record(self.dir, os.getpid(), "/servers", 0.02, 100)
+        _record(self.dir, _exited_pid(), "/servers", 2.0, 50)
+        text = render_prometheus(self.dir, 'svc"1')
+
+        labels = 'service="svc\\"1",method="GET",route="/servers"'
+        self.assertIn('osbox_http_workers{service="svc\\"1"} 1', text)
+        self.assertIn(f"osbox_http_requests_total{{{labels},status=\"200\"}} 2", text)
+        self.assertIn(f'osbox_http_request_duration_seconds_bucket{{{labels},le="0.025"}} 1', text)
+        self.assertIn(f'osbox_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2', text)
+        self.assertIn(f"osbox_http_request_duration_seconds_sum{{{labels}}} 2.020000", text)
+        self.assertIn(f"osbox_http_response_bytes_total{{{labels}}} 150", text)
+
+    def test_retire_worker(self):
+        pids = [_exited_pid() for _ in range(3)]
+        for pid in pids:
+            _record(self.dir, pid, "/servers", 0.02, 10)
+        before = render_prometheus(self.dir, "svc")
+
+        for pid in pids:
+            retire_worker(self.dir, pid)
+        self.assertEqual(sorted(p.name for p in Path(self.dir).glob("*.json")), [metrics.RETIRED_FILE])
+        self.assertEqual(render_prometheus(self.dir, "svc"), before)
+
+    def test_retired_file_counted_once(self):
+        pid = _exited_pid()
+        _record(self.dir, pid, "/servers", 0.02, 10)
+        worker_file = Path(self.dir) / f"{pid}.json"
+        saved = worker_file.read_text()
+        retire_worker(self.dir, pid)
+        # a scrape between the rename of the retired file and the unlink
+        worker_file.write_text(saved)
+        self.assertIn('status="200"} 1\n', render_prometheus(self.dir, "svc"))
+
+
+class ServeMetricsTest(unittest.TestCase):
+    def test_waits_for_the_port(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        # the port is held by another process, as by the metrics server of
+        # the master a USR2 upgrade replaces
+        holder = subprocess.Popen(
+            [sys.executable, "-c", HOLD_PORT, str(port)], stdout=subprocess.PIPE, stdin=subprocess.PIPE
+        )
+        self.addCleanup(holder.stdin.close)
+        self.addCleanup(holder.stdout.close)
+        self.addCleanup(holder.wait)
+        self.addCleanup(holder.kill)
+        holder.stdout.readline()
+
+        pid = serve_metrics(tmp.name, "svc", f"127.0.0.1:{port}")
+        self.addCleanup(os.waitpid, pid, 0)
+        self.addCleanup(os.kill, pid, signal.SIGTERM)
+        time.sleep(0.5)
+        self.assertEqual(os.waitpid(pid, os.WNOHANG), (0, 0))
+
+        holder.kill()
+        holder.wait()
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=2) as resp:
+                    body = resp.read().decode()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+        self.assertIn('osbox_http_workers{service="svc"} 0', body)
+
+
+if __name__ == "__main__":
+    unittest.main()
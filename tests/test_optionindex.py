@@ -0,0 +1,95 @@
+"""
+Parsing oslo-config-generator samples into the option index and querying it.
+
+    python -m unittest discover tests
+"""
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from osbox.optionindex import get, parse_genconfig, search, write_index  # noqa: E402
+
+SAMPLE = """\
+[DEFAULT]
+
+#
+# From nova.conf
+#
+
+#
+# Enables or disables logging values of all registered options when
+# starting a service (at DEBUG level). (boolean
+# value)
+#log_options = true
+
+# Timeout for rpc calls (integer value)
+#rpc_response_timeout = 60
+
+# Filters to enable, in order (multi valued)
+#enabled_filters = ComputeFilter
+#enabled_filters = ImagePropertiesFilter
+
+# Host name (string value)
+#host = <None>
+
+[api_database]
+
+#
+# From nova.conf
+#
+
+# The SQLAlchemy connection string (string value)
+#connection = <None>
+"""
+
+
+def names(options) -> list[str]:
+    return [f"{o.section}.{o.name}" for o in options]
+
+
+class OptionIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.options = list(parse_genconfig(SAMPLE.splitlines(True), "nova", "nova.conf.sample"))
+
+    def test_parse(self):
+        by_name = {(o.section, o.name): o for o in self.options}
+        self.assertEqual(len(self.options), 5)
+
+        log_options = by_name["DEFAULT", "log_options"]
+        self.assertEqual((log_options.default, log_options.type), ("true", "boolean"))
+        self.assertTrue(log_options.help.startswith("Enables or disables logging"))
+        self.assertNotIn("From nova.conf", log_options.help)
+
+        self.assertEqual(by_name["DEFAULT", "rpc_response_timeout"].type, "integer")
+        self.assertIsNone(by_name["DEFAULT", "host"].default)
+        self.assertEqual(by_name["api_database", "connection"].help, "The SQLAlchemy connection string (string value)")
+
+    def test_multi_valued(self):
+        (option,) = [o for o in self.options if o.name == "enabled_filters"]
+        self.assertEqual(option.default, "ComputeFilter\nImagePropertiesFilter")
+        self.assertEqual(option.type, "multi valued")
+        self.assertEqual(option.help, "Filters to enable, in order (multi valued)")
+
+    def test_index(self):
+        with tempfile.TemporaryDirectory() as td:
+            index_file = Path(td) / "options.db"
+            self.assertEqual(write_index(self.options, index_file), 5)
+
+            (option,) = get(index_file, "nova", "DEFAULT", "rpc_response_timeout")
+            self.assertEqual(option.default, "60")
+            self.assertEqual(get(index_file, "glance", "DEFAULT", "rpc_response_timeout"), [])
+
+            self.assertEqual(names(search(index_file, "CONNECTION")), ["api_database.connection"])
+            self.assertEqual(names(search(index_file, "default.*_filters")), ["DEFAULT.enabled_filters"])
+            self.assertEqual(names(search(index_file, "debug level", in_help=True)), ["DEFAULT.log_options"])
+            # _ is not a LIKE wildcard
+            self.assertEqual(search(index_file, "rpc_x"), [])
+            self.assertEqual(len(search(index_file, "", limit=2)), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
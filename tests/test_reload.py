@@ -0,0 +1,152 @@
+"""
+Reloads bench-app under load and checks that no request fails, for both
+ways of starting a service: `osbox <command>` and a symlink named after the
+command, and under `osbox serve`.
+
+    python -m unittest discover tests
+"""
+
+import importlib.util
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+_spec = importlib.util.spec_from_file_location("reload", ROOT / "benchmarks" / "reload.py")
+reload = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(reload)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def _stop(pid: int) -> None:
+    # for masters started by USR2, which are not our children
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    deadline = time.monotonic() + 30
+    while _alive(pid) and time.monotonic() < deadline:
+        time.sleep(0.1)
+
+
+@unittest.skipUnless(importlib.util.find_spec("gunicorn"), "gunicorn is not installed")
+class ReloadTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.url = f"http://127.0.0.1:{_free_port()}/"
+        self.env = {
+            **os.environ,
+            "PYTHONPATH": str(ROOT / "src"),
+            "OSBOX_BENCH_APP_BIND": self.url[len("http://") : -1],
+            "OSBOX_BENCH_APP_WORKERS": "2",
+            "OSBOX_BENCH_APP_RESTART": "always",
+        }
+
+    def start(self, argv: list[str]) -> int:
+        log = open(Path(self.tmp.name) / "service.log", "ab")
+        self.addCleanup(log.close)
+        process = subprocess.Popen(argv, env=self.env, stdout=log, stderr=log)
+        self.addCleanup(process.wait, 30)
+        self.addCleanup(process.terminate)
+
+        deadline = time.monotonic() + 30
+        while not reload.request(self.url, 1.0):
+            if process.poll() is not None or time.monotonic() > deadline:
+                self.fail(f"bench-app did not come up:\n{self.log()}")
+            time.sleep(0.2)
+        return process.pid
+
+    def log(self) -> str:
+        return (Path(self.tmp.name) / "service.log").read_text(errors="replace")
+
+    def by_name(self) -> list[str]:
+        return [sys.executable, "-c", "from osbox.cli import main; main()", "bench-app"]
+
+    def through_symlink(self) -> list[str]:
+        link = Path(self.tmp.name) / "bin" / "bench-app"
+        link.parent.mkdir()
+        link.symlink_to(ROOT / "main.py")
+        return [sys.executable, str(link)]
+
+    def check_usr2(self, argv: list[str]) -> None:
+        pid = self.start(argv)
+        result = reload.reload_under_load(pid, self.url, "USR2", concurrency=4, before=1.0, after=2.0)
+        if result["new_master"]:
+            self.addCleanup(_stop, result["new_master"])
+
+        self.assertIsNotNone(result["new_master"], f"new master did not come up:\n{self.log()}")
+        self.assertEqual(result["failed"], 0)
+        self.assertGreater(result["ok"], 0)
+        self.assertTrue(_alive(result["new_master"]))
+        self.assertTrue(reload.request(self.url, 5.0))
+
+    def test_usr2_by_command_name(self):
+        self.check_usr2(self.by_name())
+
+    def test_usr2_through_symlink(self):
+        self.check_usr2(self.through_symlink())
+
+    def serve(self) -> tuple[int, int]:
+        supervisor = self.start([sys.executable, "-c", "from osbox.cli import main; main()", "serve", "bench-app"])
+        (master,) = reload.child_pids(supervisor)
+        return supervisor, master
+
+    def check_supervised(self, supervisor: int, old_master: int) -> int:
+        (master,) = reload.child_pids(supervisor)
+        self.assertNotEqual(master, old_master)
+        self.assertTrue(reload.request(self.url, 5.0))
+        self.assertIn(f"continues as pid {master}", self.log())
+        self.assertNotIn("restarting bench-app", self.log())
+        return master
+
+    def test_serve_usr2_to_master(self):
+        supervisor, master = self.serve()
+        result = reload.reload_under_load(master, self.url, "USR2", concurrency=4, before=1.0, after=2.0)
+        self.assertEqual(result["failed"], 0)
+        self.assertEqual(self.check_supervised(supervisor, master), result["new_master"])
+
+    def test_serve_usr2_to_supervisor(self):
+        supervisor, master = self.serve()
+        result = reload.reload_under_load(
+            supervisor, self.url, "USR2", concurrency=4, before=1.0, after=6.0, supervised=True
+        )
+        self.assertEqual(result["failed"], 0)
+        new_master = self.check_supervised(supervisor, master)
+
+        # stopping the supervisor stops the master it took over
+        os.kill(supervisor, signal.SIGTERM)
+        deadline = time.monotonic() + 30
+        while _alive(new_master) and time.monotonic() < deadline:
+            time.sleep(0.2)
+        self.assertFalse(_alive(new_master))
+
+    def test_hup(self):
+        pid = self.start(self.by_name())
+        result = reload.reload_under_load(pid, self.url, "HUP", concurrency=4, before=1.0, after=2.0)
+        self.assertEqual(result["failed"], 0)
+        self.assertGreater(result["ok"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
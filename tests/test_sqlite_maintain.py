@@ -0,0 +1,73 @@
+"""
+WAL checkpoint policy of sqlite-maintain.
+
+    python -m unittest discover tests
+"""
+
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from osbox.cmd.sqlite_maintain import Database, Policy, maintain, render_prometheus  # noqa: E402
+
+
+class MaintainTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = str(Path(tmp.name) / "test.db")
+        self.writer = sqlite3.connect(self.path, isolation_level=None)
+        self.addCleanup(self.writer.close)
+        self.writer.execute("PRAGMA journal_mode=WAL")
+        self.writer.execute("PRAGMA wal_autocheckpoint=0")
+        self.writer.execute("CREATE TABLE t (v BLOB)")
+        self.write()
+        self.policy = Policy(passive_bytes=1024, truncate_bytes=64 * 1024, optimize_every=0, vacuum_every=0)
+        self.db = Database(self.path)
+        self.addCleanup(lambda: self.db.conn and self.db.conn.close())
+
+    def write(self, rows: int = 100) -> None:
+        self.writer.executemany("INSERT INTO t VALUES (?)", ((b"x" * 4096,) for _ in range(rows)))
+
+    def test_truncate_above_size(self):
+        actions = maintain(self.db, self.policy, time.monotonic())
+        self.assertEqual(actions, ["checkpoint truncate"])
+        self.assertEqual(self.db.wal_bytes, 0)
+
+    def test_truncate_busy_falls_back_to_passive(self):
+        reader = sqlite3.connect(self.path, isolation_level=None)
+        self.addCleanup(reader.close)
+        reader.execute("BEGIN")
+        reader.execute("SELECT count(*) FROM t").fetchone()
+        self.write()
+
+        start = time.monotonic()
+        actions = maintain(self.db, self.policy, time.monotonic())
+        # one attempt of busy_timeout, not busy_retries of them
+        self.assertLess(time.monotonic() - start, self.policy.busy_timeout * 2)
+        self.assertEqual(actions, ["checkpoint truncate (busy)", "checkpoint passive"])
+        self.assertEqual((self.db.busy, self.db.errors), (1, 0))
+        self.assertEqual(self.db.checkpoints, {"TRUNCATE": 1, "PASSIVE": 1})
+
+        text = render_prometheus([self.db])
+        self.assertIn(f'osbox_sqlite_checkpoint_busy_total{{db="{self.path}"}} 1', text)
+        self.assertIn(f'osbox_sqlite_errors_total{{db="{self.path}"}} 0', text)
+
+    def test_idle(self):
+        self.policy.truncate_bytes = 1 << 30
+        now = time.monotonic()
+        # the first pass only learns the data version
+        self.assertEqual(maintain(self.db, self.policy, now), [])
+        self.write(1)
+        self.assertEqual(maintain(self.db, self.policy, now + 1), ["checkpoint passive"])
+        self.assertEqual(maintain(self.db, self.policy, now + 2), [])
+        self.assertEqual(maintain(self.db, self.policy, now + 1 + self.policy.idle), ["checkpoint truncate"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+Running commands in a zygote child: the request encoding, passing the
+client's stdio fds and reporting the exit code back.
+
+    python -m unittest discover tests
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC))
+
+from osbox.cmd.zygote import _decode_request, _encode_request, _peer_allowed, run_in_zygote  # noqa: E402
+
+SERVE = "import sys; from osbox.cmd.zygote import serve; serve(sys.argv[1], [])"
+CLIENT = "import sys; from osbox.cmd.zygote import run_in_zygote; sys.exit(run_in_zygote(sys.argv[1], sys.argv[2], sys.argv[2:]))"
+
+
+class RequestTest(unittest.TestCase):
+    def test_round_trip(self):
+        argv = ["check-http", "--path", "/a b", ""]
+        command_name, cwd, decoded, env = _decode_request(_encode_request("check-http", argv))
+        self.assertEqual((command_name, cwd, decoded), ("check-http", os.getcwd(), argv))
+        self.assertEqual(env, dict(os.environ))
+
+    def test_peer_allowed(self):
+        a, b = socket.socketpair()
+        with a, b:
+            self.assertTrue(_peer_allowed(a))
+
+
+class ZygoteTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        self.socket_path = str(self.tmp / "zygote.sock")
+        self.env = {**os.environ, "PYTHONPATH": str(SRC)}
+
+        zygote = subprocess.Popen(
+            [sys.executable, "-c", SERVE, self.socket_path], env=self.env, stdout=subprocess.DEVNULL
+        )
+        self.addCleanup(zygote.wait)
+        self.addCleanup(zygote.terminate)
+        deadline = time.monotonic() + 10
+        while not os.path.exists(self.socket_path):
+            self.assertIsNone(zygote.poll())
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+
+    def run_client(self, command_name: str, *args: str) -> tuple[int, str, str]:
+        with open(self.tmp / "out", "w+") as out, open(self.tmp / "err", "w+") as err:
+            code = subprocess.call(
+                [sys.executable, "-c", CLIENT, self.socket_path, command_name, *args],
+                env=self.env,
+                cwd=self.tmp,
+                stdin=subprocess.DEVNULL,
+                stdout=out,
+                stderr=err,
+            )
+            out.seek(0)
+            err.seek(0)
+            return code, out.read(), err.read()
+
+    def test_stdout(self):
+        code, out, err = self.run_client("version")
+        self.assertEqual((code, err), (0, ""))
+        self.assertIn(f"python: {sys.version.split()[0]}", out)
+
+    def test_exit_code_and_stderr(self):
+        code, out, err = self.run_client("check-http")
+        self.assertEqual((code, out), (2, ""))
+        self.assertIn("at least one target is required", err)
+
+    def test_refused_commands(self):
+        for name in ("no-such-command", "serve"):
+            code, _out, err = self.run_client(name)
+            self.assertEqual(code, 1)
+            self.assertIn(f"Unknown command: {name}", err)
+
+    def test_no_zygote(self):
+        self.assertIsNone(run_in_zygote(str(self.tmp / "missing.sock"), "version", ["version"]))
+
+
+if __name__ == "__main__":
+    unittest.main()